@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Fri Oct 30 09:18:51 2026
+
+T-Coffee alignments of candidate enzyme sets in a bounded process pool, with a content addressed cache
+
+the key of a job is a sha256 of the sorted uniprot ids and the T-Coffee options, the same set of candidates
+from any query is aligned once
+    <cache_folder>/<key[:2]>/<key>/alignment.aln    clustalw alignment
+    <cache_folder>/<key[:2]>/<key>/result.json      ids, per sequence conservation scores, overall score, run time
+a job runs in a pool process with a timeout on T-Coffee, failed and timed out jobs are not cached,
+the same key submitted twice while it runs waits on the first job. A job is given up once it has run for the
+timeout plus GRACE, the time it waits in the queue does not count. With align(..., wait=S) the caller gives up
+after S seconds, and a job that has not started is cancelled unless another caller waits on it
+
+    runner = AlignmentRunner(read_fasta('/data_2023/seqs.fasta', ids), '/data_2023/alignments/', workers=4, timeout=120)
+    result = runner.align(['P0A9B2', 'P00350', ...])
+
+the pipeline stage precomputes the sets shared by the most reactions of reac_seqs.tsv
+    python align_runner.py /data_2023/ /raw_data_update/ --top 500 --workers 8 --timeout 300
+
+"""
+
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, Future, CancelledError, wait as wait_futures
+from pathlib import Path
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+from make_seq_props import read_fasta
+from publish_bundle import write_params
+
+TCOFFEE = 't_coffee'
+OPTIONS = ['-output=clustalw_aln,score_ascii', '-quiet']
+TIMEOUT = 300
+TOP = 500
+MAX_SEQS = 200
+GRACE = 30
+POLL = 0.5
+
+
+def set_key(uniprots, options=OPTIONS):
+    data = json.dumps([sorted(set(uniprots)), options])
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def parse_score_ascii(text):
+    # the per sequence scores and the overall 'cons' score of a T-Coffee score_ascii file
+    scores = {}
+    for line in text.splitlines():
+        found = re.match(r'^(\S+)\s+:\s+(\d+)\s*$', line)
+        if found:
+            scores[found.group(1)] = int(found.group(2))
+        elif scores and not line.strip():
+            break
+    return scores.pop('cons', None), scores
+
+
+def run_tcoffee(uniprots, seqs, timeout=TIMEOUT, options=OPTIONS, binary=TCOFFEE, started=None):
+    # align in a scratch folder, a timeout kills T-Coffee. started is a file the job writes its start time to
+    if started:
+        Path(started).write_text(str(time.time()))
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(Path(tmp) / 'seqs.fasta', 'w') as f:
+            for x in uniprots:
+                f.write('>' + x + '\n' + seqs[x] + '\n')
+        try:
+            subprocess.run([binary, '-in', 'seqs.fasta', '-run_name', 'seqs'] + options, cwd=tmp,
+                           check=True, capture_output=True, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            return {'error': 'timeout', 'seconds': time.perf_counter() - start}
+        except (subprocess.CalledProcessError, OSError) as e:
+            return {'error': 'alignmentFailure', 'detail': str(e)[:500], 'seconds': time.perf_counter() - start}
+        alignment = (Path(tmp) / 'seqs.aln').read_text()
+        score, scores = parse_score_ascii((Path(tmp) / 'seqs.score_ascii').read_text())
+    return {'ids': list(uniprots), 'score': score, 'scores': scores, 'alignment': alignment, 'seconds': time.perf_counter() - start}
+
+
+class AlignmentCache():
+
+    def __init__(self, cache_folder, options=OPTIONS):
+        self.cache_folder = Path(cache_folder)
+        self.options = options
+
+    def folder(self, key):
+        return self.cache_folder / key[:2] / key
+
+    def get(self, uniprots):
+        folder = self.folder(set_key(uniprots, self.options))
+        if not (folder / 'result.json').exists():
+            return None
+        result = json.loads((folder / 'result.json').read_text())
+        result['alignment'] = (folder / 'alignment.aln').read_text()
+        return result
+
+    def put(self, uniprots, result):
+        # write into a scratch folder and rename it into place, a reader sees the whole entry or none
+        key = set_key(uniprots, self.options)
+        folder = self.folder(key)
+        if folder.exists():
+            return
+        folder.parent.mkdir(parents=True, exist_ok=True)
+        tmp = Path(tempfile.mkdtemp(prefix='.' + key, dir=folder.parent))
+        (tmp / 'alignment.aln').write_text(result['alignment'])
+        (tmp / 'result.json').write_text(json.dumps({k: v for k, v in result.items() if k != 'alignment'}))
+        try:
+            os.rename(tmp, folder)
+        except OSError:
+            # written by another process in the meantime
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def __len__(self):
+        return sum(1 for _ in self.cache_folder.glob('*/*/result.json')) if self.cache_folder.exists() else 0
+
+
+class AlignmentRunner():
+
+    def __init__(self, seqs, cache_folder, workers=2, timeout=TIMEOUT, options=OPTIONS, binary=TCOFFEE, max_seqs=MAX_SEQS):
+        self.seqs = seqs
+        self.cache = AlignmentCache(cache_folder, options)
+        self.pool = ProcessPoolExecutor(workers)
+        self.timeout = timeout
+        self.options = options
+        self.binary = binary
+        self.max_seqs = max_seqs
+        self.lock = threading.Lock()
+        self.running = {}
+        self.waiters = {}
+        self.starts = tempfile.mkdtemp(prefix='align_runner.')
+        self.counts = {'cached': 0, 'aligned': 0, 'joined': 0, 'failed': 0, 'cancelled': 0}
+
+    def submit(self, uniprots):
+        # (key, future), the future of a running job for the same set is shared
+        uniprots = sorted(set(uniprots))
+        missing = [x for x in uniprots if not self.seqs.get(x)]
+        if missing:
+            raise KeyError('no sequence for ' + ', '.join(missing[:5]))
+        if len(uniprots) > self.max_seqs:
+            raise ValueError(str(len(uniprots)) + ' sequences, at most ' + str(self.max_seqs))
+        key = set_key(uniprots, self.options)
+        with self.lock:
+            self.waiters[key] = self.waiters.get(key, 0) + 1
+            if key in self.running:
+                self.counts['joined'] += 1
+                return key, self.running[key]
+            # a job for the same set may have finished since the caller looked in the cache
+            found = self.cache.get(uniprots)
+            if found is not None:
+                self.counts['cached'] += 1
+                future = Future()
+                future.set_result(dict(found, cached=True))
+                return key, future
+            future = self.pool.submit(run_tcoffee, uniprots, {x: self.seqs[x] for x in uniprots}, self.timeout, self.options, self.binary,
+                                      self.start_file(key))
+            self.running[key] = future
+        future.add_done_callback(lambda f: self.finished(key, uniprots, f))
+        return key, future
+
+    def start_file(self, key):
+        return Path(self.starts) / key
+
+    def started(self, key):
+        # the time the job began in the pool process, None while it waits
+        try:
+            return float(self.start_file(key).read_text())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def finished(self, key, uniprots, future):
+        if future.cancelled():
+            result = {'error': 'cancelled'}
+        else:
+            result = future.result() if future.exception() is None else {'error': 'alignmentFailure'}
+        if 'error' not in result:
+            self.cache.put(uniprots, result)
+        self.start_file(key).unlink(missing_ok=True)
+        with self.lock:
+            self.running.pop(key, None)
+            self.counts['cancelled' if future.cancelled() else 'failed' if 'error' in result else 'aligned'] += 1
+
+    def collect(self, key, future, wait=None):
+        # the result of a submitted job. A job that runs longer than the T-Coffee timeout plus GRACE is given up.
+        # It is timed from the start the job writes in the pool process, the pool already marks the jobs in its
+        # call queue as running, so future.running() would count their time in the queue
+        start, started = time.perf_counter(), None
+        try:
+            while True:
+                if wait_futures([future], timeout=POLL).done:
+                    result = dict(future.result())
+                    result.setdefault('cached', False)
+                    return result
+                now = time.perf_counter()
+                if started is None:
+                    started = self.started(key)
+                if started is not None and time.time() - started > self.timeout + GRACE:
+                    return {'error': 'timeout', 'key': key}
+                if wait is not None and now - start > wait:
+                    # the caller gives up, a job nobody else waits on is cancelled if it has not started
+                    with self.lock:
+                        alone = self.waiters.get(key, 0) <= 1
+                    if alone and future.cancel():
+                        return {'error': 'cancelled', 'key': key}
+                    return {'error': 'timeout', 'key': key}
+        except CancelledError:
+            return {'error': 'cancelled', 'key': key}
+        except Exception as e:
+            return {'error': 'alignmentFailure', 'detail': str(e)[:500], 'key': key}
+        finally:
+            with self.lock:
+                self.waiters[key] -= 1
+                if not self.waiters[key]:
+                    del self.waiters[key]
+
+    def align(self, uniprots, wait=None):
+        found = self.cache.get(uniprots)
+        if found is not None:
+            with self.lock:
+                self.counts['cached'] += 1
+            found['cached'] = True
+            return found
+        key, future = self.submit(uniprots)
+        return self.collect(key, future, wait)
+
+    def align_many(self, sets):
+        # submit every set first so they run side by side, then collect in order
+        results, pending = [], []
+        for uniprots in sets:
+            found = self.cache.get(uniprots)
+            if found is not None:
+                with self.lock:
+                    self.counts['cached'] += 1
+                found['cached'] = True
+            pending.append(found if found is not None else self.submit(uniprots))
+        for x in pending:
+            results.append(x if isinstance(x, dict) else self.collect(*x))
+        return results
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counts, running=len(self.running))
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+        shutil.rmtree(self.starts, ignore_errors=True)
+
+
+def common_sets(reac_seqs, top=TOP, min_seqs=2, max_seqs=MAX_SEQS):
+    # the candidate sets shared by the most reactions, the larger set first on ties
+    sets = reac_seqs.dropna(subset=['uniprot']).groupby('mnxr')['uniprot'].apply(lambda x: tuple(sorted(set(x.astype(str)))))
+    counts = sets.value_counts()
+    counts = counts[[min_seqs <= len(x) <= max_seqs for x in counts.index]]
+    order = np.lexsort(([-len(x) for x in counts.index], -counts.to_numpy()))
+    return [(list(counts.index[i]), int(counts.iloc[i])) for i in order[:top]]
+
+
+def run(raw_data_folder, data_folder, top=TOP, workers=None, timeout=TIMEOUT, max_seqs=MAX_SEQS, binary=TCOFFEE, n_bench=0):
+    if not shutil.which(binary):
+        raise SystemExit(binary + ' not found, install T-Coffee or give --tcoffee')
+    reac_seqs = pd.read_csv(data_folder / 'reac_seqs.tsv', sep='\t', header=None, names=['mnxr', 'up', 'uniprot', 'ref', 'ec'])
+    sets = common_sets(reac_seqs, top, max_seqs=max_seqs)
+    seqs = read_fasta(data_folder / 'seqs.fasta', set([x for s, _ in sets for x in s]))
+    sets = [(s, n) for s, n in sets if all(seqs.get(x) for x in s)]
+
+    runner = AlignmentRunner(seqs, data_folder / 'alignments', workers or os.cpu_count(), timeout, binary=binary, max_seqs=max_seqs)
+    start = time.perf_counter()
+    results = runner.align_many([s for s, _ in sets])
+    elapsed = time.perf_counter() - start
+    runner.close()
+
+    stats = runner.stats()
+    print('alignments for', len(sets), 'sets covering', sum([n for _, n in sets]), 'reactions', '\taligned', stats['aligned'],
+          'cached', stats['cached'], 'failed', stats['failed'], '\t', round(elapsed, 2), 's')
+    write_params(data_folder, 'align_runner', {'top': top, 'timeout': timeout, 'max_seqs': max_seqs, 'binary': binary, 'options': OPTIONS})
+    errors = pd.Series([r['error'] for r in results if 'error' in r]).value_counts()
+    for k, v in errors.items():
+        print('\t', k, v)
+
+    if n_bench:
+        # the cache against the recorded T-Coffee time of the same sets
+        runner = AlignmentRunner(seqs, data_folder / 'alignments', 1, timeout, binary=binary, max_seqs=max_seqs)
+        done = [s for (s, _), r in zip(sets, results) if 'error' not in r][:n_bench]
+        if done:
+            start = time.perf_counter()
+            cached = [runner.align(s) for s in done]
+            t_cached = (time.perf_counter() - start) / len(done)
+            t_run = np.mean([r['seconds'] for r in cached])
+            print('\nalignments for', len(done), 'sets, all cached', all(r['cached'] for r in cached))
+            print('T-Coffee\t', round(t_run*1000, 3), 'ms')
+            print('cache\t\t', round(t_cached*1000, 3), 'ms', '\t', round(t_run / t_cached, 1), 'x')
+        runner.close()
+
+
+
+
+def arguments(args=None):
+    parser = argparse.ArgumentParser(description='SeqFind script for Selenzy')
+    parser.add_argument('data_folder',
+                        help='specify data directory for new files, please end with slash')
+    parser.add_argument('raw_data_folder',
+                        help='specify data directory for raw databases files, please end with slash')
+    parser.add_argument('--top', type=int, default=TOP,
+                        help='number of the most common candidate sets to align')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='concurrent T-Coffee runs, defaults to all cores')
+    parser.add_argument('--timeout', type=float, default=TIMEOUT,
+                        help='seconds before a T-Coffee run is killed')
+    parser.add_argument('--max_seqs', type=int, default=MAX_SEQS,
+                        help='larger sets are not aligned')
+    parser.add_argument('--tcoffee', default=TCOFFEE,
+                        help='T-Coffee executable')
+    parser.add_argument('--benchmark', type=int, default=0,
+                        help='time this many cached sets against their T-Coffee run')
+
+    arg = parser.parse_args(args=args)
+    return arg
+
+
+if __name__ == '__main__':
+    arg = arguments()
+    raw_data_folder = Path(arg.raw_data_folder)
+    data_folder = Path(arg.data_folder)
+    run(raw_data_folder, data_folder, arg.top, arg.workers, arg.timeout, arg.max_seqs, arg.tcoffee, arg.benchmark)
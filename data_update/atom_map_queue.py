@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Nov  3 10:04:26 2026
+
+Distributed make_fingerprint_atomMap.py, a work queue of reaction units on a shared filesystem
+
+init        splits the filtered reactions (reaction_smiles_enz_filter.tsv, in reac_prop order) into units
+work        any number of workers on any number of nodes load the compounds and the mapper once, then claim units,
+            run map_reactions (rxnMapper_fun, reactFragDists) on them and write the partial results
+reduce      merges the units in order into Morgan/FP_Morg.npz, Morgan/RF/FP_MorgRF.npz, reac_smi.csv and reac_prop.tsv
+            and prints the issue reports, the same outputs as make_fingerprint_atomMap.py
+local       init, N work processes on this machine and reduce
+
+<queue>/queue.json              folders, unit count and mapping options
+<queue>/units/<unit>.json       the reac_prop rows of the unit
+<queue>/leases/<unit>.lease     created with O_EXCL by the worker that claims the unit, its mtime is the heartbeat,
+                                a lease older than --lease seconds is taken over by another worker. It renames the
+                                lease to a name of its own and removes it only if it is still stale, a fresh lease
+                                another worker created in the meantime is linked back
+<queue>/attempts/<unit>.log     one line per claim, a unit claimed --max_attempts times is moved to failed/
+<queue>/errors/<unit>.log       the tracebacks of the failed attempts
+<queue>/done/<unit>.pkl         the map_reactions results, written to a temporary file and renamed
+<queue>/failed/<unit>.json      the units that ran out of attempts
+
+    python atom_map_queue.py init /shared/queue/ --data_folder /data_2023/ --raw_data_folder /raw_data_update/ --unit_size 500
+    python atom_map_queue.py work /shared/queue/ --mapper onnx --onnx_model /data_2023/rxnmapper.onnx --threads 4
+    python atom_map_queue.py status /shared/queue/
+    python atom_map_queue.py reduce /shared/queue/
+    python atom_map_queue.py local /tmp/queue/ --data_folder /data_2023/ --raw_data_folder /raw_data_update/ --workers 4
+
+"""
+
+from pathlib import Path
+import argparse
+import datetime
+import json
+import os
+import pickle
+import socket
+import subprocess
+import sys
+import threading
+import time
+import traceback
+
+from make_fingerprint_atomMap import load_compounds, load_reactions, map_reactions, report, write_outputs, cofactor_templates, mapper_params, COFACTORS
+from publish_bundle import write_params
+from make_inchi_cache import load_inchi_cache
+from metrics import instrument, add_arguments
+from atom_mappers import make_mapper, MAPPERS
+
+UNIT_SIZE = 500
+LEASE = 600
+MAX_ATTEMPTS = 3
+POLL = 5
+
+
+def unit_name(i):
+    return 'unit_' + str(i).zfill(6)
+
+
+def write_atomic(file_path, data, mode='w'):
+    tmp = file_path.with_name('.' + file_path.name + '.' + socket.gethostname() + '_' + str(os.getpid()))
+    with open(tmp, mode) as f:
+        f.write(data)
+    os.replace(tmp, file_path)
+
+
+def init_queue(queue_folder, data_folder, raw_data_folder, unit_size=UNIT_SIZE, cofactors=None):
+    queue_folder = Path(queue_folder)
+    if (queue_folder / 'queue.json').exists():
+        raise SystemExit('queue ' + str(queue_folder) + ' exists, remove it to start again')
+    for x in ['units', 'leases', 'attempts', 'errors', 'done', 'failed']:
+        (queue_folder / x).mkdir(parents=True, exist_ok=True)
+
+    reac_prop = load_reactions(Path(raw_data_folder))
+    rows = reac_prop.index.tolist()
+    units = [rows[i:i + unit_size] for i in range(0, len(rows), unit_size)]
+    for i, unit in enumerate(units):
+        write_atomic(queue_folder / 'units' / (unit_name(i) + '.json'), json.dumps({'rows': unit, 'reactions': reac_prop.loc[unit, '#ID'].tolist()}))
+
+    write_atomic(queue_folder / 'queue.json', json.dumps({'data_folder': str(Path(data_folder).resolve()), 'raw_data_folder': str(Path(raw_data_folder).resolve()),
+                                                          'units': len(units), 'unit_size': unit_size, 'reactions': len(rows),
+                                                          'cofactors': sorted(cofactors) if cofactors else None,
+                                                          'created': datetime.datetime.now().isoformat(timespec='seconds')}, indent=1))
+    print('queue', queue_folder, len(units), 'units of', unit_size, 'for', len(rows), 'reactions')
+
+
+class Queue():
+
+    def __init__(self, queue_folder, lease=LEASE, max_attempts=MAX_ATTEMPTS):
+        self.folder = Path(queue_folder)
+        self.config = json.load(open(self.folder / 'queue.json'))
+        self.units = [unit_name(i) for i in range(self.config['units'])]
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.worker = socket.gethostname() + ':' + str(os.getpid())
+
+    def path(self, kind, unit):
+        suffix = {'units': '.json', 'leases': '.lease', 'attempts': '.log', 'errors': '.log', 'done': '.pkl', 'failed': '.json'}[kind]
+        return self.folder / kind / (unit + suffix)
+
+    def finished(self, unit):
+        return self.path('done', unit).exists() or self.path('failed', unit).exists()
+
+    def status(self):
+        counts = {'done': 0, 'failed': 0, 'leased': 0, 'pending': 0}
+        for unit in self.units:
+            if self.path('done', unit).exists():
+                counts['done'] += 1
+            elif self.path('failed', unit).exists():
+                counts['failed'] += 1
+            elif self.path('leases', unit).exists():
+                counts['leased'] += 1
+            else:
+                counts['pending'] += 1
+        return counts
+
+    def attempts(self, unit):
+        try:
+            with open(self.path('attempts', unit)) as f:
+                return sum(1 for _ in f)
+        except FileNotFoundError:
+            return 0
+
+    def take_lease(self, unit):
+        lease = self.path('leases', unit)
+        if lease.exists():
+            try:
+                if time.time() - lease.stat().st_mtime < self.lease:
+                    return False
+                # expired. Another worker may have replaced it with a fresh lease since the stat,
+                # so check what the rename moved before removing it
+                stale = lease.with_name(lease.name + '.stale.' + self.worker.replace(':', '_'))
+                os.rename(lease, stale)
+                if time.time() - stale.stat().st_mtime < self.lease:
+                    try:
+                        os.link(stale, lease)
+                    except FileExistsError:
+                        pass
+                    os.remove(stale)
+                    return False
+                os.remove(stale)
+            except FileNotFoundError:
+                return False
+        try:
+            fd = os.open(lease, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, 'w') as f:
+            f.write(json.dumps({'worker': self.worker, 'claimed': time.time()}))
+        return True
+
+    def owns(self, unit):
+        try:
+            return json.loads(self.path('leases', unit).read_text())['worker'] == self.worker
+        except (FileNotFoundError, ValueError):
+            return False
+
+    def release(self, unit):
+        if self.owns(unit):
+            self.path('leases', unit).unlink(missing_ok=True)
+
+    def claim(self):
+        # the first unit that is not finished and has no live lease, None if there is none right now
+        for unit in self.units:
+            if self.finished(unit) or not self.take_lease(unit):
+                continue
+            if self.finished(unit):
+                self.release(unit)
+                continue
+            with open(self.path('attempts', unit), 'a') as f:
+                f.write(self.worker + '\t' + datetime.datetime.now().isoformat(timespec='seconds') + '\n')
+            if self.attempts(unit) > self.max_attempts:
+                errors = self.path('errors', unit).read_text() if self.path('errors', unit).exists() else ''
+                write_atomic(self.path('failed', unit), json.dumps({'attempts': self.attempts(unit) - 1, 'last_error': errors[-2000:]}))
+                self.release(unit)
+                continue
+            return unit
+        return None
+
+    def heartbeat(self, unit, stop):
+        # keep the lease alive while the unit runs. The lease is briefly gone while another worker checks
+        # whether it is stale, stop only once it belongs to another worker
+        while not stop.wait(self.lease / 3):
+            try:
+                if not self.owns(unit) and self.path('leases', unit).exists():
+                    return
+                os.utime(self.path('leases', unit))
+            except FileNotFoundError:
+                continue
+
+    def complete(self, unit, results):
+        # a unit done twice after a lost lease gives the same results, the last rename wins
+        write_atomic(self.path('done', unit), pickle.dumps(results), 'wb')
+        self.release(unit)
+
+    def fail(self, unit, error):
+        with open(self.path('errors', unit), 'a') as f:
+            f.write('### ' + self.worker + ' ' + datetime.datetime.now().isoformat(timespec='seconds') + '\n' + error + '\n')
+        self.release(unit)
+
+
+def work(queue_folder, rxn_mapper, lease=LEASE, max_attempts=MAX_ATTEMPTS, poll=POLL):
+    queue = Queue(queue_folder, lease, max_attempts)
+    raw_data_folder, data_folder = Path(queue.config['raw_data_folder']), Path(queue.config['data_folder'])
+    cofactors = set(queue.config['cofactors']) if queue.config['cofactors'] else None
+
+    # once for every worker, not for every unit
+    compounds = load_compounds(raw_data_folder)
+    reac_prop = load_reactions(raw_data_folder)
+    inchi_cache = load_inchi_cache(data_folder / 'inchi_cache.tsv')
+    templates = cofactor_templates(cofactors, compounds, rxn_mapper) if cofactors else None
+
+    done = 0
+    start = time.perf_counter()
+    while True:
+        unit = queue.claim()
+        if unit is None:
+            if all(queue.finished(x) for x in queue.units):
+                break
+            # the other units are leased, wait to take over the ones whose worker died
+            time.sleep(poll)
+            continue
+
+        stop = threading.Event()
+        beat = threading.Thread(target=queue.heartbeat, args=(unit, stop), daemon=True)
+        beat.start()
+        try:
+            rows = json.load(open(queue.path('units', unit)))['rows']
+            results = map_reactions(reac_prop.loc[rows], compounds, inchi_cache, rxn_mapper, templates)
+            results['mapper'] = mapper_params(rxn_mapper)
+            queue.complete(unit, results)
+            done += 1
+            print(queue.worker, unit, len(rows), 'reactions', round(results['mapping_s'], 1), 's mapping', flush=True)
+        except Exception:
+            queue.fail(unit, traceback.format_exc())
+            print(queue.worker, unit, 'failed', flush=True)
+        finally:
+            stop.set()
+            beat.join()
+
+    print(queue.worker, 'finished', done, 'units in', round(time.perf_counter() - start, 1), 's', flush=True)
+
+
+def merge(parts):
+    # the map_reactions results of the units, in unit order
+    merged = {'MNXM_RF': [], 'MNXR_RF': [], 'FP_react': [], 'Dists': [], 'reaction_smiles': {},
+              'aam_issues': {}, 'reaction_issues': {}, 'compound_issues': {}, 'cofactor_templates': [], 'mappers': [],
+              'mapped': 0, 'dedup_hits': 0, 'reduced': 0, 'mapping_s': 0.0, 'mapping_calls': 0}
+    for part in parts:
+        for k in ['MNXM_RF', 'MNXR_RF', 'FP_react', 'Dists']:
+            merged[k] += part[k]
+        merged['reaction_smiles'].update(part['reaction_smiles'])
+        for k, v in part['aam_issues'].items():
+            merged['aam_issues'].setdefault(k, []).extend(v)
+        for k, v in part['reaction_issues'].items():
+            if isinstance(v, dict):
+                merged['reaction_issues'].setdefault(k, {}).update(v)
+            else:
+                merged['reaction_issues'].setdefault(k, set()).update(v)
+        for k, v in part['compound_issues'].items():
+            merged['compound_issues'].setdefault(k, set()).update(v)
+        for k in ['mapped', 'dedup_hits', 'reduced', 'mapping_s', 'mapping_calls']:
+            merged[k] += part[k]
+        # every worker maps the same templates
+        merged['cofactor_templates'] = [tuple(x) for x in part['cofactor_templates']]
+        if part.get('mapper') not in merged['mappers']:
+            merged['mappers'].append(part.get('mapper'))
+    return merged
+
+
+def reduce(queue_folder, legacy=False, allow_partial=False):
+    queue = Queue(queue_folder)
+    status = queue.status()
+    if status['done'] < len(queue.units) and not allow_partial:
+        raise SystemExit('units not done ' + json.dumps(status) + ', use --allow_partial to merge the finished ones')
+
+    raw_data_folder, data_folder = Path(queue.config['raw_data_folder']), Path(queue.config['data_folder'])
+    parts = []
+    for unit in queue.units:
+        if queue.path('done', unit).exists():
+            with open(queue.path('done', unit), 'rb') as f:
+                parts.append(pickle.load(f))
+    results = merge(parts)
+
+    compounds = load_compounds(raw_data_folder)
+    reac_prop = load_reactions(raw_data_folder)
+    report(results, compounds, len(set(reac_prop['#ID'])))
+    print('units', json.dumps(status))
+    write_outputs(data_folder, compounds, results, reac_prop, legacy)
+    write_params(data_folder, 'make_fingerprint_atomMap', {'mappers': results['mappers'], 'reduced': queue.config['cofactors'] is not None,
+                 'cofactors': queue.config['cofactors'], 'cofactor_templates': results['cofactor_templates'], 'legacy': legacy,
+                 'unit_size': queue.config['unit_size'], 'units': status})
+
+
+def local(queue_folder, workers, worker_args):
+    # N worker processes on this machine, as on N nodes
+    start = time.perf_counter()
+    procs = [subprocess.Popen([sys.executable, __file__, 'work', str(queue_folder)] + worker_args) for _ in range(workers)]
+    codes = [p.wait() for p in procs]
+    print('\n' + str(workers), 'workers finished in', round(time.perf_counter() - start, 1), 's, exit codes', codes)
+
+
+
+
+def arguments(args=None):
+    parser = argparse.ArgumentParser(description='SeqFind script for Selenzy')
+    parser.add_argument('action', choices=['init', 'work', 'status', 'reduce', 'local'],
+                        help='create the queue, run a worker, show the progress, merge the results, or all of them on this machine')
+    parser.add_argument('queue_folder',
+                        help='queue directory on a filesystem shared by the workers')
+    parser.add_argument('--data_folder', default=None,
+                        help='init: specify data directory for new files, please end with slash')
+    parser.add_argument('--raw_data_folder', default=None,
+                        help='init: specify data directory for raw databases files, please end with slash')
+    parser.add_argument('--unit_size', type=int, default=UNIT_SIZE,
+                        help='init: reactions per unit')
+    parser.add_argument('--reduced', action='store_true',
+                        help='init: map the reactions without the cofactors, as in make_fingerprint_atomMap.py')
+    parser.add_argument('--cofactors', nargs='+', default=COFACTORS,
+                        help='init: MNXM ids of the cofactors removed in the reduced mode')
+    parser.add_argument('--mapper', choices=MAPPERS, default='rxnmapper',
+                        help='work: atom mapping backend, onnx needs the model exported with atom_mappers.py')
+    parser.add_argument('--onnx_model', default=None,
+                        help='work: exported onnx model for the onnx mapper')
+    parser.add_argument('--threads', type=int, default=None,
+                        help='work: intra op threads for the mapper')
+    parser.add_argument('--lease', type=float, default=LEASE,
+                        help='work: seconds without a heartbeat before another worker takes over a unit')
+    parser.add_argument('--max_attempts', type=int, default=MAX_ATTEMPTS,
+                        help='work: claims of a unit before it is moved to failed')
+    parser.add_argument('--workers', type=int, default=2,
+                        help='local: number of worker processes')
+    parser.add_argument('--legacy', action='store_true',
+                        help='reduce: also write x (the RF vector of every row) and d (the "bit=ra_d|ra_d" strings of every row) to FP_MorgRF.npz, '
+                             'next to y, z, pool_id, pool_x and pool_d_*, for the server that reads x and d')
+    parser.add_argument('--allow_partial', action='store_true',
+                        help='reduce: merge the finished units even if some failed')
+
+    add_arguments(parser)
+
+    arg = parser.parse_args(args=args)
+    return arg
+
+
+if __name__ == '__main__':
+    arg = arguments()
+    cofactors = arg.cofactors if arg.reduced else None
+    worker_args = ['--mapper', arg.mapper, '--lease', str(arg.lease), '--max_attempts', str(arg.max_attempts)]
+    worker_args += (['--onnx_model', arg.onnx_model] if arg.onnx_model else []) + (['--threads', str(arg.threads)] if arg.threads else [])
+
+    if arg.action in ['init', 'local']:
+        if not arg.data_folder or not arg.raw_data_folder:
+            raise SystemExit('init needs --data_folder and --raw_data_folder')
+        init_queue(arg.queue_folder, arg.data_folder, arg.raw_data_folder, arg.unit_size, cofactors)
+    if arg.action == 'work':
+        work(arg.queue_folder, make_mapper(arg.mapper, arg.onnx_model, arg.threads), arg.lease, arg.max_attempts)
+    elif arg.action == 'status':
+        print(json.dumps(Queue(arg.queue_folder).status()))
+    elif arg.action == 'local':
+        local(arg.queue_folder, arg.workers, worker_args)
+    if arg.action in ['reduce', 'local']:
+        with instrument('make_fingerprint_atomMap', arg.metrics, arg.profile):
+            reduce(arg.queue_folder, arg.legacy, arg.allow_partial)
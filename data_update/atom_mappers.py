@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Oct 20 10:14:37 2026
+
+Atom mapping backends for rxnMapper_fun
+
+every backend has the RXNMapper interface, get_attention_guided_atom_maps(rxns) -> [{'mapped_rxn', 'confidence'}]
+    rxnmapper   - the reference PyTorch RXNMapper
+    onnx        - the same albert model exported to ONNX and run with ONNX Runtime on the cpu,
+                  optionally with int8 dynamic quantization. Only the attention head used for the mapping is exported
+
+export the model from the locally installed rxnmapper weights, then check it agrees with the reference
+    python atom_mappers.py export /data_2023/rxnmapper.onnx --quantize
+    python atom_mappers.py compare /data_2023/rxnmapper.int8.onnx --data_folder /data_2023/ --n 500
+the same comparison for the fp32 and int8 models on reactions from make_synthetic_data.py
+    python atom_mappers.py agreement /tmp/onnx_agreement/ --n 100 --threads 1
+
+"""
+
+import numpy as np
+import pandas as pd
+from rdkit.Chem import AllChem
+from pathlib import Path
+import argparse
+import json
+import os
+import re
+import time
+
+MAPPERS = ['rxnmapper', 'onnx']
+
+
+def make_mapper(name='rxnmapper', onnx_file=None, threads=None):
+    if name == 'rxnmapper':
+        from rxnmapper import RXNMapper
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        return RXNMapper()
+    if name == 'onnx':
+        if onnx_file is None:
+            raise ValueError('the onnx mapper needs the exported model, see atom_mappers.py export')
+        return OnnxRXNMapper(onnx_file, threads)
+    raise ValueError('unknown mapper ' + name + ', expected one of ' + ', '.join(MAPPERS))
+
+
+def export_onnx(onnx_file, quantize=False, config=None, opset=17):
+    # the head and layers are those RXNMapper uses with this config, they are stored in the model metadata
+    import onnx
+    import torch
+    from rxnmapper import RXNMapper
+    from transformers import AlbertModel
+
+    reference = RXNMapper(config)
+    head, layers, model_path = reference.head, list(reference.layers), reference.model_path
+    del reference
+    model = AlbertModel.from_pretrained(model_path, output_attentions=True, attn_implementation='eager')
+    model.eval()
+
+    class AttentionHead(torch.nn.Module):
+        # only output the mean attention of the mapping head over the selected layers
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, token_type_ids, attention_mask):
+            attentions = self.model(input_ids=input_ids, token_type_ids=token_type_ids, attention_mask=attention_mask)[2]
+            return torch.stack([attentions[i][:, head] for i in layers], dim=1).mean(dim=1)
+
+    ids = torch.ones((2, 16), dtype=torch.int64)
+    torch.onnx.export(AttentionHead(model), (ids, torch.zeros_like(ids), torch.ones_like(ids)), str(onnx_file),
+                      input_names=['input_ids', 'token_type_ids', 'attention_mask'], output_names=['attention'],
+                      dynamic_axes={x: {0: 'batch', 1: 'tokens'} for x in ['input_ids', 'token_type_ids', 'attention_mask']} |
+                                   {'attention': {0: 'batch', 1: 'tokens', 2: 'tokens'}},
+                      opset_version=opset, dynamo=False)
+
+    exported = onnx.load(str(onnx_file))
+    onnx.helper.set_model_props(exported, {'head': str(head), 'layers': json.dumps(layers), 'model_path': str(model_path)})
+    onnx.save(exported, str(onnx_file))
+    print('written', onnx_file, '\thead', head, 'layers', layers)
+
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        q_file = Path(onnx_file).with_suffix('.int8.onnx')
+        quantize_dynamic(str(onnx_file), str(q_file), weight_type=QuantType.QInt8)
+        print('written', q_file)
+
+
+try:
+    from rxnmapper import RXNMapper as _RXNMapper
+except ImportError:
+    _RXNMapper = object
+
+
+class OnnxModel():
+    # stands in for the albert model of RXNMapper, the attention comes from an ONNX Runtime session
+
+    def __init__(self, onnx_file, threads=None, max_len=512):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads or 0
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(str(onnx_file), options, providers=['CPUExecutionProvider'])
+        self.metadata = self.session.get_modelmeta().custom_metadata_map
+        self.max_len = max_len
+
+    def to(self, device):
+        return self
+
+
+class OnnxRXNMapper(_RXNMapper):
+    # RXNMapper with the transformer replaced by an ONNX Runtime session, the attention scoring is unchanged
+
+    def __init__(self, onnx_file, threads=None, config=None):
+        self.onnx_file = onnx_file
+        self.threads = threads
+        super().__init__(config)
+
+        # the exported model fixes the head and layers
+        metadata = self.model.metadata
+        if 'head' in metadata:
+            head, layers = int(metadata['head']), json.loads(metadata['layers'])
+            if config and (config.get('head', head) != head or list(config.get('layers', layers)) != layers):
+                raise ValueError('the onnx model was exported for head ' + str(head) + ' layers ' + str(layers) + ', export it again for this config')
+            self.head, self.layers = head, layers
+        self.max_len = self.model.max_len
+
+    def _load_model_and_tokenizer(self):
+        from rxnmapper.tokenization_smiles import SmilesTokenizer
+
+        with open(os.path.join(self.model_path, 'config.json')) as f:
+            max_len = json.load(f)['max_position_embeddings']
+        tokenizer = SmilesTokenizer(os.path.join(self.model_path, 'vocab.txt'), max_len=max_len)
+        return OnnxModel(self.onnx_file, self.threads, max_len), tokenizer
+
+    def convert_batch_to_attns(self, rxn_smiles_list, force_layer=None, force_head=None):
+        import torch
+        if force_layer is not None or force_head is not None:
+            raise ValueError('the layer and head are fixed when the onnx model is exported')
+
+        encoded = self.tokenizer.batch_encode_plus(rxn_smiles_list, padding=True, return_tensors='np')
+        if encoded['input_ids'].shape[1] > self.max_len:
+            raise ValueError('Reaction SMILES has ' + str(encoded['input_ids'].shape[1]) + ' tokens, should be at most ' + str(self.max_len) + '.')
+
+        inputs = {k: encoded[k].astype(np.int64) for k in ['input_ids', 'token_type_ids', 'attention_mask']}
+        attns = self.model.session.run(['attention'], inputs)[0]
+        masks = encoded['attention_mask'].astype(bool)
+        return [torch.from_numpy(a[m][:, m]) for a, m in zip(attns, masks)]
+
+
+def reacting_atoms(mapped_rxn):
+    rxn = AllChem.ReactionFromSmarts(mapped_rxn, useSmiles=True)
+    rxn.Initialize()
+    return rxn.GetReactingAtoms(mappedAtomsOnly=True)
+
+
+def map_all(mapper, rxns):
+    start = time.perf_counter()
+    results = []
+    for rxn in rxns:
+        try:
+            results.append(mapper.get_attention_guided_atom_maps([rxn])[0])
+        except Exception:
+            results.append(None)
+    return results, time.perf_counter() - start
+
+
+def compare_mappers(reference, candidate, rxns):
+    # agreement of the reacting atoms and confidence, and the throughput of each mapper
+    ref, t_ref = map_all(reference, rxns)
+    cand, t_cand = map_all(candidate, rxns)
+
+    same_map, same_atoms, conf_diff, failed = 0, 0, [], 0
+    for r, c in zip(ref, cand):
+        if r is None or c is None:
+            failed += (r is None) != (c is None)
+            continue
+        same_map += r['mapped_rxn'] == c['mapped_rxn']
+        same_atoms += reacting_atoms(r['mapped_rxn']) == reacting_atoms(c['mapped_rxn'])
+        conf_diff.append(abs(r['confidence'] - c['confidence']))
+
+    n = len(conf_diff)
+    report = {'reactions': len(rxns), 'compared': n, 'failed_in_one': failed,
+              'same_mapping': same_map / n if n else float('nan'),
+              'same_reacting_atoms': same_atoms / n if n else float('nan'),
+              'mean_abs_confidence_diff': float(np.mean(conf_diff)) if n else float('nan'),
+              'max_abs_confidence_diff': float(np.max(conf_diff)) if n else float('nan'),
+              'reference_per_s': len(rxns) / t_ref, 'candidate_per_s': len(rxns) / t_cand}
+    return report
+
+
+def sample_reactions(data_folder, n, seed=0):
+    # reactions from reac_smi.csv that the mapper can process
+    reac_smi = pd.read_csv(data_folder / 'reac_smi.csv')
+    smiles = reac_smi.SMILES[~reac_smi.SMILES.str.contains('*', regex=False)]
+    return list(smiles.sample(min(n, len(smiles)), random_state=seed))
+
+
+
+
+def synthetic_reactions(work_folder, n, scale=100, seed=0):
+    # reaction smiles of the make_synthetic_data.py inputs, so the agreement can be reproduced without a data release
+    import make_synthetic_data
+    raw = Path(work_folder) / 'raw_data'
+    make_synthetic_data.write_files(raw, Path(work_folder) / 'legacy', scale, seed)
+    chem_prop = pd.read_csv(raw / 'chem_prop.tsv', skiprows=351, sep='\t')
+    smiles = dict(zip(chem_prop['#ID'], chem_prop['SMILES'].fillna('')))
+    reac_prop = pd.read_csv(raw / 'reac_prop.tsv', skiprows=351, sep='\t')
+
+    rxns = []
+    for equation in reac_prop['mnx_equation']:
+        sides = [[(int(c), x.split('@')[0]) for c, x in re.findall(r'(\d+) (\S+@\S+)', side)] for side in equation.split(' = ')]
+        if len(sides) == 2 and all(sides) and all(smiles.get(x) for side in sides for _, x in side):
+            rxns.append('>>'.join(['.'.join([smiles[x] for c, x in side for _ in range(c)]) for side in sides]))
+    return rxns[:n]
+
+
+def agreement(work_folder, n=100, scale=100, seed=0, threads=None):
+    # export the fp32 and int8 models and compare both with the reference on synthetic reactions
+    work_folder = Path(work_folder)
+    work_folder.mkdir(parents=True, exist_ok=True)
+    export_onnx(work_folder / 'rxnmapper.onnx', quantize=True)
+    rxns = synthetic_reactions(work_folder, n, scale, seed)
+    reference = make_mapper('rxnmapper', threads=threads)
+
+    reports = {}
+    for name in ['rxnmapper.onnx', 'rxnmapper.int8.onnx']:
+        reports[name] = compare_mappers(reference, make_mapper('onnx', work_folder / name, threads), rxns)
+    keys = list(reports[name])
+    print('\n' + '\t'.join([''] + list(reports)))
+    for k in keys:
+        print(k, '\t', '\t'.join([str(round(r[k], 4)) if isinstance(r[k], float) else str(r[k]) for r in reports.values()]))
+    return reports
+
+
+
+
+def arguments(args=None):
+    parser = argparse.ArgumentParser(description='SeqFind script for Selenzy')
+    parser.add_argument('action', choices=['export', 'compare', 'agreement'],
+                        help='export the rxnmapper model to onnx, compare an exported model with the reference, '
+                             'or export both models into a folder and compare them on synthetic reactions')
+    parser.add_argument('onnx_file',
+                        help='onnx model file, the work folder for agreement')
+    parser.add_argument('--quantize', action='store_true',
+                        help='also write an int8 dynamically quantized model, <onnx_file>.int8.onnx')
+    parser.add_argument('--data_folder', default=None,
+                        help='compare: data folder with reac_smi.csv to take the comparison reactions from')
+    parser.add_argument('--n', type=int, default=200,
+                        help='number of reactions to compare')
+    parser.add_argument('--scale', type=int, default=100,
+                        help='agreement: scale of the synthetic inputs (see make_synthetic_data.py)')
+    parser.add_argument('--threads', type=int, default=None,
+                        help='intra op threads for both mappers')
+
+    arg = parser.parse_args(args=args)
+    return arg
+
+
+if __name__ == '__main__':
+    arg = arguments()
+    if arg.action == 'export':
+        export_onnx(Path(arg.onnx_file), arg.quantize)
+    elif arg.action == 'agreement':
+        agreement(Path(arg.onnx_file), arg.n, arg.scale, threads=arg.threads)
+    else:
+        if not arg.data_folder:
+            raise SystemExit('compare needs --data_folder')
+        rxns = sample_reactions(Path(arg.data_folder), arg.n)
+        report = compare_mappers(make_mapper('rxnmapper', threads=arg.threads), make_mapper('onnx', arg.onnx_file, arg.threads), rxns)
+        for k, v in report.items():
+            print(k, '\t', round(v, 4) if isinstance(v, float) else v)
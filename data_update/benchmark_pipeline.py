@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 14:10:26 2026
+
+Time and memory benchmarks for every data_update stage and the hot helpers,
+run on the synthetic inputs from make_synthetic_data.py
+
+RXNMapper is replaced by StubMapper unless --rxnmapper is given, so the suite runs offline
+results are saved as json, use --compare with a previous json to see the change
+
+"""
+
+import numpy as np
+import pandas as pd
+from rdkit import Chem
+from rdkit import RDLogger
+from pathlib import Path
+from contextlib import redirect_stdout
+import argparse
+import datetime
+import io
+import json
+import platform
+import shutil
+import sys
+import time
+import tracemalloc
+
+import make_synthetic_data
+import filter_reactions
+import make_reac_seq_from_brenda_expasy
+import make_inchi_cache
+import make_fingerprint_atomMap
+import make_seq_org_fasta_uniprotAPI
+import make_org_lineage
+import make_org_distance
+import make_seq_props
+import make_seq_clusters
+import make_bit_fingerprints
+import make_rf_lsh
+import make_rf_shards
+import make_reaction_graph
+import make_lookup_tables
+import make_database
+
+
+class StubMapper():
+    # maps the atoms by element in the order they appear, with the RXNMapper interface
+
+    def get_attention_guided_atom_maps(self, rxns):
+        results = []
+        for rxn in rxns:
+            subs, prods = [Chem.MolFromSmiles(x) for x in rxn.split('>>')]
+            free = {}
+            for a in subs.GetAtoms():
+                a.SetAtomMapNum(a.GetIdx() + 1)
+                free.setdefault(a.GetSymbol(), []).append(a.GetIdx() + 1)
+            for a in prods.GetAtoms():
+                if free.get(a.GetSymbol()):
+                    a.SetAtomMapNum(free[a.GetSymbol()].pop(0))
+            results.append({'mapped_rxn': Chem.MolToSmiles(subs) + '>>' + Chem.MolToSmiles(prods), 'confidence': 1.0})
+        return results
+
+
+def measure(fun, *args, repeats=1, memory=True):
+    # best wall time over the repeats, then the peak traced memory of one more call
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fun(*args)
+        times.append(time.perf_counter() - start)
+    result = {'time': min(times)}
+
+    if memory:
+        tracemalloc.start()
+        fun(*args)
+        result['peak_mb'] = tracemalloc.get_traced_memory()[1] / 1e6
+        tracemalloc.stop()
+    return result
+
+
+def run_stages(raw, legacy, data, rxn_mapper, memory=True):
+    results = {}
+    results['filter_reactions.run (one)'] = measure(filter_reactions.run, raw, data, memory=memory)
+    results['make_reac_seq_from_brenda_expasy.run'] = measure(make_reac_seq_from_brenda_expasy.run, raw, data, legacy, memory=memory)
+    results['filter_reactions.run (enzymes)'] = measure(filter_reactions.run, raw, data, memory=memory)
+    results['make_inchi_cache.run'] = measure(make_inchi_cache.run, raw, data, memory=memory)
+    results['make_fingerprint_atomMap.run'] = measure(make_fingerprint_atomMap.run, raw, data, rxn_mapper, memory=memory)
+    shutil.copy(data / 'Morgan/FP_Morg.npz', data / 'FP_Morg.npz')
+    shutil.copy(data / 'Morgan/RF/FP_MorgRF.npz', data / 'FP_MorgRF.npz')
+    results['make_seq_org_fasta_uniprotAPI.run'] = measure(make_seq_org_fasta_uniprotAPI.run, raw, data, legacy, memory=memory)
+    results['make_org_lineage.run'] = measure(make_org_lineage.run, raw, data, memory=memory)
+    results['make_org_distance.run'] = measure(make_org_distance.run, raw, data, memory=memory)
+    results['filter_reactions.run (final)'] = measure(filter_reactions.run, raw, data, memory=memory)
+    shutil.copy(raw / 'uniprot_sprot.fasta', data / 'seqs.fasta')
+    results['make_seq_props.run'] = measure(make_seq_props.run, raw, data, memory=memory)
+    results['make_seq_clusters.run'] = measure(make_seq_clusters.run, raw, data, memory=memory)
+    results['make_bit_fingerprints.run'] = measure(make_bit_fingerprints.run, raw, data, memory=memory)
+    results['make_rf_lsh.run'] = measure(make_rf_lsh.run, raw, data, memory=memory)
+    results['make_rf_shards.run'] = measure(make_rf_shards.run, raw, data, memory=memory)
+    # a larger count first, the final shards must not keep its files
+    make_rf_shards.write_shards(data, 7)
+    make_rf_shards.write_shards(data, make_rf_shards.N_SHARDS)
+    problems = make_rf_shards.verify(data, n=20)
+    if problems:
+        raise AssertionError('make_rf_shards: ' + '; '.join(problems))
+    results['make_reaction_graph.run'] = measure(make_reaction_graph.run, raw, data, memory=memory)
+    results['make_lookup_tables.run'] = measure(make_lookup_tables.run, raw, data, memory=memory)
+    results['make_database.run'] = measure(make_database.run, raw, data, memory=memory)
+    return results
+
+
+def loop(fun, items):
+    for x in items:
+        fun(*x)
+
+
+def read_brenda(file_path):
+    brenda = make_reac_seq_from_brenda_expasy.DataSet()
+    make_reac_seq_from_brenda_expasy.Brenda.read_file(brenda, file_path)
+
+
+def run_helpers(raw, data, n_mols=500, repeats=3, memory=True):
+    results = {}
+    fp = make_fingerprint_atomMap
+
+    chem_prop = pd.read_csv(raw / 'chem_prop.tsv', skiprows=351, sep='\t').dropna(subset=['SMILES'])
+    smiles = [x for x in chem_prop.SMILES if '*' not in x and '.' not in x][:n_mols]
+    mols = [Chem.MolFromSmiles(x) for x in smiles]
+    morg = [fp.get_morg(m) for m in mols]
+
+    results['get_morg'] = measure(loop, fp.get_morg, [[m] for m in mols], repeats=repeats, memory=memory)
+    results['getAtomFragments'] = measure(loop, fp.getAtomFragments, [[x[0], x[3], x[4]] for x in morg], repeats=repeats, memory=memory)
+
+    # treat the first and middle atoms as the reacting atoms
+    comps = [[m, x[4], x[0], x[3]] for m, x in zip(mols, morg) if m.GetNumAtoms() > 1]
+    results['reactFragDists'] = measure(loop, fp.reactFragDists, [[c, set([0, c[0].GetNumAtoms()//2])] for c in comps], repeats=repeats, memory=memory)
+
+    results['Brenda.read_file'] = measure(read_brenda, raw / 'brenda_2023_1.txt', repeats=repeats, memory=memory)
+
+    fasta_file = str(raw / 'uniprot_sprot.fasta')
+    results['create_taxonomy_dict'] = measure(make_seq_org_fasta_uniprotAPI.create_taxonomy_dict, fasta_file, repeats=repeats, memory=memory)
+
+    uniprot_dict, taxonomy_dict, taxonomy_code_dict, tax_names = make_seq_org_fasta_uniprotAPI.create_taxonomy_dict(fasta_file)
+    brenda = pd.read_csv(raw / 'brenda_data.tsv', sep='\t').drop_duplicates()
+    brenda = brenda[brenda['org'].isin(set(taxonomy_dict.keys()))]
+    results['write_seq_org2'] = measure(make_seq_org_fasta_uniprotAPI.write_seq_org2, brenda, set(brenda.enz), taxonomy_dict, repeats=repeats, memory=memory)
+    return results
+
+
+def compare(results, baseline_file):
+    baseline = json.load(open(baseline_file))['results']
+    print('\n' + 'benchmark'.ljust(45), 'time (s)'.rjust(10), 'baseline'.rjust(10), 'ratio'.rjust(7), 'peak MB'.rjust(9), 'baseline'.rjust(9))
+    for k, v in results.items():
+        b = baseline.get(k, {})
+        ratio = v['time'] / b['time'] if b.get('time') else float('nan')
+        print(k.ljust(45), str(round(v['time'], 3)).rjust(10), str(round(b.get('time', float('nan')), 3)).rjust(10), str(round(ratio, 2)).rjust(7),
+              str(round(v.get('peak_mb', float('nan')), 1)).rjust(9), str(round(b.get('peak_mb', float('nan')), 1)).rjust(9))
+
+
+def run(work_folder, scale=100, seed=0, use_rxnmapper=False, memory=True, verbose=False, out_file=None, baseline_file=None):
+    RDLogger.DisableLog('rdApp.*')
+    raw, legacy, data = work_folder / 'raw_data/', work_folder / 'legacy/', work_folder / 'data/'
+    for x in [raw, legacy, data]:
+        if x.exists():
+            shutil.rmtree(x)
+    data.mkdir(parents=True)
+
+    if use_rxnmapper:
+        from rxnmapper import RXNMapper
+        rxn_mapper = RXNMapper()
+    else:
+        rxn_mapper = StubMapper()
+
+    with redirect_stdout(sys.stdout if verbose else io.StringIO()):
+        make_synthetic_data.write_files(raw, legacy, scale, seed)
+        results = run_stages(raw, legacy, data, rxn_mapper, memory)
+        results.update(run_helpers(raw, data, memory=memory))
+
+    report = {'meta': {'date': datetime.datetime.now().isoformat(timespec='seconds'), 'scale': scale, 'seed': seed,
+                       'mapper': type(rxn_mapper).__name__, 'python': platform.python_version(), 'machine': platform.machine(),
+                       'numpy': np.__version__, 'pandas': pd.__version__},
+              'results': results}
+
+    out_file = out_file or work_folder / 'benchmark.json'
+    with open(out_file, 'w') as f:
+        json.dump(report, f, indent=1)
+    print('written', out_file)
+
+    if baseline_file:
+        compare(results, baseline_file)
+    else:
+        for k, v in results.items():
+            print(k.ljust(45), round(v['time'], 3), 's', '\t', round(v.get('peak_mb', float('nan')), 1), 'MB')
+
+
+
+
+def arguments(args=None):
+    parser = argparse.ArgumentParser(description='SeqFind script for Selenzy')
+    parser.add_argument('work_folder',
+                        help='specify directory for the synthetic data and results, please end with slash')
+    parser.add_argument('--scale', type=int, default=100,
+                        help='number of synthetic compound families')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--rxnmapper', action='store_true',
+                        help='use RXNMapper instead of the offline stub mapper')
+    parser.add_argument('--no-memory', action='store_true',
+                        help='skip the tracemalloc peak memory pass')
+    parser.add_argument('--verbose', action='store_true',
+                        help='show the output of the stages')
+    parser.add_argument('--out', default=None,
+                        help='json file for the results, defaults to work_folder/benchmark.json')
+    parser.add_argument('--compare', default=None,
+                        help='previous benchmark json to compare against')
+
+    arg = parser.parse_args(args=args)
+    return arg
+
+
+if __name__ == '__main__':
+    arg = arguments()
+    run(Path(arg.work_folder), arg.scale, arg.seed, arg.rxnmapper, not arg.no_memory, arg.verbose, arg.out, arg.compare)
@@ -29,9 +29,16 @@ python filter_reactions.py $NEW_DATA $NEW_DATA_RAW
 echo "\n     Make reac_seq"
 python make_reac_seq_from_brenda_expasy.py $NEW_DATA $NEW_DATA_RAW $OLD_DATA
 
+echo "\n     Make inchi_cache"
+python make_inchi_cache.py $NEW_DATA $NEW_DATA_RAW
+
 echo "\n     Make fingerprints"
-# requires RXNMapper
-python make_fingerprint_atomMap.py $NEW_DATA $NEW_DATA_RAW
+# requires RXNMapper, --legacy keeps x and d in FP_MorgRF.npz for the server
+python make_fingerprint_atomMap.py $NEW_DATA $NEW_DATA_RAW --legacy
+# or on several nodes sharing a queue folder, see atom_map_queue.py
+# python atom_map_queue.py init /shared/queue/ --data_folder $NEW_DATA --raw_data_folder $NEW_DATA_RAW
+# python atom_map_queue.py work /shared/queue/    (on every node)
+# python atom_map_queue.py reduce /shared/queue/ --legacy
 
 echo "\n     Make seq_org"
 python make_seq_org_fasta_uniprotAPI.py $NEW_DATA $NEW_DATA_RAW $OLD_DATA
@@ -39,6 +46,9 @@ python make_seq_org_fasta_uniprotAPI.py $NEW_DATA $NEW_DATA_RAW $OLD_DATA
 echo "\n     Make org_linage"
 python make_org_lineage.py $NEW_DATA $NEW_DATA_RAW
 
+echo "\n     Make org_distance"
+python make_org_distance.py $NEW_DATA $NEW_DATA_RAW
+
 echo "\n     Filter_reactions run two"
 python filter_reactions.py $NEW_DATA $NEW_DATA_RAW
 
@@ -46,6 +56,35 @@ cp $NEW_DATA_RAW"uniprot_sprot.fasta" $NEW_DATA"seqs.fasta"
 cp $NEW_DATA"Morgan/FP_Morg.npz" $NEW_DATA"FP_Morg.npz"
 cp $NEW_DATA"Morgan/RF/FP_MorgRF.npz" $NEW_DATA"FP_MorgRF.npz"
 
+echo "\n     Make seq_props"
+python make_seq_props.py $NEW_DATA $NEW_DATA_RAW
+
+echo "\n     Make seq_clusters"
+python make_seq_clusters.py $NEW_DATA $NEW_DATA_RAW --identity 0.9
+
+echo "\n     Make bit fingerprints"
+python make_bit_fingerprints.py $NEW_DATA $NEW_DATA_RAW
+
+echo "\n     Make RF LSH index (optional)"
+python make_rf_lsh.py $NEW_DATA $NEW_DATA_RAW
+
+echo "\n     Make RF shards"
+python make_rf_shards.py $NEW_DATA $NEW_DATA_RAW --shards 4 --verify 50
+
+echo "\n     Make reaction_graph"
+python make_reaction_graph.py $NEW_DATA $NEW_DATA_RAW
+
+echo "\n     Make alignments of the common candidate sets (optional, needs T-Coffee)"
+python align_runner.py $NEW_DATA $NEW_DATA_RAW --top 500 --timeout 300
+
+echo "\n     Make lookup_tables"
+python make_lookup_tables.py $NEW_DATA $NEW_DATA_RAW
+
+echo "\n     Make database"
+python make_database.py $NEW_DATA $NEW_DATA_RAW
+
+echo "\n     Publish bundle"
+python publish_bundle.py $NEW_DATA $NEW_DATA_RAW --bundles /data_bundles/
 
 echo "\n     Update complete!"
 echo $NEW_DATA
@@ -14,6 +14,9 @@ from pathlib import Path
 from collections import Counter
 from statistics import median
 import argparse
+import time
+
+from metrics import metrics, instrument, add_arguments
 
 # data_folder     = Path('/home/ruth/code/update_selenzyme/selenzyme_update/data_google_cloud_edited/data_untouched2/')
 # raw_data_folder = Path('/home/ruth/code/update_selenzyme/selenzyme_update/data_google_cloud_edited/data_untouched2/')
@@ -25,13 +28,35 @@ import argparse
 
 
 
+def equation_table(reac_prop):
+    # long table with one row per (reaction, side, compound), side 0 is the substrates
+    reac_prop = reac_prop[(reac_prop['#ID'] != "EMPTY") & reac_prop.mnx_equation.notna()]
+    sides = reac_prop.mnx_equation.str.split(' = ', n=1, expand=True)
+
+    long = pd.concat([pd.DataFrame({'mnxr': reac_prop['#ID'].values, 'row': range(len(reac_prop)), 'side': i, 'compound': sides[i].values})
+                      for i in [0, 1]])
+    long['compound'] = long.compound.str.split(' ')
+    long = long.explode('compound')
+    long = long[long.compound.str.contains('MNXM', regex=False, na=False)]
+    long['compound'] = long.compound.str.split('@').str[0]
+    long = long.drop_duplicates(['mnxr', 'side', 'compound']).sort_values(['row', 'side'], kind='stable')
+    return reac_prop['#ID'].drop_duplicates(), long[['mnxr', 'side', 'compound']]
+
+
+def both_sides(long):
+    # keep the reactions that still have a substrate and a product
+    sides = long.groupby('mnxr').side.nunique()
+    return long[long.mnxr.isin(sides.index[sides == 2])]
+
+
 def run(raw_data_folder, data_folder):
+    start = time.perf_counter()
 
     chem_prop = pd.read_csv(raw_data_folder / 'chem_prop.tsv', comment='#', sep='\t')
     chem_prop.columns = ['#ID', 'name', 'reference', 'formula', 'charge', 'mass', 'InChI', 'InChIKey', 'SMILES']
     reac_prop = pd.read_csv(raw_data_folder / 'reac_prop.tsv',  comment='#', sep='\t')
     reac_prop.columns = ['#ID', 'mnx_equation', 'reference', 'classifs', 'is_balanced', 'is_transport']
-
+    t_read = time.perf_counter()
 
 
     reac_seqs = data_folder / 'reac_seqs.tsv'
@@ -39,15 +64,8 @@ def run(raw_data_folder, data_folder):
     reac_smi = data_folder / 'reac_smi.csv'
 
     # get the substrates and products 
-    reaction_compounds = {}
-    compounds = set()
-    for i, row in reac_prop.iterrows():
-        if row['#ID'] == "EMPTY" or type(row.mnx_equation) != str: continue
-        sub, prod = row.mnx_equation.split(' = ')
-        sub = set([x.split('@')[0] for x in sub.split(' ') if 'MNXM' in x])
-        prod = set([x.split('@')[0] for x in prod.split(' ') if 'MNXM' in x])
-        reaction_compounds[row['#ID']] = [sub, prod]
-        compounds = compounds  | set(sub) | set(prod)
+    reactions, long = equation_table(reac_prop)
+    compounds = set(long.compound)
 
 
     # get the compound smiles
@@ -56,8 +74,7 @@ def run(raw_data_folder, data_folder):
     comp_w_smiles = set(chem_prop['#ID'])
 
     # filter out any reactions where the substrates/ products dont have smiles 
-    reaction_compounds2 = {k: [v[0].intersection(comp_w_smiles), v[1].intersection(comp_w_smiles)] for k, v in reaction_compounds.items() if len(v[0].intersection(comp_w_smiles))>0 and  len(v[1].intersection(comp_w_smiles))>0 }
-    compounds2 = set.union(*[x for k, v in reaction_compounds2.items() for x in v])
+    long2 = both_sides(long[long.compound.isin(comp_w_smiles)])
 
 
 
@@ -69,61 +86,64 @@ def run(raw_data_folder, data_folder):
         reactions_enzymes = set(reac_seqs['mnxr']).intersection(reac_prop['#ID'])
 
         # filter out any reactions where the substrates/ products dont have enzymes
-        reaction_compounds3 = {k: v for k, v in reaction_compounds2.items() if k in reactions_enzymes }
-        compounds3 = set.union(*[x for k, v in reaction_compounds3.items() for x in v])
+        long3 = long2[long2.mnxr.isin(reactions_enzymes)]
 
         print('\n filter reactions by enzymes')
-        print('no. reactions before filtering by smiles', len(reaction_compounds))
-        print('no. reactions after filtering by smiles', len(reaction_compounds2))  
-        print('no. reactions after filtering by enzymes', len(reaction_compounds3))
+        print('no. reactions before filtering by smiles', len(reactions))
+        print('no. reactions after filtering by smiles', long2.mnxr.nunique())  
+        print('no. reactions after filtering by enzymes', long3.mnxr.nunique())
         print('')
         print('no. compounds before filtering by reac_prop', len(compounds))
-        print('no. compounds after filtering by smiles', len(compounds2))    
-        print('no. compounds after filtering by enzymes', len(compounds3))
+        print('no. compounds after filtering by smiles', long2.compound.nunique())    
+        print('no. compounds after filtering by enzymes', long3.compound.nunique())
         print('no. enzymes', len(set(reac_seqs.uniprot)))
+        metrics.count('reactions', len(reactions), filter='none')
+        metrics.count('reactions', long2.mnxr.nunique(), filter='smiles')
+        metrics.count('reactions', long3.mnxr.nunique(), filter='enzymes')
+        metrics.count('compounds', len(compounds), filter='none')
+        metrics.count('compounds', long2.compound.nunique(), filter='smiles')
+        metrics.count('compounds', long3.compound.nunique(), filter='enzymes')
         
+        reaction_compounds3 = long3.drop_duplicates(['mnxr', 'compound']).groupby('mnxr', sort=False).compound.agg(','.join)
         with open(raw_data_folder / 'reaction_smiles_enz_filter.tsv', 'w') as f:
             for k, v in reaction_compounds3.items():
-                f.write(k + '\t' + ','.join(list(v[0] | v[1]))+ '\n')
+                f.write(k + '\t' + v + '\n')
                 
                 
         if reac_smi.exists():
             reac_smi = pd.read_csv(reac_smi, skiprows=0, header=None, names=['mnxr', 'smiles'])
-            reac_smi = set(reac_smi.mnxr)
-            reaction_compounds3 = {k: v for k, v in reaction_compounds3.items() if k in reac_smi }
-            compounds3 = set.union(*[x for k, v in reaction_compounds3.items() for x in v])
-            reactions_enzymes = set(reaction_compounds3.keys()).intersection(reac_prop['#ID'])
+            long3 = long3[long3.mnxr.isin(reac_smi.mnxr)]
+            reactions_enzymes = set(long3.mnxr)
             
             print('\n filter by processed reactions')
-            print('no. reactions after processing', len(reaction_compounds3))
-            print('no. compounds after processing', len(compounds3))
-            print('no. enzymes', len(set(reac_seqs.uniprot).intersection(set(reac_seqs.uniprot))))
+            print('no. reactions after processing', long3.mnxr.nunique())
+            print('no. compounds after processing', long3.compound.nunique())
+            metrics.count('reactions', long3.mnxr.nunique(), filter='processed')
+            metrics.count('compounds', long3.compound.nunique(), filter='processed')
+            print('no. enzymes', len(set(reac_seqs.uniprot)))
             
         
         if seq_org.exists():
             seq_org = pd.read_csv(seq_org, sep='\t', header=None, names = ['uniprot', 'org', 'org_name'])
 
-            enz_org = set(seq_org.uniprot)
-            reac_seqs2 = reac_seqs[reac_seqs.uniprot.isin(enz_org)]
-            reactions_enzymes2 = set(reac_seqs2['mnxr']).intersection(reactions_enzymes)
-
-            reaction_compounds4 = {k: v for k, v in reaction_compounds3.items() if k in reactions_enzymes2 }
-            compounds4 = set.union(*[x for k, v in reaction_compounds4.items() for x in v])
+            reac_seqs2 = reac_seqs[reac_seqs.uniprot.isin(seq_org.uniprot)]
+            long4 = long3[long3.mnxr.isin(reac_seqs2.mnxr)]
+            reaction_compounds4 = set(long4.mnxr)
 
             print('\n filter by exnzymes with organisms')
             print('no. reactions after filtering by enzymes with org', len(reaction_compounds4))
-            print('no. compounds after filtering by enzymes with org ', len(compounds4))       
+            print('no. compounds after filtering by enzymes with org ', long4.compound.nunique())       
             
             print('no. enzymes with org', len(set(seq_org.uniprot)))   
             print('no. orgs', len(set(seq_org.org)))  
+            metrics.count('reactions', len(reaction_compounds4), filter='organism')
+            metrics.count('compounds', long4.compound.nunique(), filter='organism')
 
             
             # get extra data 
             reac_prop2 = reac_prop[reac_prop['#ID'].isin(reaction_compounds4)]
-            reac_prop2.loc[:,'source'] = [x.split(':')[0] for x in reac_prop2.reference]
-            print(Counter(reac_prop2.source))
+            print(Counter(reac_prop2.reference.str.split(':').str[0]))
             
-            reac_seqs2 = reac_seqs.loc[reac_seqs.uniprot.isin(enz_org)]
             reac_seqs2 = reac_seqs2.loc[reac_seqs2.mnxr.isin(reaction_compounds4)]
             enz_count = Counter(reac_seqs2.mnxr)
             hist = Counter(enz_count.values())
@@ -145,15 +165,20 @@ def run(raw_data_folder, data_folder):
     # make file to filter the input for make_reac_seqs.py     
     else:
 
-        print('no. reactions before filtering by smiles', len(reaction_compounds))
-        print('no. reactions after filtering by smiles', len(reaction_compounds2))
+        print('no. reactions before filtering by smiles', len(reactions))
+        print('no. reactions after filtering by smiles', long2.mnxr.nunique())
         print('')
         print('no. compounds before filtering by smiles', len(compounds))
-        print('no. compounds after filtering by smiles', len(compounds2))
+        print('no. compounds after filtering by smiles', long2.compound.nunique())
+        metrics.count('reactions', len(reactions), filter='none')
+        metrics.count('reactions', long2.mnxr.nunique(), filter='smiles')
         print('\n made reaction_smiles_filter.txt')
         with open(raw_data_folder / 'reaction_smiles_filter.txt', 'w') as f:
-            for k in reaction_compounds2.keys():
+            for k in long2.mnxr.drop_duplicates():
                 f.write(k + '\n' )
+
+    end = time.perf_counter()
+    print('\ntime read', round(t_read - start, 2), 's\tfilter', round(end - t_read, 2), 's')
             
 
 
@@ -165,6 +190,8 @@ def arguments(args=None):
     parser.add_argument('raw_data_folder',
                         help='specify data directory for raw databases files, please end with slash')
 
+    add_arguments(parser)
+
     arg = parser.parse_args(args=args)
     return arg
 
@@ -173,4 +200,5 @@ if __name__ == '__main__':
     arg = arguments()
     raw_data_folder = Path(arg.raw_data_folder)
     data_folder = Path(arg.data_folder)
-    run(raw_data_folder, data_folder)
\ No newline at end of file
+    with instrument('filter_reactions', arg.metrics, arg.profile):
+        run(raw_data_folder, data_folder)
\ No newline at end of file
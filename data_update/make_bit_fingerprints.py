@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Wed Oct 21 09:12:40 2026
+
+Fold the Morgan count fingerprints into fixed length bit vectors packed into uint64 words,
+so a query is screened against every fingerprint in one pass with AND + popcount
+and only the best candidates are rescored with the exact count Tanimoto
+
+FP_Morg_bits.npz, FP_MorgRF_bits.npz
+    x       - (n_fps, n_bits/64) uint64, bit (id % n_bits) is set for every nonzero id of the fingerprint
+    y       - MNXM for each row, the same rows as FP_Morg.npz / FP_MorgRF.npz
+    z       - MNXR for each row (FP_MorgRF_bits.npz only)
+    n_bits  - length of the folded fingerprints
+
+"""
+
+import numpy as np
+from rdkit import DataStructs
+from pathlib import Path
+import argparse
+import time
+
+from rf_pool import row_vectors
+from publish_bundle import write_params
+
+N_BITS = 2048
+
+# bits set in each byte, for numpy without bitwise_count
+_POPCOUNT8 = np.array([bin(x).count('1') for x in range(256)], dtype=np.uint8)
+
+
+def popcount(words):
+    # number of set bits in each row of packed uint64 words
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(words).sum(axis=-1, dtype=np.int64)
+    return _POPCOUNT8[words.view(np.uint8)].sum(axis=-1, dtype=np.int64)
+
+
+def pack_fingerprints(fps, n_bits=N_BITS):
+    if n_bits % 64:
+        raise ValueError('n_bits should be a multiple of 64, got ' + str(n_bits))
+    ids = [np.fromiter(fp.GetNonzeroElements().keys(), dtype=np.int64) for fp in fps]
+    rows = np.repeat(np.arange(len(ids)), [len(x) for x in ids])
+    bits = np.concatenate(ids) % n_bits if ids else np.zeros(0, dtype=np.int64)
+
+    packed = np.zeros((len(ids), n_bits // 64), dtype=np.uint64)
+    np.bitwise_or.at(packed, (rows, bits >> 6), np.left_shift(np.uint64(1), (bits & 63).astype(np.uint64)))
+    return packed
+
+
+class BitFingerprints():
+
+    def __init__(self, file_path, sparse_file=None):
+        data = np.load(file_path)
+        self.bits = data['x']
+        self.mnxm = data['y']
+        self.mnxr = data['z'] if 'z' in data.files else None
+        self.n_bits = int(data['n_bits'])
+        self.counts = popcount(self.bits)
+        # the count fingerprints, only needed to rescore
+        self.sparse = row_vectors(np.load(sparse_file, allow_pickle=True)) if sparse_file else None
+
+    def screen(self, fp, k=100):
+        # approximate Tanimoto of the folded bits against every row, the k best rows first
+        q = pack_fingerprints([fp], self.n_bits)[0]
+        common = popcount(self.bits & q)
+        union = self.counts + popcount(q) - common
+        scores = common / np.maximum(union, 1)
+
+        k = min(k, len(scores))
+        if k == 0:
+            return np.zeros(0, dtype=np.int64), scores[:0]
+        top = np.argpartition(-scores, k-1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return top, scores[top]
+
+    def search(self, fp, k=10, candidates=200):
+        # screen with the bits, then the exact count Tanimoto for the candidates only
+        if self.sparse is None:
+            raise ValueError('rescoring needs the count fingerprints, give sparse_file')
+        top, approx = self.screen(fp, max(k, candidates))
+        exact = np.array(DataStructs.BulkTanimotoSimilarity(fp, list(self.sparse[top])))
+        order = np.argsort(-exact, kind='stable')[:k]
+        return top[order], exact[order]
+
+
+def benchmark(fps, n=20, k=10, candidates=200):
+    # screening + rescoring against the exact Tanimoto over all the fingerprints, for n queries from the set
+    rng = np.random.default_rng(0)
+    queries = rng.choice(len(fps.sparse), size=min(n, len(fps.sparse)), replace=False)
+    sparse = list(fps.sparse)
+
+    start = time.perf_counter()
+    exact = [np.sort(np.array(DataStructs.BulkTanimotoSimilarity(fps.sparse[q], sparse)))[::-1][:k] for q in queries]
+    t_exact = (time.perf_counter() - start) / len(queries)
+
+    start = time.perf_counter()
+    found = [fps.search(fps.sparse[q], k, candidates)[1] for q in queries]
+    t_bits = (time.perf_counter() - start) / len(queries)
+
+    # many reactions share a fingerprint, so count the hits scoring at least the exact k-th score
+    recall = np.mean([(b >= a[-1]).sum() / len(a) for a, b in zip(exact, found)])
+    print('\ntop', k, 'of', len(sparse), 'fingerprints,', candidates, 'candidates rescored')
+    print('exact\t\t', round(t_exact*1000, 3), 'ms')
+    print('bits + rescore\t', round(t_bits*1000, 3), 'ms', '\t', round(t_exact / t_bits, 1), 'x', '\trecall', round(recall, 3))
+
+
+def run(raw_data_folder, data_folder, n_bits=N_BITS, n_bench=0):
+    for name in ['FP_Morg', 'FP_MorgRF']:
+        data = np.load(data_folder / (name + '.npz'), allow_pickle=True)
+        packed = pack_fingerprints(row_vectors(data), n_bits)
+
+        out = {'x': packed, 'y': data['y'], 'n_bits': np.array(n_bits)}
+        if 'z' in data.files:
+            out['z'] = data['z']
+        np.savez_compressed(data_folder / (name + '_bits.npz'), **out)
+        print(name, len(packed), 'fingerprints', round(packed.nbytes / 1e6, 2), 'MB', '\tmean bits set', round(float(popcount(packed).mean()), 1) if len(packed) else 0)
+
+        if n_bench:
+            benchmark(BitFingerprints(data_folder / (name + '_bits.npz'), data_folder / (name + '.npz')), n_bench)
+    write_params(data_folder, 'make_bit_fingerprints', {'n_bits': n_bits})
+
+
+
+
+def arguments(args=None):
+    parser = argparse.ArgumentParser(description='SeqFind script for Selenzy')
+    parser.add_argument('data_folder',
+                        help='specify data directory for new files, please end with slash')
+    parser.add_argument('raw_data_folder',
+                        help='specify data directory for raw databases files, please end with slash')
+    parser.add_argument('--n_bits', type=int, default=N_BITS,
+                        help='length of the folded fingerprints, a multiple of 64')
+    parser.add_argument('--benchmark', type=int, default=0,
+                        help='time this many queries against the exact Tanimoto over every fingerprint')
+
+    arg = parser.parse_args(args=args)
+    return arg
+
+
+if __name__ == '__main__':
+    arg = arguments()
+    raw_data_folder = Path(arg.raw_data_folder)
+    data_folder = Path(arg.data_folder)
+    run(raw_data_folder, data_folder, arg.n_bits, arg.benchmark)
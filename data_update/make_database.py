@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 10:48:55 2026
+
+Bulk load the pipeline outputs into a single indexed SQLite file, selenzyme.db
+
+tables
+    reac_seqs   - mnxr, up, uniprot, ref, ec             (reac_seqs.tsv)
+    seq_org     - uniprot, taxid, org_name               (seq_org.tsv)
+    reac_smi    - mnxr, smiles                           (reac_smi.csv)
+    reac_prop   - mnxr, mnx_equation, ...                (reac_prop.tsv)
+    org_lineage - taxid, lineage                         (org_lineage.csv)
+    rf          - rf_row, mnxm, mnxr                     (FP_MorgRF.npz y and z)
+    rf_dists    - rf_row, bit, reacting_atom, distance   (FP_MorgRF.npz pool_d_* columns for each row)
+
+"""
+
+import numpy as np
+import pandas as pd
+from pathlib import Path
+import argparse
+import sqlite3
+import time
+
+from rf_dists import RFDists
+
+INDEXES = {'reac_seqs': ['mnxr', 'uniprot'], 'seq_org': ['uniprot', 'taxid'], 'reac_smi': ['mnxr'],
+           'reac_prop': ['mnxr'], 'org_lineage': ['taxid'], 'rf': ['mnxr', 'mnxm'], 'rf_dists': ['rf_row']}
+
+
+def read_outputs(data_folder):
+    tables = {}
+    tables['reac_seqs'] = pd.read_csv(data_folder / 'reac_seqs.tsv', sep='\t', header=None, names=['mnxr', 'up', 'uniprot', 'ref', 'ec'])
+    tables['seq_org'] = pd.read_csv(data_folder / 'seq_org.tsv', sep='\t', header=None, names=['uniprot', 'taxid', 'org_name'])
+    tables['reac_smi'] = pd.read_csv(data_folder / 'reac_smi.csv', header=0, names=['mnxr', 'smiles'])
+    tables['reac_prop'] = pd.read_csv(data_folder / 'reac_prop.tsv', sep='\t', header=None,
+                                      names=['mnxr', 'mnx_equation', 'reference', 'classifs', 'is_balanced', 'is_transport'])
+
+    with open(data_folder / 'org_lineage.csv') as f:
+        lineages = [x.strip() for x in f if x.strip()]
+    tables['org_lineage'] = pd.DataFrame({'taxid': [int(x.split(',')[0]) for x in lineages], 'lineage': lineages})
+
+    rf = np.load(data_folder / 'FP_MorgRF.npz', allow_pickle=True)
+    tables['rf'] = pd.DataFrame({'rf_row': np.arange(len(rf['y'])), 'mnxm': rf['y'], 'mnxr': rf['z']})
+    tables['rf_dists'] = dists_table(RFDists.load(rf))
+    return tables
+
+
+def dists_table(dists):
+    # one row per (rf_row, bit, reacting atom, distance)
+    return pd.DataFrame({'rf_row': dists.rows, 'bit': dists.bit.astype(np.int64), 'reacting_atom': dists.ra, 'distance': dists.dist.astype(np.int32)})
+
+
+def write_database(tables, db_file):
+    if db_file.exists():
+        db_file.unlink()
+
+    con = sqlite3.connect(db_file)
+    con.execute('PRAGMA journal_mode=OFF')
+    con.execute('PRAGMA synchronous=OFF')
+    for name, df in tables.items():
+        df.to_sql(name, con, index=False, chunksize=100000)
+        for col in INDEXES[name]:
+            con.execute('CREATE INDEX idx_' + name + '_' + col + ' ON ' + name + ' (' + col + ')')
+        print(name, len(df), 'rows')
+    con.commit()
+    con.execute('VACUUM')
+    con.close()
+
+
+def benchmark(data_folder, db_file, n=1000):
+    # latency of the enzymes for one reaction, indexed point query vs loading and filtering the tsv
+    start = time.perf_counter()
+    reac_seqs = pd.read_csv(data_folder / 'reac_seqs.tsv', sep='\t', header=None, names=['mnxr', 'up', 'uniprot', 'ref', 'ec'])
+    t_load = time.perf_counter() - start
+
+    rng = np.random.default_rng(0)
+    queries = rng.choice(reac_seqs['mnxr'].unique(), size=n)
+
+    start = time.perf_counter()
+    for q in queries:
+        enz = reac_seqs.loc[reac_seqs['mnxr'] == q, 'uniprot'].values
+    t_tsv = (time.perf_counter() - start) / n
+
+    start = time.perf_counter()
+    con = sqlite3.connect('file:' + str(db_file) + '?mode=ro', uri=True)
+    t_connect = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for q in queries:
+        enz = con.execute('SELECT uniprot FROM reac_seqs WHERE mnxr = ?', (q,)).fetchall()
+    t_db = (time.perf_counter() - start) / n
+    con.close()
+
+    print('\nenzymes for one reaction, mean of', n)
+    print('tsv\tload', round(t_load, 3), 's\tlookup', round(t_tsv*1000, 3), 'ms')
+    print('sqlite\tconnect', round(t_connect, 3), 's\tlookup', round(t_db*1000, 3), 'ms')
+
+
+def run(raw_data_folder, data_folder, n_bench=0):
+    db_file = data_folder / 'selenzyme.db'
+    write_database(read_outputs(data_folder), db_file)
+    print('\nwritten', db_file)
+
+    if n_bench:
+        benchmark(data_folder, db_file, n_bench)
+
+
+
+
+def arguments(args=None):
+    parser = argparse.ArgumentParser(description='SeqFind script for Selenzy')
+    parser.add_argument('data_folder',
+                        help='specify data directory for new files, please end with slash')
+    parser.add_argument('raw_data_folder',
+                        help='specify data directory for raw databases files, please end with slash')
+    parser.add_argument('--benchmark', type=int, default=0,
+                        help='time this many point lookups against the tsv path')
+
+    arg = parser.parse_args(args=args)
+    return arg
+
+
+if __name__ == '__main__':
+    arg = arguments()
+    raw_data_folder = Path(arg.raw_data_folder)
+    data_folder = Path(arg.data_folder)
+    run(raw_data_folder, data_folder, arg.benchmark)
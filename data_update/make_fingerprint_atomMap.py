@@ -28,9 +28,26 @@ import numpy as np
 import os
 from pathlib import Path
 from rdkit.Chem import Draw
-from rxnmapper import RXNMapper
 import argparse
 
+from make_inchi_cache import load_inchi_cache, lookup_inchi
+from metrics import metrics, instrument, add_arguments
+from atom_mappers import make_mapper, MAPPERS
+from rf_dists import encode_dists, RFDists
+from rf_pool import build_pool
+from publish_bundle import write_params
+
+# the small cofactors from make_consensus_dir_EMPTY.py, removed before atom mapping in the reduced mode
+COFACTORS = ['WATER', 'MNXM13', 'MNXM735438', 'MNXM3', 'MNXM40333', 'MNXM64096', 'MNXM10']
+
+# a cofactor is only removed together with its counterpart on the other side of the reaction,
+# both get their reacting fragments from the mapping of the pair. Unpaired cofactors stay in the mapping
+COFACTOR_PAIRS = [('MNXM3', 'MNXM7'),       # ATP / ADP
+                  ('MNXM3', 'MNXM14'),      # ATP / AMP
+                  ('MNXM8', 'MNXM10'),      # NAD+ / NADH
+                  ('MNXM5', 'MNXM6'),       # NADP+ / NADPH
+                  ('MNXM33', 'MNXM38')]     # FAD / FADH2
+
 
 def getAtomFragments(fp1, info1, atomMap):
     # get all the atoms in each fragment
@@ -108,6 +125,7 @@ def reactingFragDists(subDistReact, hitFrags1, fragAtoms1, bi1):
 
     return(bi1_filtered, fragDist)
 
+@metrics.timed('reactFragDists')
 def reactFragDists(comp1, reactAtoms):
     ### set up the requirements  
     molN = comp1[0]
@@ -151,6 +169,45 @@ def clean_up_data(sub_ReactingFragsM):
 
 
 
+def reaction_key(reactantsmiles, productsmiles):
+    # order independent key over the compounds on each side, including the stoichiometry
+    return (tuple(sorted(reactantsmiles)), tuple(sorted(productsmiles)))
+
+
+def side(comp, products):
+    # the products are mapped after the reactants, so a compound on both sides has its product fragments
+    return 'products' if comp in products else 'reactants'
+
+
+def reacting_fragment_vector(rfs, dists):
+    # get the reacting frags in a list
+    rfList1 = [x for k, v in rfs.items() for x in [k]*len(v) ]
+    if len(rfList1) == 0:
+        return None, None
+
+    # make an empty sparse int vector
+    SparseIntVect1 = AllChem.GetMorganFingerprint(Chem.MolFromSmiles(''), 8)
+    # update the empty sparse int vector with the reacting fragments
+    SparseIntVect1.UpdateFromSequence(rfList1)
+
+    # prepare list of distancces
+    distList = []
+    for k in rfs.keys():
+        v = dists[k]
+        distStr = str(k) + '=' + '|'.join([str(x[2]) +'_' + str(int(x[0])) for x in v])
+        distList.append( distStr)
+    return SparseIntVect1, distList
+
+
+def object_array(items):
+    # ragged lists have to be stored as a 1d object array
+    arr = np.empty(len(items), dtype=object)
+    for i, x in enumerate(items):
+        arr[i] = x
+    return arr
+
+
+@metrics.timed('rxnMapper_fun')
 def rxnMapper_fun(subsmiles, prodsmiles, subs_fp, prods_fp, rxn_mapper):   
     
     ### generate a reaction smile and map it - this will rearrange the order of the compounds and ordewr of the atoms
@@ -159,6 +216,11 @@ def rxnMapper_fun(subsmiles, prodsmiles, subs_fp, prods_fp, rxn_mapper):
     # get_attention_guided_atom_maps_for_reactions
     results = rxn_mapper.get_attention_guided_atom_maps([react_smile])[0]  
     smileM, conf = results['mapped_rxn'], results['confidence'] 
+    return mapped_fragments(smileM, subs_fp, prods_fp), conf, react_smile
+
+
+def mapped_fragments(smileM, subs_fp, prods_fp):
+    # reacting fragments of each compound in a mapped reaction smile, the compounds are matched by their fingerprints
     rxn1 = AllChem.ReactionFromSmarts(smileM, useSmiles=True)
     rxn2 = AllChem.ReactionFromSmarts(smileM.split('>>')[1] + '>>' + smileM.split('>>')[0], useSmiles=True)
 
@@ -200,9 +262,60 @@ def rxnMapper_fun(subsmiles, prodsmiles, subs_fp, prods_fp, rxn_mapper):
     if len(reacting_fragments) != len(subs_fp) + len(prods_fp):
         raise Exception("MappingFailure")
         
+    return reacting_fragments
+
+
+def cofactor_templates(cofactors, compounds, rxn_mapper, pairs=COFACTOR_PAIRS):
+    # reacting fragments of both cofactors of every pair with a member in cofactors, mapped once.
+    # A pair the mapper cannot map, or that leaves one of them unchanged, is not reduced
+    comp_smiles, fpd = compounds['comp_smiles'], compounds['fpd']
+    templates = {}
+    for a, b in pairs:
+        if not (a in cofactors or b in cofactors) or a not in fpd or b not in fpd:
+            continue
+        try:
+            template, conf, react_smile = rxnMapper_fun([comp_smiles[a]], [comp_smiles[b]], {a: fpd[a]}, {b: fpd[b]}, rxn_mapper)
+        except Exception:
+            continue
+        if all(len(template[x][0]) for x in (a, b)):
+            templates[(a, b)] = template
+    return templates
+
+
+def cofactor_pairs(subs, prods, templates):
+    # the template pairs with one cofactor on each side of the reaction, each cofactor in one pair
+    pairs, used = [], set()
+    for a, b in templates:
+        if used & {a, b}:
+            continue
+        if (a in subs and b in prods) or (b in subs and a in prods):
+            pairs.append((a, b))
+            used.update((a, b))
+    return pairs
+
+
+def rxnMapper_reduced(subs, prods, subs_count, prods_count, comp_smiles, comp_size, fpd, rxn_mapper, templates):
+    # map the reaction without its cofactor pairs, None if there is no pair or nothing left to map
+    pairs = cofactor_pairs(subs, prods, templates)
+    removed = set([x for pair in pairs for x in pair])
+    core_r, core_p = subs - removed, prods - removed
+    if not pairs or len(core_r) == 0 or len(core_p) == 0:
+        return None
+
+    # orient the reduced reaction again, more atoms on the substrate side
+    reactants_count, products_count = subs_count, prods_count
+    if sum([comp_size[x]* subs_count[x] for x in core_r]) < sum([comp_size[x]* prods_count[x] for x in core_p]):
+        core_r, core_p, reactants_count, products_count = core_p, core_r, prods_count, subs_count
+    rsmiles = [x1 for x in core_r for x1 in [comp_smiles[x]]*reactants_count[x]]
+    psmiles = [x1 for x in core_p for x1 in [comp_smiles[x]]*products_count[x]]
+    reacting_fragments, conf, react_smile = rxnMapper_fun(rsmiles, psmiles, {x: fpd[x] for x in core_r}, {x: fpd[x] for x in core_p}, rxn_mapper)
+
+    for pair in pairs:
+        reacting_fragments.update(templates[pair])
     return reacting_fragments, conf, react_smile
 
 
+@metrics.timed('get_morg')
 def get_morg(mol, inchi=0):   
 
     Chem.SanitizeMol(mol)
@@ -227,18 +340,11 @@ def get_atoms(mol):
         atomMap[end].add(start)     
     return atomMap
 
-def get_inchi(smiles):
-    i= Chem.MolToInchi(Chem.MolFromSmiles(smiles)).split('/')
-    return '/'.join(i[0: min(6, len(i)-1)])
-
-
-def run(raw_data_folder, data_folder):
-
-    reac_prop = pd.read_csv(raw_data_folder / 'reac_prop.tsv', skiprows=351, sep='\t')
+def load_compounds(raw_data_folder):
+    # fingerprints, smiles and sizes of the compounds in the filtered reactions
     chem_prop = pd.read_csv(raw_data_folder / 'chem_prop.tsv', skiprows=351, sep='\t')
     filter_reactions = pd.read_csv(raw_data_folder / 'reaction_smiles_enz_filter.tsv', sep='\t', header=None)
     compounds_in_reactions = set([y for x in filter_reactions[1] for y in str(x).split(',')])
-    filter_reactions = set(filter_reactions[0])
 
 
     #### Get fingerprints for chemicals in the reactions file
@@ -253,7 +359,9 @@ def run(raw_data_folder, data_folder):
     comp_size = dict()
 
     morgan_lost = 0
+    progress = metrics.progress('compounds', len(chem_prop))
     for n, row in chem_prop.iterrows(): 
+        progress.update()
         if row['#ID'] not in compounds_in_reactions: 
             continue
 
@@ -309,14 +417,22 @@ def run(raw_data_folder, data_folder):
     print('\ncompounds', len(MNXM), 'out of', len(compounds_in_reactions), 'fail', len(fail))
 
 
-    fpd = dict(zip(MNXM, FingerprintsM))
+    return {'fingerprints': FingerprintsM, 'mnxm': MNXM, 'fpd': dict(zip(MNXM, FingerprintsM)),
+            'comp_smiles': comp_smiles, 'comp_size': comp_size, 'fail': fail}
 
-    ### Get the reaction fragments
 
-    reac_prop = reac_prop[reac_prop['#ID'].isin(filter_reactions)].reset_index()
+def load_reactions(raw_data_folder):
+    # the rows of reac_prop for the filtered reactions, the index is the row number of the issue reports
+    reac_prop = pd.read_csv(raw_data_folder / 'reac_prop.tsv', skiprows=351, sep='\t')
+    filter_reactions = set(pd.read_csv(raw_data_folder / 'reaction_smiles_enz_filter.tsv', sep='\t', header=None)[0])
+    return reac_prop[reac_prop['#ID'].isin(filter_reactions)].reset_index()
 
 
-    rxn_mapper = RXNMapper()
+def map_reactions(reac_prop, compounds, inchi_cache, rxn_mapper, templates=None):
+    # the reacting fragments and the issues for the rows of reac_prop
+    MNXM, fpd = compounds['mnxm'], compounds['fpd']
+    comp_smiles, comp_size = compounds['comp_smiles'], compounds['comp_size']
+    timer = dict(metrics.timers['rxnMapper_fun'])
 
     reaction_smiles = {}
     aam_issues = {'tooBig':[], 'starSmiles' :[], 'unknown' : [], 'mappingFailure': []}
@@ -328,8 +444,19 @@ def run(raw_data_folder, data_folder):
     FP_react = []
     Dists = []
 
+    # atom mapping results and reacting fragment vectors for each group of reactions with the same smiles
+    mapped = {}
+    rf_vectors = {}
+    dedup_hits = 0
+
+    # in the reduced mode the cofactor pairs get their fragments from the templates (see cofactor_templates)
+    templates = templates or {}
+    reduced = 0
+
     # get the chemical components from reac_prop and reconstruct the smile compounds
+    progress = metrics.progress('reactions', len(reac_prop))
     for rowNo, row in reac_prop.iterrows():
+        progress.update()
 
         if row.is_transport == 'T': 
             reaction_issues['same_sub_prod'].add(row['#ID'])
@@ -371,37 +498,56 @@ def run(raw_data_folder, data_folder):
         subsmiles =  [x1 for x in subs for x1 in  [comp_smiles[x]]*subs_count[x]]
         prodsmiles = [x1 for x in prods for x1 in [comp_smiles[x]]*prods_count[x]] 
         
-        subs_inchi =  set([ get_inchi(comp_smiles[x]) for x in subs])
-        prods_inchi = set([  get_inchi(comp_smiles[x]) for x in prods])
-        if set(subs) == set(prods) or subsmiles == prodsmiles or subs_inchi == prods_inchi:
+        subs_inchi =  set([ lookup_inchi(comp_smiles[x], inchi_cache) for x in subs])
+        prods_inchi = set([  lookup_inchi(comp_smiles[x], inchi_cache) for x in prods])
+        # an empty inchi is a smiles rdkit cannot convert, it says nothing about the compounds being the same
+        same_inchi = subs_inchi == prods_inchi and '' not in subs_inchi
+        if set(subs) == set(prods) or subsmiles == prodsmiles or same_inchi:
             reaction_issues['same_sub_prod'].add(reaction)
             continue
             
         
-        ### AAM
-        try:
-            # for unbalances reactions there need to be more atoms on the substrate side
-            if sum([comp_size[x]* subs_count[x] for x in subs]) >= sum([comp_size[x]* prods_count[x] for x in prods]):
-                s = '.'.join(subsmiles) +'>>'+'.'.join(prodsmiles)
-                reactingAtoms, conf, react_smile = rxnMapper_fun(subsmiles, prodsmiles, {x: fpd[x] for x in subs}, {x: fpd[x] for x in prods}, rxn_mapper)            
-            else:
-                s = '.'.join(prodsmiles) +'>>'+'.'.join(subsmiles)
-                reactingAtoms, conf, react_smile = rxnMapper_fun( prodsmiles, subsmiles, {x: fpd[x] for x in prods},  {x: fpd[x] for x in subs}, rxn_mapper)  
-          
-        except RuntimeError: 
-            aam_issues['tooBig'].append([reaction, rowNo,  s])
-            continue
-        except ValueError: 
-            aam_issues['starSmiles'].append([reaction, rowNo, s])
-            print('star smile',rowNo)
-            continue
-        except Exception:
-            aam_issues['mappingFailure'].append([reaction, rowNo, s])
-            continue       
-        except: 
-            print('other error', rowNo)
+        # for unbalances reactions there need to be more atoms on the substrate side
+        if sum([comp_size[x]* subs_count[x] for x in subs]) >= sum([comp_size[x]* prods_count[x] for x in prods]):
+            reactants, products, reactantsmiles, productsmiles = subs, prods, subsmiles, prodsmiles
+        else:
+            reactants, products, reactantsmiles, productsmiles = prods, subs, prodsmiles, subsmiles
+        s = '.'.join(reactantsmiles) +'>>'+'.'.join(productsmiles)
+
+        ### AAM, once for each group of reactions with the same smiles
+        key = reaction_key(reactantsmiles, productsmiles)
+        if key not in mapped:
+            try:
+                result = None
+                if templates:
+                    result = rxnMapper_reduced(subs, prods, subs_count, prods_count, comp_smiles, comp_size, fpd, rxn_mapper, templates)
+                    reduced += result is not None
+                if result is None:
+                    result = rxnMapper_fun(reactantsmiles, productsmiles, {x: fpd[x] for x in reactants}, {x: fpd[x] for x in products}, rxn_mapper)
+                reactingAtoms, conf, react_smile = result
+                # keyed by side and smiles, the other reactions of the group have their own ids
+                mapped[key] = ['ok', {(side(k, products), comp_smiles[k]): v for k, v in reactingAtoms.items()}]
+            except RuntimeError: 
+                mapped[key] = ['tooBig', None]
+            except ValueError: 
+                mapped[key] = ['starSmiles', None]
+                print('star smile',rowNo)
+            except Exception:
+                mapped[key] = ['mappingFailure', None]
+            except: 
+                print('other error', rowNo)
+                mapped[key] = ['unknown', None]
+        else:
+            dedup_hits += 1
+
+        issue, reactingAtoms = mapped[key]
+        if issue == 'unknown':
             aam_issues['unknown'].append([reaction, s])
             continue
+        if issue != 'ok':
+            aam_issues[issue].append([reaction, rowNo, s])
+            continue
+        reactingAtoms = {x: reactingAtoms[(side(x, products), comp_smiles[x])] for x in subs | prods}
 
         # check that molecules arent missing rfs 
         lostRAs = set([k for k,v in reactingAtoms.items() if len(v[0])==0])
@@ -430,24 +576,14 @@ def run(raw_data_folder, data_folder):
         for comp in subs | prods:
 
             ### get the reacting fragments into a sparse int vector
-            # get the reacting frags in a list
-            rfs, dists = reactingAtoms[comp]
-            rfList1 = [x for k, v in rfs.items() for x in [k]*len(v) ]
-            if len(rfList1) == 0:
+            # the vectors are shared by the reactions with the same smiles
+            comp_key = (key, side(comp, products), comp_smiles[comp])
+            if comp_key not in rf_vectors:
+                rf_vectors[comp_key] = reacting_fragment_vector(*reactingAtoms[comp])
+            SparseIntVect1, distList = rf_vectors[comp_key]
+            if SparseIntVect1 is None:
                 continue
             
-            # make an empty sparse int vector
-            SparseIntVect1 = AllChem.GetMorganFingerprint(Chem.MolFromSmiles(''), 8)
-            # update the empty sparse int vector with the reacting fragments
-            SparseIntVect1.UpdateFromSequence(rfList1)
-            
-            # prepare list of distancces
-            distList = []
-            for k in rfs.keys():
-                v = dists[k]
-                distStr = str(k) + '=' + '|'.join([str(x[2]) +'_' + str(int(x[0])) for x in v])
-                distList.append( distStr)
-            
             # save the data
             MNXM_RF.append(comp)
             MNXR_RF.append(reaction)
@@ -455,7 +591,18 @@ def run(raw_data_folder, data_folder):
             Dists.append(distList)
 
 
-    total_reactions = len(set(reac_prop['#ID']))
+    return {'MNXM_RF': MNXM_RF, 'MNXR_RF': MNXR_RF, 'FP_react': FP_react, 'Dists': Dists, 'reaction_smiles': reaction_smiles,
+            'aam_issues': aam_issues, 'reaction_issues': reaction_issues, 'compound_issues': compound_issues,
+            'mapped': len(mapped), 'dedup_hits': dedup_hits, 'reduced': reduced, 'cofactor_templates': list(templates),
+            'mapping_s': metrics.timers['rxnMapper_fun']['total_s'] - timer['total_s'],
+            'mapping_calls': metrics.timers['rxnMapper_fun']['calls'] - timer['calls']}
+
+
+def report(results, compounds, total_reactions):
+    MNXM_RF, MNXR_RF = results['MNXM_RF'], results['MNXR_RF']
+    reaction_issues, aam_issues = results['reaction_issues'], results['aam_issues']
+    MNXM, fail = compounds['mnxm'], compounds['fail']
+    dedup_hits, reduced = results['dedup_hits'], results['reduced']
 
     print('\n\nsucessful reactions', len(set(MNXR_RF)), 'sucessful compounds', len(set(MNXM_RF)))
     print('\ntotal reactions', total_reactions, 'missing reactions', total_reactions - len(set(MNXR_RF)), 
@@ -467,6 +614,34 @@ def run(raw_data_folder, data_folder):
     print('\nmapping issues', sum([len(x) for x in  aam_issues.values()]), '\t', round( ( sum([len(x) for x in  aam_issues.values()]) /total_reactions)*100 ,3) , '%' )
     for k, v in aam_issues.items(): print(k,  '\t',len(v), '\t', round( (len(v)/total_reactions)*100 ,3) , '%' )
 
+    attempted = results['mapped'] + dedup_hits
+    print('\natom mapping', results['mapped'], 'unique reactions out of', attempted, '\tdedup ratio', round(dedup_hits / attempted, 3) if attempted else 0)
+    print('atom mapping time', round(results['mapping_s'], 1), 's for', results['mapping_calls'], 'calls')
+    if results['cofactor_templates']:
+        print('reduced reactions', reduced, 'cofactor templates', ', '.join(['/'.join(x) for x in results['cofactor_templates']]))
+
+    metrics.count('compounds', len(MNXM), status='fingerprinted')
+    metrics.count('compounds', len(fail), status='failed')
+    metrics.count('reactions', total_reactions, status='total')
+    metrics.count('reactions', len(set(MNXR_RF)), status='successful')
+    metrics.count('atom_mapping_calls', results['mapped'])
+    metrics.count('atom_mapping_dedup_hits', dedup_hits)
+    metrics.count('reduced_reactions', reduced)
+    for k, v in reaction_issues.items(): metrics.count('reaction_issues', len(v), issue=k)
+    for k, v in aam_issues.items(): metrics.count('mapping_issues', len(v), issue=k)
+
+
+def mapper_params(rxn_mapper):
+    # the backend and model of the mapper for the build parameters of the bundle
+    return {'mapper': type(rxn_mapper).__name__, 'threads': getattr(rxn_mapper, 'threads', None),
+            'model': getattr(rxn_mapper, 'onnx_file', None) or getattr(rxn_mapper, 'model_path', None)}
+
+
+def write_outputs(data_folder, compounds, results, reac_prop, legacy=False):
+    FingerprintsM, MNXM = compounds['fingerprints'], compounds['mnxm']
+    MNXM_RF, MNXR_RF, FP_react, Dists = results['MNXM_RF'], results['MNXR_RF'], results['FP_react'], results['Dists']
+    reaction_smiles = results['reaction_smiles']
+
     # save to npz file - full compounds
     outfolderM = data_folder / 'Morgan/'
     outfolderM_RF = data_folder / 'Morgan/RF/'
@@ -478,7 +653,14 @@ def run(raw_data_folder, data_folder):
     # save to npz file 
     #  Morgan data
     np.savez_compressed(outfolderM / 'FP_Morg.npz', x=FingerprintsM , y=MNXM)
-    np.savez_compressed(outfolderM / 'RF/FP_MorgRF.npz', x=FP_react, y=MNXM_RF, z=MNXR_RF, d=Dists )
+    # each unique (vector, distances) pair once, with the pool id of every row (see rf_pool.py), the distances as
+    # integer columns (see rf_dists.py). With legacy also the per row x and "bit=ra_d|ra_d" strings d the server reads
+    rf = build_pool(FP_react, RFDists(encode_dists(Dists)))
+    if legacy:
+        rf['x'] = object_array(FP_react)
+        rf['d'] = object_array(Dists)
+    np.savez_compressed(outfolderM / 'RF/FP_MorgRF.npz', y=MNXM_RF, z=MNXR_RF, **rf)
+    print('unique rf vectors', len(rf['pool_x']), 'of', len(FP_react))
 
 
 
@@ -494,12 +676,66 @@ def run(raw_data_folder, data_folder):
     reac_prop2.to_csv(data_folder / 'reac_prop.tsv', sep='\t', header=None, index=False)
 
 
+def compare_reduced(reac_prop, compounds, inchi_cache, rxn_mapper, templates, n):
+    # map the reactions with a cofactor pair with and without the reduction
+    sides = [[set([x.split(' ')[1].split('@')[0] for x in side.split(' + ') if ' ' in x]) for side in eq.split(' = ')] for eq in reac_prop['mnx_equation']]
+    rows = [i for i, (subs, prods) in zip(reac_prop.index, sides) if cofactor_pairs(subs, prods, templates)][:n]
+    if not rows:
+        print('\nno reactions with a cofactor pair')
+        return
+    full = map_reactions(reac_prop.loc[rows], compounds, inchi_cache, rxn_mapper)
+    reduced = map_reactions(reac_prop.loc[rows], compounds, inchi_cache, rxn_mapper, templates)
+
+    print('\n' + str(len(rows)), 'reactions with a cofactor pair, reduced', reduced['reduced'])
+    print('\t\ttooBig\tmappingFailure\tsuccessful\tmapping time')
+    for name, x in [('full', full), ('reduced', reduced)]:
+        print(name, '\t', len(x['aam_issues']['tooBig']), '\t', len(x['aam_issues']['mappingFailure']), '\t\t', len(set(x['MNXR_RF'])),
+              '\t\t', round(x['mapping_s'], 2), 's')
+    print('speedup\t', round(full['mapping_s'] / reduced['mapping_s'], 2) if reduced['mapping_s'] else '-', 'x')
+
+
+def run(raw_data_folder, data_folder, rxn_mapper=None, cofactors=None, legacy=False, n_bench=0):
+    compounds = load_compounds(raw_data_folder)
+    reac_prop = load_reactions(raw_data_folder)
+    inchi_cache = load_inchi_cache(data_folder / 'inchi_cache.tsv')
+
+    if rxn_mapper is None:
+        rxn_mapper = make_mapper()
+    templates = cofactor_templates(set(cofactors), compounds, rxn_mapper) if cofactors else None
+
+    results = map_reactions(reac_prop, compounds, inchi_cache, rxn_mapper, templates)
+    report(results, compounds, len(set(reac_prop['#ID'])))
+    write_outputs(data_folder, compounds, results, reac_prop, legacy)
+    write_params(data_folder, 'make_fingerprint_atomMap', dict(mapper_params(rxn_mapper), reduced=cofactors is not None,
+                 cofactors=sorted(cofactors) if cofactors else None, cofactor_templates=results['cofactor_templates'], legacy=legacy))
+
+    if n_bench:
+        compare_reduced(reac_prop, compounds, inchi_cache, rxn_mapper, templates or cofactor_templates(set(COFACTORS), compounds, rxn_mapper), n_bench)
+
+
 def arguments(args=None):
     parser = argparse.ArgumentParser(description='SeqFind script for Selenzy')
     parser.add_argument('data_folder', 
                         help='specify data directory for new files, please end with slash')
     parser.add_argument('raw_data_folder',
                         help='specify data directory for raw databases files, please end with slash')
+    parser.add_argument('--mapper', choices=MAPPERS, default='rxnmapper',
+                        help='atom mapping backend, onnx needs the model exported with atom_mappers.py')
+    parser.add_argument('--onnx_model', default=None,
+                        help='exported onnx model for the onnx mapper')
+    parser.add_argument('--threads', type=int, default=None,
+                        help='intra op threads for the mapper, defaults to all cores')
+    parser.add_argument('--reduced', action='store_true',
+                        help='map the reactions without the cofactors, the cofactors get their reacting fragments from a template')
+    parser.add_argument('--cofactors', nargs='+', default=COFACTORS,
+                        help='MNXM ids of the cofactors removed in the reduced mode, with their counterpart from COFACTOR_PAIRS')
+    parser.add_argument('--benchmark', type=int, default=0,
+                        help='map this many reactions with a cofactor pair with and without --reduced and compare tooBig and the mapping time')
+    parser.add_argument('--legacy', action='store_true',
+                        help='also write x (the RF vector of every row) and d (the "bit=ra_d|ra_d" strings of every row) to FP_MorgRF.npz, '
+                             'next to y, z, pool_id, pool_x and pool_d_*, for the server that reads x and d')
+
+    add_arguments(parser)
 
     arg = parser.parse_args(args=args)
     return arg
@@ -510,5 +746,6 @@ if __name__ == '__main__':
     raw_data_folder = Path(arg.raw_data_folder)
     data_folder = Path(arg.data_folder)
 
-    run(raw_data_folder, data_folder)
+    with instrument('make_fingerprint_atomMap', arg.metrics, arg.profile):
+        run(raw_data_folder, data_folder, make_mapper(arg.mapper, arg.onnx_model, arg.threads), arg.cofactors if arg.reduced else None, arg.legacy, arg.benchmark)
 
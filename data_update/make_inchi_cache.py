@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 11:20:31 2026
+
+Canonicalise the compound smiles used in the reactions once, so make_fingerprint_atomMap.py
+can detect reactions with the same substrates and products without calling MolToInchi
+
+inchi_cache.tsv - smiles, truncated inchi, inchikey
+    kept between runs, only smiles that arent already in the cache are computed,
+    smiles rdkit cannot convert have an empty inchi
+
+"""
+
+import pandas as pd
+from rdkit import Chem
+from rdkit import RDLogger
+from pathlib import Path
+from multiprocessing import Pool
+import argparse
+import os
+
+from metrics import metrics
+
+
+def truncate_inchi(inchi):
+    i= inchi.split('/')
+    return '/'.join(i[0: min(6, len(i)-1)])
+
+
+@metrics.timed('get_inchi')
+def get_inchi(smiles):
+    return truncate_inchi(Chem.MolToInchi(Chem.MolFromSmiles(smiles)))
+
+
+def lookup_inchi(smiles, inchi_cache):
+    # fall back to rdkit for smiles that werent canonicalised by this script,
+    # '' for smiles rdkit cannot convert, cached so they are only tried once
+    if smiles not in inchi_cache:
+        try:
+            inchi_cache[smiles] = get_inchi(smiles)
+        except Exception:
+            inchi_cache[smiles] = ''
+    return inchi_cache[smiles]
+
+
+def canonicalise(smiles):
+    RDLogger.DisableLog('rdApp.*')
+    try:
+        inchi = Chem.MolToInchi(Chem.MolFromSmiles(smiles))
+        return smiles, truncate_inchi(inchi), Chem.InchiToInchiKey(inchi) or ''
+    except Exception:
+        return smiles, '', ''
+
+
+def load_inchi_cache(cache_file):
+    # smiles -> truncated inchi
+    if not Path(cache_file).exists():
+        return {}
+    cache = pd.read_csv(cache_file, sep='\t', header=None, names=['smiles', 'inchi', 'inchikey'], keep_default_na=False)
+    return dict(zip(cache['smiles'], cache['inchi']))
+
+
+def update_inchi_cache(cache_file, smiles, processes=None):
+    cached = load_inchi_cache(cache_file)
+    todo = sorted(set(smiles) - set(cached.keys()))
+    print('smiles', len(set(smiles)), 'cached', len(set(smiles)) - len(todo), 'to compute', len(todo))
+
+    failed = 0
+    with Pool(processes or os.cpu_count()) as pool, open(cache_file, 'a') as f:
+        for smile, inchi, inchikey in pool.imap_unordered(canonicalise, todo, chunksize=256):
+            # failures are kept with an empty inchi so the next run doesnt try them again
+            failed += inchi == ''
+            f.write(smile + '\t' + inchi + '\t' + inchikey + '\n')
+    print('failed', failed)
+
+
+def run(raw_data_folder, data_folder, processes=None):
+    chem_prop = pd.read_csv(raw_data_folder / 'chem_prop.tsv', skiprows=351, sep='\t')
+    filter_reactions = pd.read_csv(raw_data_folder / 'reaction_smiles_enz_filter.tsv', sep='\t', header=None)
+    compounds_in_reactions = set([y for x in filter_reactions[1] for y in str(x).split(',')])
+
+    smiles = chem_prop.loc[chem_prop['#ID'].isin(compounds_in_reactions), 'SMILES'].dropna()
+    update_inchi_cache(data_folder / 'inchi_cache.tsv', set(smiles), processes)
+
+
+
+
+def arguments(args=None):
+    parser = argparse.ArgumentParser(description='SeqFind script for Selenzy')
+    parser.add_argument('data_folder',
+                        help='specify data directory for new files, please end with slash')
+    parser.add_argument('raw_data_folder',
+                        help='specify data directory for raw databases files, please end with slash')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='number of worker processes, defaults to the number of cpus')
+
+    arg = parser.parse_args(args=args)
+    return arg
+
+
+if __name__ == '__main__':
+    arg = arguments()
+    raw_data_folder = Path(arg.raw_data_folder)
+    data_folder = Path(arg.data_folder)
+    run(raw_data_folder, data_folder, arg.processes)
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 10:02:17 2026
+
+Compile reac_seqs.tsv, seq_org.tsv and org_lineage.npz into integer lookup arrays
+so the enzymes of a set of reactions are a few array slices instead of DataFrame joins
+
+lookup_tables.npz
+    version         - bundle format version
+    mnxr            - reaction ids, sorted
+    uniprot         - uniprot ids, sorted
+    offsets         - the enzymes of mnxr[i] are seqs[offsets[i]:offsets[i+1]]
+    seqs            - int32 index into uniprot
+    taxid           - taxid for each uniprot, -1 if there is no organism
+    lineage         - row in org_lineage.npz for each uniprot, -1 if there is no lineage
+
+"""
+
+import numpy as np
+import pandas as pd
+from pathlib import Path
+import argparse
+import time
+
+VERSION = 1
+
+
+class LookupTables():
+
+    def __init__(self, file_path):
+        data = np.load(file_path)
+        if int(data['version']) != VERSION:
+            raise ValueError('lookup table version ' + str(int(data['version'])) + ' expected ' + str(VERSION))
+        self.mnxr = data['mnxr']
+        self.uniprot = data['uniprot']
+        self.offsets = data['offsets']
+        self.seqs = data['seqs']
+        self.taxid = data['taxid']
+        self.lineage = data['lineage']
+
+    def reaction_index(self, mnxrs):
+        # position of each reaction, -1 if it has no enzymes
+        if len(self.mnxr) == 0:
+            return np.full(len(mnxrs), -1)
+        idx = np.searchsorted(self.mnxr, mnxrs)
+        idx[idx == len(self.mnxr)] = 0
+        return np.where(self.mnxr[idx] == mnxrs, idx, -1)
+
+    def enzymes(self, mnxrs):
+        # uniprot indices for every reaction in mnxrs, in the same order
+        idx = self.reaction_index(np.asarray(mnxrs, dtype=self.mnxr.dtype))
+        return [self.seqs[self.offsets[i]:self.offsets[i+1]] if i >= 0 else self.seqs[:0] for i in idx]
+
+    def enzyme_table(self, mnxrs):
+        # flat (mnxr, uniprot, taxid) table for the reactions
+        slices = self.enzymes(mnxrs)
+        seqs = np.concatenate(slices) if slices else self.seqs[:0]
+        mnxr = np.repeat(np.asarray(mnxrs), [len(x) for x in slices])
+        return mnxr, self.uniprot[seqs], self.taxid[seqs]
+
+
+def compile_tables(reac_seqs, seq_org, org_taxids):
+    reac_seqs = reac_seqs[['mnxr', 'uniprot']].dropna().drop_duplicates()
+    mnxr, mnxr_idx = np.unique(reac_seqs['mnxr'].to_numpy().astype(str), return_inverse=True)
+    uniprot, uniprot_idx = np.unique(reac_seqs['uniprot'].to_numpy().astype(str), return_inverse=True)
+
+    # sort the links by reaction, then the enzymes of each reaction are a contiguous range
+    order = np.lexsort((uniprot_idx, mnxr_idx))
+    seqs = uniprot_idx[order].astype(np.int32)
+    offsets = np.zeros(len(mnxr) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(np.bincount(mnxr_idx, minlength=len(mnxr)))
+
+    # uniprot -> taxid
+    seq_org = seq_org.drop_duplicates(subset='uniprot', keep='first')
+    seq_org = seq_org[seq_org['uniprot'].isin(uniprot)]
+    taxid = np.full(len(uniprot), -1, dtype=np.int64)
+    taxid[np.searchsorted(uniprot, seq_org['uniprot'].to_numpy())] = pd.to_numeric(seq_org['org'], errors='coerce').fillna(-1).astype(np.int64)
+
+    # uniprot -> row of the lineage matrix
+    lineage = np.full(len(uniprot), -1, dtype=np.int32)
+    if len(org_taxids):
+        order = np.argsort(org_taxids)
+        pos = np.searchsorted(org_taxids, taxid, sorter=order).clip(max=len(org_taxids)-1)
+        found = org_taxids[order[pos]] == taxid
+        lineage[found] = order[pos[found]]
+
+    return {'version': np.array(VERSION), 'mnxr': mnxr, 'uniprot': uniprot, 'offsets': offsets,
+            'seqs': seqs, 'taxid': taxid, 'lineage': lineage}
+
+
+def benchmark(tables, reac_seqs, seq_org, n=50, repeats=20):
+    # compare the array slices against DataFrame filtering for the enzymes of n reactions
+    rng = np.random.default_rng(0)
+    queries = [rng.choice(tables.mnxr, size=min(n, len(tables.mnxr)), replace=False) for _ in range(repeats)]
+
+    start = time.perf_counter()
+    for q in queries:
+        df = reac_seqs[reac_seqs['mnxr'].isin(q)].merge(seq_org, on='uniprot', how='left')
+    t_df = (time.perf_counter() - start) / repeats
+
+    start = time.perf_counter()
+    for q in queries:
+        table = tables.enzyme_table(q)
+    t_arr = (time.perf_counter() - start) / repeats
+
+    print('\nenzymes for', n, 'reactions')
+    print('DataFrame\t', round(t_df*1000, 3), 'ms')
+    print('lookup tables\t', round(t_arr*1000, 3), 'ms', '\t', round(t_df / t_arr, 1), 'x')
+
+
+def run(raw_data_folder, data_folder, n_bench=0):
+    reac_seqs = pd.read_csv(data_folder / 'reac_seqs.tsv', sep='\t', header=None, names=['mnxr', 'up', 'uniprot', 'ref', 'ec'])
+    seq_org = pd.read_csv(data_folder / 'seq_org.tsv', sep='\t', header=None, names=['uniprot', 'org', 'org_name'])
+    org_taxids = np.load(data_folder / 'org_lineage.npz')['y']
+
+    tables = compile_tables(reac_seqs, seq_org, org_taxids)
+    np.savez(data_folder / 'lookup_tables.npz', **tables)
+
+    print('reactions', len(tables['mnxr']), 'enzymes', len(tables['uniprot']), 'links', len(tables['seqs']))
+    print('enzymes without organism', int((tables['taxid'] == -1).sum()), 'without lineage', int((tables['lineage'] == -1).sum()))
+
+    if n_bench:
+        benchmark(LookupTables(data_folder / 'lookup_tables.npz'), reac_seqs, seq_org, n_bench)
+
+
+
+
+def arguments(args=None):
+    parser = argparse.ArgumentParser(description='SeqFind script for Selenzy')
+    parser.add_argument('data_folder',
+                        help='specify data directory for new files, please end with slash')
+    parser.add_argument('raw_data_folder',
+                        help='specify data directory for raw databases files, please end with slash')
+    parser.add_argument('--benchmark', type=int, default=0,
+                        help='time the lookup of the enzymes for this many reactions against DataFrame filtering')
+
+    arg = parser.parse_args(args=args)
+    return arg
+
+
+if __name__ == '__main__':
+    arg = arguments()
+    raw_data_folder = Path(arg.raw_data_folder)
+    data_folder = Path(arg.data_folder)
+    run(raw_data_folder, data_folder, arg.benchmark)
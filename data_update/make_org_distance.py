@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 09:12:40 2026
+
+Precompute the taxonomic distances between the common hosts and every organism in org_lineage.npz
+
+the distance is the number of edges between two organisms in the NCBI taxonomy,
+    depth(a) + depth(b) - 2*depth(lca(a, b))
+    where the lowest common ancestor depth is the length of the shared root first lineage
+
+org_distance.npy       - (n_hosts, n_orgs) uint16 array, load with mmap_mode='r'
+org_distance_index.npz - x is the host taxids (rows), y is the organism taxids (columns)
+
+"""
+
+import numpy as np
+from pathlib import Path
+import argparse
+
+from make_org_lineage import read_lineages, encode_lineages
+from publish_bundle import write_params
+
+# E. coli K-12 MG1655, S. cerevisiae S288C, B. subtilis 168, P. putida KT2440, C. glutamicum ATCC 13032
+HOSTS = [83333, 559292, 224308, 160488, 196627]
+
+
+def lca_depth(lineages, lineage):
+    # length of the shared prefix between one lineage and every row of the matrix
+    width = min(lineages.shape[1], len(lineage))
+    same = (lineages[:, :width] == lineage[:width]) & (lineages[:, :width] != -1)
+    return np.logical_and.accumulate(same, axis=1).sum(axis=1)
+
+
+def distances(lineages, depth, host_lineage, host_depth):
+    return depth + host_depth - 2 * lca_depth(lineages, host_lineage)
+
+
+def load_host_distance(data_folder, host):
+    # one row per host, index it with the organism column to get the distance
+    index = np.load(data_folder / 'org_distance_index.npz')
+    hosts = list(index['x'])
+    orgs = dict(zip(index['y'], range(len(index['y']))))
+    matrix = np.load(data_folder / 'org_distance.npy', mmap_mode='r')
+    return matrix[hosts.index(host)], orgs
+
+
+def run(raw_data_folder, data_folder, hosts=HOSTS):
+    org_lineage = np.load(data_folder / 'org_lineage.npz')
+    lineages, taxids, depth = org_lineage['x'], org_lineage['y'], org_lineage['z']
+
+    # the host lineages are rows of org_lineage.npz, the dump is only read again for hosts that arent in seq_org
+    rows = dict(zip(taxids.tolist(), range(len(taxids))))
+    host_lineages = {x: lineages[rows[x]][:depth[rows[x]]] for x in hosts if x in rows}
+    missing = set(hosts) - set(host_lineages)
+    if missing:
+        extra_taxids, extra_lineages = read_lineages(raw_data_folder / 'taxidlineage.dmp', missing)
+        extra_matrix, extra_depth = encode_lineages(extra_lineages)
+        for i, x in enumerate(extra_taxids):
+            host_lineages[int(x)] = extra_matrix[i][:extra_depth[i]]
+
+    lost = set(hosts) - set(host_lineages)
+    print(len(host_lineages), 'hosts covered', len(lost), 'lost', lost, '\tread from taxidlineage.dmp', len(missing) - len(lost))
+
+    hosts = [x for x in hosts if x in host_lineages]
+    out = np.lib.format.open_memmap(data_folder / 'org_distance.npy', mode='w+', dtype=np.uint16, shape=(len(hosts), len(taxids)))
+    for i, host in enumerate(hosts):
+        out[i] = distances(lineages, depth, host_lineages[host], len(host_lineages[host]))
+    out.flush()
+
+    np.savez(data_folder / 'org_distance_index.npz', x=np.array(hosts), y=taxids)
+    write_params(data_folder, 'make_org_distance', {'hosts': hosts})
+
+    for i, host in enumerate(hosts):
+        if len(taxids):
+            print(host, 'median distance', np.median(out[i]), 'max', out[i].max())
+        else:
+            print(host, 'no organisms')
+
+
+
+
+def arguments(args=None):
+    parser = argparse.ArgumentParser(description='SeqFind script for Selenzy')
+    parser.add_argument('data_folder',
+                        help='specify data directory for new files, please end with slash')
+    parser.add_argument('raw_data_folder',
+                        help='specify data directory for raw databases files, please end with slash')
+    parser.add_argument('--hosts', nargs='+', type=int, default=HOSTS,
+                        help='taxids of the host organisms to precompute distances for')
+
+    arg = parser.parse_args(args=args)
+    return arg
+
+
+if __name__ == '__main__':
+    arg = arguments()
+    raw_data_folder = Path(arg.raw_data_folder)
+    data_folder = Path(arg.data_folder)
+    run(raw_data_folder, data_folder, arg.hosts)
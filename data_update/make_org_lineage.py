@@ -5,42 +5,70 @@ Created on Thu Mar 25 12:34:43 2021
 
 @author: ruth
 
+Map the lineage of every organism in seq_org.tsv
+
+org_lineage.csv - comma separated lineage for each organism, leaf first
+org_lineage.npz - integer encoded lineages,
+    x is a (n_orgs, max_depth) int32 array of ancestor taxids, root first and padded with -1,
+    y is a numpy array of the leaf taxids and z is the length of each lineage
 
 """
 
+import numpy as np
 import pandas as pd
 from pathlib import Path
 import argparse
 
+from metrics import metrics, instrument, add_arguments
 
 
-def run(raw_data_folder, data_folder):
-    data = pd.read_csv(raw_data_folder / 'taxidlineage.dmp', sep = '\t')
-    seq_org = pd.read_csv(data_folder / 'seq_org.tsv', sep = '\t', header=None)
-    required_orgs = set(seq_org[1])
 
+def read_lineages(taxlin_file, required_orgs, chunksize=500000):
+    # stream taxidlineage.dmp and only keep the rows for the required organisms
+    chunks = []
+    reader = pd.read_csv(taxlin_file, sep='\t', header=None, usecols=[0, 2], names=['taxid', 'x', 'lineage', 'y'],
+                         dtype={'taxid': np.int64, 'lineage': str}, chunksize=chunksize)
+    for chunk in reader:
+        chunks.append(chunk[chunk['taxid'].isin(required_orgs)])
+
+    data = pd.concat(chunks, ignore_index=True).drop_duplicates(subset='taxid', keep='last')
 
-    results = {}
-    for i, row in data.iterrows():
+    # lineages run root to leaf, add the leaf if it isnt there (or if there is no lineage)
+    taxid = data['taxid'].astype(str)
+    lineage = data['lineage'].fillna('').str.strip()
+    missing_leaf = lineage.str.split().str[-1] != taxid
+    lineage = lineage.where(~missing_leaf, (lineage + ' ' + taxid).str.strip())
 
-        leaf = row[0]
-        if leaf not in required_orgs:
-            continue
-        
-        if row[2] == row[2]:
-            parents = row[2].split()[::-1]
-            if parents[0] != str(leaf):
-                parents.insert(0, str(leaf))
-        
-        results[leaf]= parents
+    return data['taxid'].to_numpy(), lineage.str.split()
 
 
-    lost = required_orgs - set(results.keys())
-    print(len(results), 'covered', len(lost), 'lost', lost)
+def encode_lineages(lineages):
+    # pack the root first lineages into a padded integer matrix
+    depth = lineages.str.len().to_numpy()
+    flat = np.array([x for lin in lineages for x in lin], dtype=np.int32)
+
+    matrix = np.full((len(depth), depth.max() if len(depth) else 0), -1, dtype=np.int32)
+    matrix[np.arange(matrix.shape[1]) < depth[:, None]] = flat
+    return matrix, depth
+
+
+def run(raw_data_folder, data_folder):
+    seq_org = pd.read_csv(data_folder / 'seq_org.tsv', sep = '\t', header=None)
+    required_orgs = set(pd.to_numeric(seq_org[1], errors='coerce').dropna().astype(np.int64))
+
+    taxids, lineages = read_lineages(raw_data_folder / 'taxidlineage.dmp', required_orgs)
+
+    lost = required_orgs - set(taxids)
+    print(len(taxids), 'covered', len(lost), 'lost', lost)
+    metrics.count('organisms', len(taxids), status='covered')
+    metrics.count('organisms', len(lost), status='lost')
 
     with open(data_folder / 'org_lineage.csv', 'w') as f:
-        for x in results.values():
-            f.write( ','.join(x) +'\n')
+        for x in lineages:
+            f.write( ','.join(x[::-1]) +'\n')
+
+    matrix, depth = encode_lineages(lineages)
+    np.savez_compressed(data_folder / 'org_lineage.npz', x=matrix, y=taxids, z=depth)
 
 
 
@@ -48,11 +76,13 @@ def run(raw_data_folder, data_folder):
 
 def arguments(args=None):
     parser = argparse.ArgumentParser(description='SeqFind script for Selenzy')
-    parser.add_argument('data_folder', 
+    parser.add_argument('data_folder',
                         help='specify data directory for new files, please end with slash')
     parser.add_argument('raw_data_folder',
                         help='specify data directory for raw databases files, please end with slash')
 
+    add_arguments(parser)
+
     arg = parser.parse_args(args=args)
     return arg
 
@@ -61,7 +91,8 @@ if __name__ == '__main__':
     arg = arguments()
     raw_data_folder = Path(arg.raw_data_folder)
     data_folder = Path(arg.data_folder)
-    run(raw_data_folder, data_folder)
+    with instrument('make_org_lineage', arg.metrics, arg.profile):
+        run(raw_data_folder, data_folder)
 
 
 
@@ -16,6 +16,8 @@ import pandas as pd
 from pathlib import Path
 import argparse
 
+from metrics import metrics, instrument, add_arguments
+
 
 class DataSet():
     
@@ -254,6 +256,11 @@ def run(raw_data_folder, data_folder, legacy_folder):
     combi.reactions = set(reac_seqs_new[0])
     missing_reactions = reac_prop.data[~reac_prop.data['mnxr'].isin(combi.reactions)]
 
+    metrics.count('reac_seqs_rows', len(reac_seqs_new))
+    metrics.count('reac_seqs_reactions', len(set(reac_seqs_new[0])))
+    metrics.count('reac_seqs_enzymes', len(set(reac_seqs_new[2])))
+    metrics.count('lost_ecs', len(lost_ecs))
+
     # write file 
     reac_seqs_new.to_csv(data_folder / 'reac_seqs.tsv', sep='\t', header=False, index=False)
 
@@ -268,6 +275,8 @@ def arguments(args=None):
                         help='specify data directory for raw databases files, please end with slash')
     parser.add_argument('legacy_folder',
                         help='specify data directory for previous daata files, please end with slash')
+    add_arguments(parser)
+
     arg = parser.parse_args(args=args)
     return arg
 
@@ -279,4 +288,5 @@ if __name__ == '__main__':
     legacy_folder = Path(arg.legacy_folder)
 
 
-    run(raw_data_folder, data_folder, legacy_folder)
\ No newline at end of file
+    with instrument('make_reac_seq_from_brenda_expasy', arg.metrics, arg.profile):
+        run(raw_data_folder, data_folder, legacy_folder)
\ No newline at end of file
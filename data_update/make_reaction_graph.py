@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 26 09:48:12 2026
+
+Precompute the k most similar reactions for every reaction of reac_smi.csv from the reacting fragment fingerprints,
+so a query for a MetaNetX reaction is a lookup and only new reactions need the live search
+
+the similarity of reactions a and b is symmetric, the mean of
+    the mean over the RF rows of a of the best Tanimoto to an RF row of b
+    the mean over the RF rows of b of the best Tanimoto to an RF row of a
+so a reaction with one common cofactor row is not as similar as a reaction that matches every row.
+Only the candidate reactions, with an RF row in the same LSH bucket (make_rf_lsh.py) as a row of the query, are scored,
+--exact scores every reaction. The unique vectors of the pool (rf_pool.py) are scored once, blocks of reactions
+are scored in a process pool
+
+reaction_graph.npz
+    mnxr        - the reactions, sorted
+    neighbours  - (n_reactions, k) int32 index into mnxr, most similar first, -1 if there are fewer than k
+    scores      - (n_reactions, k) float32 similarity of each neighbour
+    k
+
+"""
+
+import numpy as np
+import pandas as pd
+from rdkit import DataStructs
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import argparse
+import time
+
+from rf_pool import RFPool
+from make_rf_lsh import RFIndex
+from publish_bundle import write_params
+
+K = 20
+BLOCK = 256
+
+# the data of each worker process, loaded once by the pool initializer
+_graph_data = None
+
+
+class GraphData():
+
+    def __init__(self, rf_file, mnxrs=None, lsh_file=None):
+        rf = np.load(rf_file, allow_pickle=True)
+        self.pool = RFPool(rf)
+        rows_mnxr = rf['z'].astype(str)
+        keep = np.isin(rows_mnxr, mnxrs) if mnxrs is not None else np.ones(len(rows_mnxr), dtype=bool)
+
+        # the rows of each reaction are contiguous after sorting
+        self.order = np.flatnonzero(keep)[np.argsort(rows_mnxr[keep], kind='stable')]
+        self.mnxr, self.starts = np.unique(rows_mnxr[self.order], return_index=True)
+        self.sizes = np.diff(np.append(self.starts, len(self.order)))
+        # the reaction of every FP_MorgRF.npz row, -1 for the rows left out
+        self.reaction = np.full(len(rows_mnxr), -1, dtype=np.int64)
+        self.reaction[self.order] = np.repeat(np.arange(len(self.mnxr)), self.sizes)
+        self.index = RFIndex(lsh_file) if lsh_file else None
+
+    def candidates(self, fps):
+        # the reactions sharing an LSH bucket with a row of the query, every reaction without the index
+        if self.index is None:
+            return np.arange(len(self.mnxr))
+        rows = np.concatenate([self.index.candidates(fp) for fp in fps]) if len(fps) else np.zeros(0, dtype=np.int64)
+        found = np.unique(self.reaction[rows])
+        return found[found >= 0]
+
+    def reaction_scores(self, fps, reactions=None):
+        # the symmetric similarity of the query rows to the given reactions, -1 for the reactions not scored
+        scores = np.full(len(self.mnxr), -1.0)
+        reactions = np.arange(len(self.mnxr)) if reactions is None else np.asarray(reactions, dtype=np.int64)
+        if len(fps) == 0 or len(reactions) == 0:
+            return scores
+
+        # Tanimoto of every query row to the rows of the reactions, each pool vector scored once
+        sizes = self.sizes[reactions]
+        starts = np.cumsum(sizes) - sizes
+        rows = self.order[np.repeat(self.starts[reactions] - starts, sizes) + np.arange(sizes.sum())]
+        used, inverse = np.unique(self.pool.id[rows], return_inverse=True)
+        x = [self.pool.x[j] for j in used]
+        matrix = np.array([DataStructs.BulkTanimotoSimilarity(fp, x) for fp in fps])[:, inverse]
+
+        query_to_reaction = np.maximum.reduceat(matrix, starts, axis=1).mean(axis=0)
+        reaction_to_query = np.add.reduceat(matrix.max(axis=0), starts) / sizes
+        scores[reactions] = (query_to_reaction + reaction_to_query) / 2
+        return scores
+
+    def top_k(self, fps, k, exclude=-1, exact=False):
+        scores = self.reaction_scores(fps, None if exact else self.candidates(fps))
+        if exclude >= 0:
+            scores[exclude] = -1
+        k1 = min(k, len(scores))
+        top = np.argpartition(-scores, k1-1)[:k1] if k1 else np.zeros(0, dtype=np.int64)
+        top = top[np.lexsort((top, -scores[top]))]
+        top = top[scores[top] >= 0]
+
+        neighbours = np.full(k, -1, dtype=np.int32)
+        best = np.zeros(k, dtype=np.float32)
+        neighbours[:len(top)] = top
+        best[:len(top)] = scores[top]
+        return neighbours, best
+
+    def query_fps(self, i):
+        rows = self.order[self.starts[i]:self.starts[i+1] if i+1 < len(self.starts) else len(self.order)]
+        return [self.pool.x[j] for j in self.pool.id[rows]]
+
+
+def init_worker(rf_file, mnxrs, lsh_file):
+    global _graph_data
+    _graph_data = GraphData(rf_file, mnxrs, lsh_file)
+
+
+def score_block(block, k):
+    neighbours, scores = [], []
+    for i in block:
+        n, s = _graph_data.top_k(_graph_data.query_fps(i), k, exclude=i)
+        neighbours.append(n)
+        scores.append(s)
+    return block[0], np.array(neighbours), np.array(scores)
+
+
+def build_graph(rf_file, mnxrs, k=K, workers=None, block=BLOCK, lsh_file=None):
+    data = GraphData(rf_file, mnxrs)
+    n = len(data.mnxr)
+    neighbours = np.full((n, k), -1, dtype=np.int32)
+    scores = np.zeros((n, k), dtype=np.float32)
+
+    blocks = [np.arange(i, min(i + block, n)) for i in range(0, n, block)]
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(rf_file, mnxrs, lsh_file)) as pool:
+        for start, n_block, s_block in pool.map(score_block, blocks, [k]*len(blocks)):
+            neighbours[start:start+len(n_block)] = n_block
+            scores[start:start+len(s_block)] = s_block
+    return {'mnxr': data.mnxr, 'neighbours': neighbours, 'scores': scores, 'k': np.array(k)}
+
+
+class ReactionGraph():
+
+    def __init__(self, graph_file, rf_file=None, lsh_file=None):
+        graph = np.load(graph_file)
+        self.mnxr = graph['mnxr']
+        self.neighbours = graph['neighbours']
+        self.scores = graph['scores']
+        self.k = int(graph['k'])
+        # the fingerprints, only needed for the live search
+        self.data = GraphData(rf_file, self.mnxr, lsh_file) if rf_file else None
+
+    def lookup(self, mnxr):
+        # precomputed neighbours of a known reaction as (mnxr, score), None for a new reaction
+        i = np.searchsorted(self.mnxr, mnxr)
+        if i == len(self.mnxr) or self.mnxr[i] != mnxr:
+            return None
+        found = self.neighbours[i] >= 0
+        return list(zip(self.mnxr[self.neighbours[i][found]].tolist(), self.scores[i][found].tolist()))
+
+    def query(self, mnxr=None, fps=None, k=None):
+        # the lookup for a known reaction, otherwise the live search with the RF vectors of the query
+        k = k or self.k
+        if mnxr is not None:
+            found = self.lookup(mnxr)
+            if found is not None:
+                return found[:k]
+        if fps is None or self.data is None:
+            raise ValueError('new reaction, the live search needs its rf vectors and the rf_file')
+        neighbours, scores = self.data.top_k(fps, k)
+        found = neighbours >= 0
+        return list(zip(self.data.mnxr[neighbours[found]].tolist(), scores[found].tolist()))
+
+
+def benchmark(graph, n=50):
+    # lookups against the live search for known reactions, and the neighbours of the LSH candidates against every reaction
+    rng = np.random.default_rng(0)
+    queries = rng.choice(len(graph.mnxr), size=min(n, len(graph.mnxr)), replace=False)
+    if len(queries) == 0:
+        print('\nno reactions to query')
+        return
+
+    start = time.perf_counter()
+    found = [graph.lookup(graph.mnxr[i]) for i in queries]
+    t_lookup = (time.perf_counter() - start) / len(queries)
+
+    start = time.perf_counter()
+    live = []
+    for i in queries:
+        neighbours, scores = graph.data.top_k(graph.data.query_fps(i), graph.k, exclude=i)
+        live.append(list(zip(graph.data.mnxr[neighbours[neighbours >= 0]].tolist(), scores[neighbours >= 0].tolist())))
+    t_live = (time.perf_counter() - start) / len(queries)
+
+    print('\nneighbours for', len(queries), 'known reactions, match', found == live)
+    print('live search\t', round(t_live*1000, 3), 'ms')
+    print('lookup\t\t', round(t_lookup*1000, 3), 'ms', '\t', round(t_live / t_lookup, 1), 'x')
+
+    if graph.data.index is not None:
+        start = time.perf_counter()
+        exact = [graph.data.top_k(graph.data.query_fps(i), graph.k, exclude=i, exact=True) for i in queries]
+        t_exact = (time.perf_counter() - start) / len(queries)
+        # the neighbours scoring at least the exact k-th score, as in the recall of make_rf_lsh.py
+        recall = [(s[n >= 0] >= e_s[e_n >= 0].min()).sum() / (e_n >= 0).sum() for (e_n, e_s), (n, s) in
+                  zip(exact, [graph.data.top_k(graph.data.query_fps(i), graph.k, exclude=i) for i in queries]) if (e_n >= 0).any()]
+        print('every reaction\t', round(t_exact*1000, 3), 'ms', '\t', round(t_exact / t_live, 1), 'x slower than the candidates,',
+              'recall', round(np.mean(recall), 3) if recall else '-')
+
+
+def run(raw_data_folder, data_folder, k=K, workers=None, exact=False, n_bench=0):
+    reac_smi = pd.read_csv(data_folder / 'reac_smi.csv')
+    mnxrs = np.unique(reac_smi.iloc[:, 0].astype(str))
+    lsh_file = data_folder / 'FP_MorgRF_lsh.npz'
+    if exact or not lsh_file.exists():
+        lsh_file = None
+
+    start = time.perf_counter()
+    graph = build_graph(data_folder / 'FP_MorgRF.npz', mnxrs, k, workers, lsh_file=lsh_file)
+    np.savez_compressed(data_folder / 'reaction_graph.npz', **graph)
+    write_params(data_folder, 'make_reaction_graph', {'k': k, 'candidates': 'every reaction' if lsh_file is None else lsh_file.name})
+    print('reaction_graph.npz', len(graph['mnxr']), 'reactions, top', k, 'of', 'every reaction' if lsh_file is None else 'the LSH candidates',
+          '\t', round(time.perf_counter() - start, 2), 's')
+
+    if n_bench:
+        benchmark(ReactionGraph(data_folder / 'reaction_graph.npz', data_folder / 'FP_MorgRF.npz', lsh_file), n_bench)
+
+
+
+
+def arguments(args=None):
+    parser = argparse.ArgumentParser(description='SeqFind script for Selenzy')
+    parser.add_argument('data_folder',
+                        help='specify data directory for new files, please end with slash')
+    parser.add_argument('raw_data_folder',
+                        help='specify data directory for raw databases files, please end with slash')
+    parser.add_argument('--k', type=int, default=K,
+                        help='number of neighbours kept for each reaction')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='processes scoring the blocks, defaults to all cores')
+    parser.add_argument('--exact', action='store_true',
+                        help='score every reaction instead of the candidates of FP_MorgRF_lsh.npz')
+    parser.add_argument('--benchmark', type=int, default=0,
+                        help='compare this many lookups with the live search, and the candidates with every reaction')
+
+    arg = parser.parse_args(args=args)
+    return arg
+
+
+if __name__ == '__main__':
+    arg = arguments()
+    raw_data_folder = Path(arg.raw_data_folder)
+    data_folder = Path(arg.data_folder)
+    run(raw_data_folder, data_folder, arg.k, arg.workers, arg.exact, arg.benchmark)
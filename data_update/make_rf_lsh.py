@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Wed Oct 21 14:37:05 2026
+
+Approximate nearest neighbour index for the reacting fragment fingerprints in FP_MorgRF.npz
+
+every count vector gets a weighted MinHash signature, the id i with count c is the elements (i, 0) ... (i, c-1),
+so the chance two signatures agree at a position is the count Tanimoto sum(min)/sum(max).
+The signatures are cut into bands of rows hashes, rows sharing a band key with the query are the candidates
+that are rescored exactly. More rows per band is faster with lower recall, more bands the opposite
+
+FP_MorgRF_lsh.npz
+    sig         - (n_fps, bands*rows) uint32 signatures, the rows of FP_MorgRF.npz
+    band_keys   - (bands, n_fps) uint64, the band keys of each band sorted
+    band_rows   - (bands, n_fps) int32, the FP_MorgRF.npz row for each sorted key
+    a, b, mult  - the hash function parameters and the multipliers combining a band
+    bands, rows - LSH parameters
+
+"""
+
+import numpy as np
+from rdkit import DataStructs
+from pathlib import Path
+import argparse
+import time
+
+from rf_pool import row_vectors
+from publish_bundle import write_params
+
+BANDS = 32
+ROWS = 3
+PRIME = np.uint64((1 << 31) - 1)
+
+
+def hash_parameters(n, seed=0):
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, int(PRIME), size=n, dtype=np.uint64)
+    b = rng.integers(0, int(PRIME), size=n, dtype=np.uint64)
+    mult = rng.integers(1, 1 << 63, size=n, dtype=np.uint64) | np.uint64(1)
+    return a, b, mult
+
+
+def expand_counts(fps):
+    # one element for each (id, repeat) of the count vectors, with the offset of each fingerprint
+    ids, counts = [], []
+    for fp in fps:
+        elements = fp.GetNonzeroElements()
+        ids.append(np.fromiter(elements.keys(), dtype=np.uint64, count=len(elements)))
+        counts.append(np.fromiter(elements.values(), dtype=np.int64, count=len(elements)))
+    sizes = np.array([x.sum() for x in counts], dtype=np.int64)
+    offsets = np.zeros(len(fps) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(sizes)
+
+    ids = np.concatenate(ids) if ids else np.zeros(0, dtype=np.uint64)
+    counts = np.concatenate(counts) if counts else np.zeros(0, dtype=np.int64)
+    repeat = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    elements = np.repeat(ids, counts) * np.uint64(0x9E3779B1) + repeat.astype(np.uint64)
+    return elements % PRIME, offsets
+
+
+def minhash(fps, a, b, chunk=2**22):
+    elements, offsets = expand_counts(fps)
+    sig = np.full((len(fps), len(a)), int(PRIME), dtype=np.uint32)
+    filled = offsets[1:] > offsets[:-1]
+    starts = offsets[:-1][filled]
+    if len(elements) == 0:
+        return sig
+    # as many hash functions at once as fit in the chunk
+    step = max(1, chunk // len(elements))
+    for j in range(0, len(a), step):
+        h = (a[j:j+step, None] * elements + b[j:j+step, None]) % PRIME
+        sig[filled, j:j+step] = np.minimum.reduceat(h, starts, axis=1).T
+    return sig
+
+
+def band_keys(sig, mult, bands, rows):
+    # (bands, n) keys, wrapping uint64 arithmetic combines the rows hashes of each band
+    sig = sig[:, :bands*rows].astype(np.uint64).reshape(len(sig), bands, rows)
+    return (sig * mult[:rows]).sum(axis=2, dtype=np.uint64).T
+
+
+def build_index(fps, bands=BANDS, rows=ROWS, seed=0):
+    a, b, mult = hash_parameters(bands*rows, seed)
+    sig = minhash(fps, a, b)
+    keys = band_keys(sig, mult, bands, rows)
+    order = np.argsort(keys, axis=1, kind='stable')
+    return {'sig': sig, 'band_keys': np.take_along_axis(keys, order, axis=1), 'band_rows': order.astype(np.int32),
+            'a': a, 'b': b, 'mult': mult, 'bands': np.array(bands), 'rows': np.array(rows)}
+
+
+class RFIndex():
+
+    def __init__(self, file_path, sparse_file=None, index=None):
+        data = index if index is not None else np.load(file_path)
+        self.band_keys = data['band_keys']
+        self.band_rows = data['band_rows']
+        self.a, self.b, self.mult = data['a'], data['b'], data['mult']
+        self.bands, self.rows = int(data['bands']), int(data['rows'])
+        # the count fingerprints, only needed to rescore
+        if sparse_file:
+            rf = np.load(sparse_file, allow_pickle=True)
+            self.sparse = {'x': row_vectors(rf), 'z': rf['z']}
+        else:
+            self.sparse = None
+
+    def candidates(self, fp):
+        # FP_MorgRF.npz rows sharing at least one band with the query
+        keys = band_keys(minhash([fp], self.a, self.b), self.mult, self.bands, self.rows)[:, 0]
+        found = []
+        for band, key in enumerate(keys):
+            lo = np.searchsorted(self.band_keys[band], key, side='left')
+            hi = np.searchsorted(self.band_keys[band], key, side='right')
+            found.append(self.band_rows[band, lo:hi])
+        return np.unique(np.concatenate(found)) if found else np.zeros(0, dtype=np.int32)
+
+    def search(self, fp, k=10):
+        # the candidates rescored with the exact count Tanimoto, returns rows, scores and MNXRs
+        if self.sparse is None:
+            raise ValueError('rescoring needs the count fingerprints, give sparse_file')
+        rows = self.candidates(fp)
+        scores = np.array(DataStructs.BulkTanimotoSimilarity(fp, list(self.sparse['x'][rows]))) if len(rows) else np.zeros(0)
+        order = np.argsort(-scores, kind='stable')[:k]
+        return rows[order], scores[order], self.sparse['z'][rows[order]]
+
+
+def evaluate(fps, mnxr, bands=BANDS, rows=ROWS, holdout=0.1, n=50, k=10, seed=0):
+    # index the reactions that are not held out, query with the held out reactions
+    rng = np.random.default_rng(seed)
+    reactions = np.unique(mnxr)
+    held = rng.choice(reactions, size=max(1, int(len(reactions)*holdout)), replace=False)
+    test = np.isin(mnxr, held)
+    train_rows = np.flatnonzero(~test)
+    queries = rng.choice(np.flatnonzero(test), size=min(n, int(test.sum())), replace=False)
+    train = list(fps[train_rows])
+
+    index = RFIndex(None, index=build_index(train, bands, rows, seed))
+    index.sparse = {'x': fps[train_rows], 'z': mnxr[train_rows]}
+
+    start = time.perf_counter()
+    exact = [np.sort(np.array(DataStructs.BulkTanimotoSimilarity(fps[q], train)))[::-1][:k] for q in queries]
+    t_exact = (time.perf_counter() - start) / len(queries)
+
+    start = time.perf_counter()
+    found = [index.search(fps[q], k) for q in queries]
+    t_lsh = (time.perf_counter() - start) / len(queries)
+
+    # many reactions share a fingerprint, so count the hits scoring at least the exact k-th score
+    recall = np.mean([(f[1] >= e[-1]).sum() / len(e) for e, f in zip(exact, found)])
+    n_cand = np.mean([len(index.candidates(fps[q])) for q in queries])
+    return {'bands': bands, 'rows': rows, 'recall': recall, 'candidates': n_cand / len(train),
+            'exact_ms': t_exact*1000, 'lsh_ms': t_lsh*1000, 'speedup': t_exact / t_lsh}
+
+
+def run(raw_data_folder, data_folder, bands=BANDS, rows=ROWS, n_bench=0):
+    rf = np.load(data_folder / 'FP_MorgRF.npz', allow_pickle=True)
+    fps, mnxr = row_vectors(rf), rf['z']
+
+    start = time.perf_counter()
+    index = build_index(list(fps), bands, rows)
+    np.savez(data_folder / 'FP_MorgRF_lsh.npz', **index)
+    write_params(data_folder, 'make_rf_lsh', {'bands': bands, 'rows': rows})
+    print('FP_MorgRF_lsh.npz', len(fps), 'fingerprints', bands, 'bands of', rows, 'rows', '\t', round(time.perf_counter() - start, 2), 's')
+
+    if n_bench:
+        print('\nrecall@10 on', n_bench, 'held out reactions')
+        print('bands\trows\trecall\tcandidates\texact ms\tlsh ms\tspeedup')
+        for b, r in [(bands, max(1, rows-1)), (bands, rows), (bands, rows+1), (max(1, bands//2), rows), (bands*2, rows)]:
+            e = evaluate(fps, mnxr, b, r, n=n_bench)
+            print(e['bands'], '\t', e['rows'], '\t', round(e['recall'], 3), '\t', round(e['candidates'], 3), '\t\t',
+                  round(e['exact_ms'], 3), '\t\t', round(e['lsh_ms'], 3), '\t', round(e['speedup'], 1))
+
+
+
+
+def arguments(args=None):
+    parser = argparse.ArgumentParser(description='SeqFind script for Selenzy')
+    parser.add_argument('data_folder',
+                        help='specify data directory for new files, please end with slash')
+    parser.add_argument('raw_data_folder',
+                        help='specify data directory for raw databases files, please end with slash')
+    parser.add_argument('--bands', type=int, default=BANDS,
+                        help='number of LSH bands, more bands find more candidates')
+    parser.add_argument('--rows', type=int, default=ROWS,
+                        help='minhashes in each band, more rows find fewer candidates')
+    parser.add_argument('--benchmark', type=int, default=0,
+                        help='measure recall@10 and the speedup over the exhaustive scan for this many held out reactions')
+
+    arg = parser.parse_args(args=args)
+    return arg
+
+
+if __name__ == '__main__':
+    arg = arguments()
+    raw_data_folder = Path(arg.raw_data_folder)
+    data_folder = Path(arg.data_folder)
+    run(raw_data_folder, data_folder, arg.bands, arg.rows, arg.benchmark)
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Thu Oct 22 15:21:34 2026
+
+Split FP_MorgRF.npz and FP_Morg.npz into shards by hashing the MNXR, and search them scatter-gather
+
+shards/FP_MorgRF_<i>.npz    - the FP_MorgRF.npz rows with crc32(MNXR) % n_shards == i, y, z, d and the pool of these rows
+                              (rf_pool.py), and row, the row in FP_MorgRF.npz
+shards/FP_Morg_<i>.npz      - the FP_Morg.npz compounds used by the reactions of the shard
+shards/shards.json          - number of shards, the files and their row counts
+shards is a symlink to the versioned folder .shards.<random> of the last run, replaced in one rename
+
+a query is sent to every shard, each returns its top k and the results are merged
+    LocalShard      - the shard in this process
+    ProcessShard    - the shard loaded in its own process
+    RemoteShard     - a shard served on another node, python make_rf_shards.py /data_2023/ /data_2023/ --serve 3 --port 8770
+all three have search(query, k) with the query as fp.ToBinary(), so they can replace each other
+
+"""
+
+import numpy as np
+from rdkit import DataStructs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import multiprocessing
+import http.client
+import argparse
+import base64
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zlib
+
+from rf_pool import row_vectors, subset_pool
+from publish_bundle import write_params
+
+N_SHARDS = 4
+
+
+def shard_of(mnxrs, n_shards):
+    # crc32 so the shard of a reaction is the same on every machine and python run
+    return np.array([zlib.crc32(str(x).encode()) % n_shards for x in mnxrs], dtype=np.int32)
+
+
+def shard_file(folder, name, i):
+    return Path(folder) / (name + '_' + str(i).zfill(3) + '.npz')
+
+
+def write_shards(data_folder, n_shards=N_SHARDS, out_folder=None):
+    # into a new folder that shards/ points to when it is complete, so no shard of an older count is left behind
+    rf = np.load(data_folder / 'FP_MorgRF.npz', allow_pickle=True)
+    morg = np.load(data_folder / 'FP_Morg.npz', allow_pickle=True)
+    final = Path(out_folder) if out_folder else data_folder / 'shards'
+    final.parent.mkdir(parents=True, exist_ok=True)
+    out_folder = Path(tempfile.mkdtemp(prefix='.' + final.name + '.', dir=final.parent))
+    os.chmod(out_folder, 0o755)
+
+    shard = shard_of(rf['z'], n_shards)
+    manifest = {'n_shards': n_shards, 'hash': 'crc32(MNXR) % n_shards', 'rf': [], 'compounds': []}
+    for i in range(n_shards):
+        rows = np.flatnonzero(shard == i)
+        comps = np.isin(morg['y'], np.unique(rf['y'][rows]))
+        shard_rf = {'y': rf['y'][rows], 'z': rf['z'][rows], 'row': rows}
+        shard_rf.update(subset_pool(rf, rows))
+        if 'd' in rf.files:
+            shard_rf['d'] = rf['d'][rows]
+        np.savez(shard_file(out_folder, 'FP_MorgRF', i), **shard_rf)
+        np.savez(shard_file(out_folder, 'FP_Morg', i), x=morg['x'][comps], y=morg['y'][comps])
+        manifest['rf'].append({'file': shard_file(out_folder, 'FP_MorgRF', i).name, 'rows': len(rows)})
+        manifest['compounds'].append({'file': shard_file(out_folder, 'FP_Morg', i).name, 'rows': int(comps.sum())})
+
+    with open(out_folder / 'shards.json', 'w') as f:
+        json.dump(manifest, f, indent=1)
+
+    # a rename over the old link is atomic, as publish_bundle.flip. A real folder from before the links is moved
+    # away first, readers see no shards/ only during that one run
+    old = final.parent / os.readlink(final) if final.is_symlink() else None
+    if final.exists() and not final.is_symlink():
+        old = final.with_name('.' + final.name + '.old.' + str(os.getpid()))
+        os.rename(final, old)
+    link = final.with_name('.' + final.name + '.link.' + str(os.getpid()))
+    if link.is_symlink() or link.exists():
+        link.unlink()
+    os.symlink(out_folder.name, link)
+    os.replace(link, final)
+    if old is not None:
+        shutil.rmtree(old, ignore_errors=True)
+    return manifest
+
+
+class LocalShard():
+
+    def __init__(self, file_path):
+        rf = np.load(file_path, allow_pickle=True)
+        self.fps = list(row_vectors(rf))
+        self.mnxm = rf['y']
+        self.mnxr = rf['z']
+        self.row = rf['row'] if 'row' in rf.files else np.arange(len(self.fps))
+
+    def search(self, query, k=10):
+        # top k as (score, row, mnxr, mnxm), ties broken by the row so the merge matches the unsharded order
+        fp = DataStructs.UIntSparseIntVect(query)
+        scores = np.array(DataStructs.BulkTanimotoSimilarity(fp, self.fps)) if self.fps else np.zeros(0)
+        top = np.lexsort((self.row, -scores))[:k]
+        return [(float(scores[i]), int(self.row[i]), str(self.mnxr[i]), str(self.mnxm[i])) for i in top]
+
+    def close(self):
+        pass
+
+
+def shard_process(file_path, conn):
+    shard = LocalShard(file_path)
+    conn.send('ready')
+    while True:
+        msg = conn.recv()
+        if msg is None:
+            break
+        conn.send(shard.search(*msg))
+
+
+class ProcessShard():
+
+    def __init__(self, file_path):
+        self.conn, child = multiprocessing.Pipe()
+        self.lock = threading.Lock()
+        self.process = multiprocessing.Process(target=shard_process, args=(str(file_path), child), daemon=True)
+        self.process.start()
+        self.conn.recv()
+
+    def search(self, query, k=10):
+        with self.lock:
+            self.conn.send((query, k))
+            return self.conn.recv()
+
+    def close(self):
+        self.conn.send(None)
+        self.process.join()
+
+
+class RemoteShard():
+
+    def __init__(self, host, port, timeout=60):
+        self.host, self.port, self.timeout = host, port, timeout
+
+    def search(self, query, k=10):
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            body = json.dumps({'query': base64.b64encode(query).decode(), 'k': k})
+            conn.request('POST', '/search', body=body, headers={'Content-Type': 'application/json'})
+            return [tuple(x) for x in json.loads(conn.getresponse().read())]
+        finally:
+            conn.close()
+
+    def close(self):
+        pass
+
+
+class ShardHandler(BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        data = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        body = json.dumps(self.server.shard.search(base64.b64decode(data['query']), int(data['k']))).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_shard(file_path, port, host='0.0.0.0'):
+    server = ThreadingHTTPServer((host, port), ShardHandler)
+    server.shard = LocalShard(file_path)
+    print('serving', file_path, 'on', host + ':' + str(port), flush=True)
+    server.serve_forever()
+
+
+class ScatterGather():
+
+    def __init__(self, shards):
+        self.shards = shards
+        self.pool = ThreadPoolExecutor(max(1, len(shards)))
+
+    @classmethod
+    def local(cls, shard_folder, processes=True):
+        # one shard worker for every shard written by write_shards
+        manifest = json.load(open(Path(shard_folder) / 'shards.json'))
+        files = [Path(shard_folder) / x['file'] for x in manifest['rf']]
+        return cls([ProcessShard(x) if processes else LocalShard(x) for x in files])
+
+    def search(self, fp, k=10):
+        query = fp.ToBinary()
+        results = self.pool.map(lambda s: s.search(query, k), self.shards)
+        return sorted([x for r in results for x in r], key=lambda x: (-x[0], x[1]))[:k]
+
+    def close(self):
+        for s in self.shards:
+            s.close()
+        self.pool.shutdown()
+
+
+def sample_queries(full, n, seed=0):
+    rng = np.random.default_rng(seed)
+    return [full.fps[i] for i in rng.choice(len(full.fps), size=min(n, len(full.fps)), replace=False)]
+
+
+def verify(data_folder, shard_folder=None, n=50, k=10, processes=False):
+    # the shards hold every row once, and the scatter-gather top k is the unsharded top k.
+    # Returns the problems found, empty when the shards are correct
+    shard_folder = Path(shard_folder) if shard_folder else data_folder / 'shards'
+    manifest = json.load(open(shard_folder / 'shards.json'))
+    full = LocalShard(data_folder / 'FP_MorgRF.npz')
+    problems = []
+
+    files = sorted([x.name for x in shard_folder.glob('FP_Morg*.npz')])
+    expected = sorted([x['file'] for x in manifest['rf'] + manifest['compounds']])
+    if files != expected:
+        problems.append('shard files ' + str(files) + ' expected ' + str(expected))
+    rows = np.concatenate([LocalShard(shard_folder / x['file']).row for x in manifest['rf']])
+    if not np.array_equal(np.sort(rows), np.arange(len(full.fps))):
+        problems.append('rows ' + str(len(rows)) + ' of ' + str(len(full.fps)) + ', ' + str(len(rows) - len(np.unique(rows))) + ' duplicated')
+
+    search = ScatterGather.local(shard_folder, processes)
+    for q in sample_queries(full, n):
+        found, top = search.search(q, k), full.search(q.ToBinary(), k)
+        if [x[:2] for x in found] != [x[:2] for x in top]:
+            problems.append('top ' + str(k) + ' differs for row ' + str(top[0][1] if top else -1))
+    search.close()
+    return problems
+
+
+def benchmark(data_folder, shard_counts, n=50, k=10):
+    # the sharded results against the unsharded search, and the queries per second for each shard count.
+    # The shards are written to a scratch folder, shards/ is left as it is
+    full = LocalShard(data_folder / 'FP_MorgRF.npz')
+    queries = sample_queries(full, n)
+
+    start = time.perf_counter()
+    expected = [full.search(q.ToBinary(), k) for q in queries]
+    t_full = time.perf_counter() - start
+    print('\nshards\tmatch\tqueries/s')
+    print('-', '\t', '-', '\t', round(len(queries) / t_full, 1))
+
+    with tempfile.TemporaryDirectory(dir=data_folder) as tmp:
+        for n_shards in shard_counts:
+            write_shards(data_folder, n_shards, Path(tmp) / 'shards')
+            search = ScatterGather.local(Path(tmp) / 'shards')
+            start = time.perf_counter()
+            with ThreadPoolExecutor(n_shards) as pool:
+                found = list(pool.map(lambda q: search.search(q, k), queries))
+            elapsed = time.perf_counter() - start
+            search.close()
+
+            match = all([[x[:2] for x in a] == [x[:2] for x in b] for a, b in zip(expected, found)])
+            print(n_shards, '\t', match, '\t', round(len(queries) / elapsed, 1))
+
+
+def run(raw_data_folder, data_folder, n_shards=N_SHARDS, n_bench=0, n_verify=0):
+    if n_bench:
+        benchmark(data_folder, sorted(set([1, 2, n_shards])), n_bench)
+
+    manifest = write_shards(data_folder, n_shards)
+    write_params(data_folder, 'make_rf_shards', {'n_shards': n_shards, 'hash': manifest['hash']})
+    print('shards', n_shards, '\trf rows', [x['rows'] for x in manifest['rf']], '\tcompounds', [x['rows'] for x in manifest['compounds']])
+
+    if n_verify:
+        problems = verify(data_folder, n=n_verify)
+        for x in problems:
+            print('\t', x)
+        if problems:
+            raise SystemExit('the shards do not match FP_MorgRF.npz')
+        print('verified', n_verify, 'queries against the unsharded search')
+
+
+
+
+def arguments(args=None):
+    parser = argparse.ArgumentParser(description='SeqFind script for Selenzy')
+    parser.add_argument('data_folder',
+                        help='specify data directory for new files, please end with slash')
+    parser.add_argument('raw_data_folder',
+                        help='specify data directory for raw databases files, please end with slash')
+    parser.add_argument('--shards', type=int, default=N_SHARDS,
+                        help='number of shards')
+    parser.add_argument('--benchmark', type=int, default=0,
+                        help='check this many queries against the unsharded search and time them for 1, 2 and --shards shards')
+    parser.add_argument('--verify', type=int, default=0,
+                        help='check the written shards cover every row once and give the unsharded top k for this many queries')
+    parser.add_argument('--serve', type=int, default=None,
+                        help='serve this shard over http instead of writing the shards')
+    parser.add_argument('--port', type=int, default=8770,
+                        help='port for --serve')
+
+    arg = parser.parse_args(args=args)
+    return arg
+
+
+if __name__ == '__main__':
+    arg = arguments()
+    raw_data_folder = Path(arg.raw_data_folder)
+    data_folder = Path(arg.data_folder)
+    if arg.serve is not None:
+        serve_shard(shard_file(data_folder / 'shards', 'FP_MorgRF', arg.serve), arg.port)
+    else:
+        run(raw_data_folder, data_folder, arg.shards, arg.benchmark, arg.verify)
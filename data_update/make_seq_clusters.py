@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Nov  2 09:41:37 2026
+
+Cluster the enzymes of reac_seqs.tsv by sequence identity, so a query scores one representative per cluster
+and expands only the best clusters instead of scoring every near identical ortholog of a popular EC number
+
+each sequence gets a MinHash sketch of its amino acid k-mers (chunks in a process pool), the identity of two
+sequences is estimated from the Jaccard of their sketches as in Mash, (2J/(1+J))^(1/k). The clustering is
+greedy like CD-HIT: the longest unassigned sequence becomes a representative and takes every unassigned
+sequence above --identity among the candidates that share an LSH band of its sketch. A sequence without k-mers
+(missing from seqs.fasta, empty or shorter than k) has no sketch and is a cluster of its own
+
+    python make_seq_clusters.py /data_2023/ /raw_data_update/ --families 40     clusters related synthetic families
+                                                                                 and runs the benchmark on them
+
+seq_clusters.npz
+    version         - table format version
+    uniprot         - uniprot ids, sorted
+    cluster         - int32 cluster of every uniprot
+    representative  - int32 uniprot index of the representative of every cluster
+    identity        - float32 estimated identity of every uniprot to its representative
+    sketched        - bool, False for the uniprots without a sketch, each of them is a singleton
+    k, identity_threshold
+
+"""
+
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import argparse
+import tempfile
+import time
+
+from make_seq_props import read_fasta, properties, LOOKUP, AMINO
+from publish_bundle import write_params
+
+VERSION = 2
+K = 5
+NUM_PERM = 128
+BANDS = 32
+IDENTITY = 0.9
+CHUNK = 2000
+PRIME = (1 << 31) - 1
+
+
+def permutations(num_perm=NUM_PERM, seed=1):
+    rng = np.random.default_rng(seed)
+    return rng.integers(1, PRIME, num_perm, dtype=np.int64), rng.integers(0, PRIME, num_perm, dtype=np.int64)
+
+
+def kmers(seq, k=K):
+    # the distinct k-mers of a sequence as integers in base len(AMINO)
+    codes = LOOKUP[np.frombuffer(seq.upper().encode(), dtype=np.uint8)]
+    if len(codes) < k:
+        return np.zeros(0, dtype=np.int64)
+    values = np.zeros(len(codes) - k + 1, dtype=np.int64)
+    for j in range(k):
+        values = values * len(AMINO) + codes[j:len(codes) - k + 1 + j]
+    return np.unique(values)
+
+
+def sketch_chunk(seqs, k=K, num_perm=NUM_PERM):
+    # (n, num_perm) minimum of every hash over the k-mers, PRIME for a sequence shorter than k
+    a, b = permutations(num_perm)
+    sketches = np.full((len(seqs), num_perm), PRIME, dtype=np.int64)
+    for i, s in enumerate(seqs):
+        values = kmers(s, k) % PRIME
+        if len(values):
+            sketches[i] = ((values[:, None] * a + b) % PRIME).min(0)
+    return sketches
+
+
+def sketch(seqs, k=K, num_perm=NUM_PERM, workers=None, chunk=CHUNK):
+    chunks = [seqs[i:i + chunk] for i in range(0, len(seqs), chunk)]
+    if not chunks:
+        return np.zeros((0, num_perm), dtype=np.int64)
+    with ProcessPoolExecutor(workers) as pool:
+        return np.concatenate(list(pool.map(sketch_chunk, chunks, [k]*len(chunks), [num_perm]*len(chunks))))
+
+
+def jaccard_threshold(identity, k=K):
+    # the Jaccard of two sequences at this identity, the inverse of the Mash estimate
+    s = identity ** k
+    return s / (2 - s)
+
+
+def estimated_identity(jaccard, k=K):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(jaccard > 0, (2 * jaccard / (1 + jaccard)) ** (1.0 / k), 0.0)
+
+
+def band_buckets(sketches, bands=BANDS, keep=None):
+    # bucket -> sequences for every band of the sketches, only the sequences in keep
+    rows = sketches.shape[1] // bands
+    keep = np.flatnonzero(keep) if keep is not None else np.arange(len(sketches))
+    buckets = []
+    for j in range(bands):
+        band = {}
+        for i, key in zip(keep, map(bytes, sketches[keep, j*rows:(j+1)*rows])):
+            band.setdefault(key, []).append(i)
+        buckets.append(band)
+    return buckets
+
+
+def greedy_clusters(sketches, lengths, identity=IDENTITY, k=K, bands=BANDS):
+    n = len(sketches)
+    cluster = np.full(n, -1, dtype=np.int32)
+    ident = np.ones(n, dtype=np.float32)
+    representative = []
+    threshold = jaccard_threshold(identity, k)
+    rows = sketches.shape[1] // bands
+    # the sketches of the sequences without k-mers are all PRIME and would match each other
+    sketched = (sketches != PRIME).any(1)
+    buckets = band_buckets(sketches, bands, sketched)
+
+    for i in np.argsort(-lengths, kind='stable'):
+        if cluster[i] >= 0:
+            continue
+        c = len(representative)
+        representative.append(i)
+        cluster[i] = c
+        if not sketched[i]:
+            continue
+        candidates = set()
+        for j, band in enumerate(buckets):
+            candidates.update(band[bytes(sketches[i, j*rows:(j+1)*rows])])
+        candidates = np.array([x for x in candidates if cluster[x] < 0], dtype=np.int64)
+        if not len(candidates):
+            continue
+        jaccard = (sketches[candidates] == sketches[i]).mean(1)
+        members = candidates[jaccard >= threshold]
+        cluster[members] = c
+        ident[members] = estimated_identity(jaccard[jaccard >= threshold], k)
+    return cluster, np.array(representative, dtype=np.int32), ident, sketched
+
+
+class SeqClusters():
+
+    def __init__(self, file_path):
+        data = np.load(file_path)
+        if int(data['version']) != VERSION:
+            raise ValueError('seq clusters version ' + str(int(data['version'])) + ' expected ' + str(VERSION))
+        self.uniprot = data['uniprot']
+        self.cluster = data['cluster']
+        self.representative = data['representative']
+        self.identity = data['identity']
+        self.sketched = data['sketched']
+
+    def clusters(self, uniprots):
+        # cluster of each id, -1 if it is not in the table
+        # not cast to the stored width, that truncates a longer id into a stored one
+        uniprots = np.asarray(uniprots).astype(str)
+        idx = np.searchsorted(self.uniprot, uniprots).clip(max=max(len(self.uniprot) - 1, 0))
+        found = self.uniprot[idx] == uniprots if len(self.uniprot) else np.zeros(len(uniprots), dtype=bool)
+        return np.where(found, self.cluster[idx], -1)
+
+    def reduce(self, uniprots):
+        # {representative: members} of a candidate list, a candidate without a cluster represents itself,
+        # the representative is the cluster representative if it is a candidate, otherwise its first member
+        groups = {}
+        for x, c in zip(uniprots, self.clusters(uniprots)):
+            groups.setdefault(x if c < 0 else int(c), []).append(x)
+        reduced = {}
+        for c, members in groups.items():
+            rep = str(self.uniprot[self.representative[c]]) if not isinstance(c, str) else c
+            reduced[rep if rep in members else members[0]] = members
+        return reduced
+
+    def expand(self, reduced, ranked, top):
+        # the members of the top ranked representatives
+        return [x for rep in ranked[:top] for x in reduced[rep]]
+
+
+def benchmark(clusters, reac_seqs, seqs, n=10, top=5):
+    # scoring every candidate of the reactions with the most enzymes against scoring the representatives
+    # and then the members of the best clusters. The per candidate score is the request time property
+    # computation of make_seq_props.py, one sequence at a time, the pairs are those of an alignment of the scored set
+    heavy = reac_seqs.groupby('mnxr')['uniprot'].nunique().sort_values(ascending=False).index[:n]
+    candidates = [sorted(set(reac_seqs.loc[reac_seqs['mnxr'] == x, 'uniprot'].astype(str))) for x in heavy]
+    score = lambda ids: {x: float(properties([seqs.get(x, '')])[0][0, 2]) for x in ids}
+
+    start = time.perf_counter()
+    for ids in candidates:
+        scores = score(ids)
+        sorted(ids, key=lambda x: -scores[x])
+    t_full = (time.perf_counter() - start) / len(candidates)
+
+    start = time.perf_counter()
+    scored = []
+    for ids in candidates:
+        reduced = clusters.reduce(ids)
+        scores = score(list(reduced))
+        ranked = sorted(reduced, key=lambda x: -scores[x])
+        scores.update(score([x for x in clusters.expand(reduced, ranked, top) if x not in scores]))
+        scored.append(len(scores))
+    t_reduced = (time.perf_counter() - start) / len(candidates)
+
+    pairs = lambda sizes: sum([x * (x - 1) // 2 for x in sizes])
+    print('\n' + str(len(candidates)), 'reactions with the most enzymes, candidates scored', sum(map(len, candidates)), 'reduced to', sum(scored),
+          '\talignment pairs', pairs(map(len, candidates)), 'reduced to', pairs(scored))
+    print('all candidates\t', round(t_full*1000, 3), 'ms')
+    print('clusters\t', round(t_reduced*1000, 3), 'ms', '\t', round(t_full / t_reduced, 1), 'x')
+
+
+def write_clusters(file_path, uniprot, seqs, identity=IDENTITY, k=K, workers=None):
+    seq_list = [seqs.get(x, '') for x in uniprot]
+
+    start = time.perf_counter()
+    sketches = sketch(seq_list, k, NUM_PERM, workers)
+    t_sketch = time.perf_counter() - start
+
+    start = time.perf_counter()
+    cluster, representative, ident, sketched = greedy_clusters(sketches, np.array([len(x) for x in seq_list]), identity, k)
+    t_cluster = time.perf_counter() - start
+
+    np.savez_compressed(file_path, version=np.array(VERSION), uniprot=uniprot, cluster=cluster, representative=representative,
+                        identity=ident, sketched=sketched, k=np.array(k), identity_threshold=np.array(identity))
+    sizes = np.bincount(cluster)
+    print(Path(file_path).name, len(uniprot), 'enzymes', len(representative), 'clusters', '\tlargest', int(sizes.max()) if len(sizes) else 0,
+          'singletons', int((sizes == 1).sum()), 'without a sketch', int((~sketched).sum()),
+          '\tsketch', round(t_sketch, 2), 's\tcluster', round(t_cluster, 2), 's')
+
+
+def make_families(n_families=40, mutation=0.04, n_unrelated=200, n_reactions=50, seed=0):
+    # families of point mutants of a random root sequence, unrelated random sequences and reactions whose
+    # candidates are a few whole families and a few unrelated sequences. Returns seqs, the family of every id
+    # (-1 for the unrelated ones) and a reac_seqs table
+    rng = np.random.default_rng(seed)
+    amino = np.array(list(AMINO[:20]))
+    seqs, family = {}, {}
+    for f in range(n_families):
+        root = rng.choice(amino, size=rng.integers(200, 501))
+        for _ in range(rng.integers(5, 41)):
+            seq = root.copy()
+            mutated = rng.random(len(seq)) < mutation
+            seq[mutated] = rng.choice(amino, size=int(mutated.sum()))
+            name = 'Q' + str(len(seqs) + 1).zfill(5)
+            seqs[name], family[name] = ''.join(seq), f
+    for _ in range(n_unrelated):
+        name = 'Q' + str(len(seqs) + 1).zfill(5)
+        seqs[name], family[name] = ''.join(rng.choice(amino, size=rng.integers(100, 401))), -1
+    names = list(seqs)
+    members = [[x for x in names if family[x] == f] for f in range(n_families)]
+    rows = []
+    for r in range(n_reactions):
+        ids = set(rng.choice(names, size=rng.integers(1, 11), replace=False))
+        for f in rng.choice(n_families, size=rng.integers(1, 9), replace=False):
+            ids |= set(members[f])
+        rows += [['MNXR' + str(r), 'uniprot', x, 'ref', '1.1.1.1'] for x in sorted(ids)]
+    return seqs, family, pd.DataFrame(rows, columns=['mnxr', 'up', 'uniprot', 'ref', 'ec'])
+
+
+def family_benchmark(n_families=40, mutation=0.04, identity=IDENTITY, k=K, workers=None, n=10):
+    # how well the clusters recover the families, and the benchmark on their reactions
+    seqs, family, reac_seqs = make_families(n_families, mutation)
+    uniprot = np.unique(reac_seqs['uniprot'].to_numpy().astype(str))
+    with tempfile.TemporaryDirectory() as tmp:
+        write_clusters(Path(tmp) / 'seq_clusters.npz', uniprot, seqs, identity, k, workers)
+        clusters = SeqClusters(Path(tmp) / 'seq_clusters.npz')
+
+    fam = np.array([family[x] for x in uniprot])
+    rep = clusters.representative[clusters.cluster]
+    same = lambda a, b: np.mean([x == y for x, y in zip(a, b)])
+    true_identity = np.array([same(seqs[x], seqs[uniprot[r]]) if len(seqs[x]) == len(seqs[uniprot[r]]) else 0.0 for x, r in zip(uniprot, rep)])
+    related = (fam >= 0) & (rep != np.arange(len(uniprot)))
+    pure = np.mean([len(set(fam[clusters.cluster == c])) == 1 for c in range(len(clusters.representative))])
+    print('\n' + str(n_families), 'families,', round(1 - mutation * 19 / 20, 3), 'expected identity to the root,',
+          len(uniprot), 'enzymes in the reactions')
+    print('clusters of one family', round(pure, 3), '\tclusters per family', round(len(np.unique(clusters.cluster[fam >= 0])) / max(1, len(np.unique(fam[fam >= 0]))), 2),
+          '\tunrelated singletons', round(np.mean(np.bincount(clusters.cluster)[clusters.cluster[fam < 0]] == 1), 3))
+    if related.any():
+        print('identity to the representative\testimated', round(float(clusters.identity[related].mean()), 3),
+              'true', round(float(true_identity[related].mean()), 3))
+    benchmark(clusters, reac_seqs, seqs, n)
+
+
+def run(raw_data_folder, data_folder, identity=IDENTITY, k=K, workers=None, n_bench=0):
+    reac_seqs = pd.read_csv(data_folder / 'reac_seqs.tsv', sep='\t', header=None, names=['mnxr', 'up', 'uniprot', 'ref', 'ec'])
+    uniprot = np.unique(reac_seqs['uniprot'].dropna().to_numpy().astype(str))
+    seqs = read_fasta(data_folder / 'seqs.fasta', set(uniprot))
+
+    write_clusters(data_folder / 'seq_clusters.npz', uniprot, seqs, identity, k, workers)
+    write_params(data_folder, 'make_seq_clusters', {'identity_threshold': identity, 'k': k, 'num_perm': NUM_PERM})
+
+    if n_bench:
+        benchmark(SeqClusters(data_folder / 'seq_clusters.npz'), reac_seqs, seqs, n_bench)
+
+
+
+
+def arguments(args=None):
+    parser = argparse.ArgumentParser(description='SeqFind script for Selenzy')
+    parser.add_argument('data_folder',
+                        help='specify data directory for new files, please end with slash')
+    parser.add_argument('raw_data_folder',
+                        help='specify data directory for raw databases files, please end with slash')
+    parser.add_argument('--identity', type=float, default=IDENTITY,
+                        help='estimated identity to join the cluster of a representative')
+    parser.add_argument('--k', type=int, default=K,
+                        help='k-mer length of the sketches')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='processes sketching the chunks, defaults to all cores')
+    parser.add_argument('--benchmark', type=int, default=0,
+                        help='time the scoring of this many reactions with the most enzymes with and without the clusters')
+    parser.add_argument('--families', type=int, default=0,
+                        help='instead of the data folder, cluster this many synthetic families of point mutants and run the benchmark on them')
+    parser.add_argument('--mutation', type=float, default=0.04,
+                        help='--families: fraction of the positions of the root sequence mutated in each member')
+
+    arg = parser.parse_args(args=args)
+    return arg
+
+
+if __name__ == '__main__':
+    arg = arguments()
+    raw_data_folder = Path(arg.raw_data_folder)
+    data_folder = Path(arg.data_folder)
+    if arg.families:
+        family_benchmark(arg.families, arg.mutation, arg.identity, arg.k, arg.workers, arg.benchmark or 10)
+    else:
+        run(raw_data_folder, data_folder, arg.identity, arg.k, arg.workers, arg.benchmark)
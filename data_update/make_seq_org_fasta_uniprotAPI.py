@@ -13,6 +13,8 @@ import requests
 import time 
 import argparse
 
+from metrics import metrics, instrument, add_arguments
+
 
 def create_taxonomy_dict(fasta_file):
     uniprot_dict = {}
@@ -61,7 +63,9 @@ def write_seq_rest(enzymes):
     l=[]
     retrieved_enz = set()
     
+    progress = metrics.progress('uniprot_api', len(enzymes))
     for enz in enzymes:
+        progress.update()
         time.sleep(2)
         response = requests.get('https://www.uniprot.org/uniprot/'+ enz +'.json')
         
@@ -159,6 +163,13 @@ def run(raw_data_folder, data_folder, legacy_folder):
     print('\nEnzymes input:', len(required_enz))
     print('Enzymes covered:', len(set(seq_org_new.unip)))
     print('Enzymes lost:', len(lost4))
+    metrics.count('enzymes', len(required_enz), source='input')
+    # the enzymes of the rows written to seq_org.tsv, the names.dmp matches (datasetx) are not written
+    metrics.count('enzymes', len(set(x[0] for x in dataset1)), source='fasta')
+    metrics.count('enzymes', len(set(x[0] for x in dataset2)), source='brenda')
+    metrics.count('enzymes', len(set(dataset3.unip)), source='previous')
+    metrics.count('enzymes', len(set(x[0] for x in dataset4)), source='uniprot_api')
+    metrics.count('enzymes', len(lost4), source='lost')
 
     seq_org_new.to_csv(data_folder / 'seq_org.tsv', sep = '\t', index=False, header=False)
 
@@ -174,6 +185,8 @@ def arguments(args=None):
     parser.add_argument('legacy_folder',
                         help='specify data directory for raw databases files, please end with slash')
 
+    add_arguments(parser)
+
     arg = parser.parse_args(args=args)
     return arg
 
@@ -183,7 +196,8 @@ if __name__ == '__main__':
     raw_data_folder = Path(arg.raw_data_folder)
     data_folder = Path(arg.data_folder)
     legacy_folder = Path(arg.legacy_folder)
-    run(raw_data_folder, data_folder, legacy_folder)
+    with instrument('make_seq_org_fasta_uniprotAPI', arg.metrics, arg.profile):
+        run(raw_data_folder, data_folder, legacy_folder)
 
 
 
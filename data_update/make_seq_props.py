@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Thu Oct 29 10:12:44 2026
+
+Precompute the EMBOSS pepstats / iep properties of every enzyme in reac_seqs.tsv from seqs.fasta,
+so the server reads them instead of running EMBOSS for each request
+
+the properties are computed in chunks in a process pool, with the residue masses, charges and pK values of
+the EMBOSS data files (Eamino.dat, Epk.dat), or with --emboss by running pepstats once per chunk
+
+seq_props.npz
+    version         - table format version
+    uniprot         - uniprot ids, sorted
+    columns         - names of the property columns
+    values          - (n_uniprot, n_columns) float32, NaN if the sequence is missing from seqs.fasta
+    length          - int32 residues
+
+    props = SeqProps('/data_2023/seq_props.npz')
+    props.table(['P0A9B2', 'P00350'])      DataFrame with one row per id
+
+"""
+
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import argparse
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+
+from publish_bundle import write_params
+
+VERSION = 1
+CHUNK = 2000
+
+# Eamino.dat average residue masses, B/Z the mean of D,N / E,Q, X the mean residue
+AMINO = 'ACDEFGHIKLMNPQRSTVWYBZXUO'
+MASS = {'A': 71.0788, 'C': 103.1388, 'D': 115.0886, 'E': 129.1155, 'F': 147.1766, 'G': 57.0519, 'H': 137.1411,
+        'I': 113.1594, 'K': 128.1741, 'L': 113.1594, 'M': 131.1926, 'N': 114.1038, 'P': 97.1167, 'Q': 128.1307,
+        'R': 156.1875, 'S': 87.0782, 'T': 101.1051, 'V': 99.1326, 'W': 186.2132, 'Y': 163.1760, 'B': 114.5962,
+        'Z': 128.6231, 'X': 110.0, 'U': 150.0388, 'O': 237.3018}
+WATER = 18.01528
+CHARGE = {'D': -1.0, 'E': -1.0, 'K': 1.0, 'R': 1.0, 'H': 0.5, 'B': -0.5, 'Z': -0.5}
+# Epk.dat
+PK_AMINO, PK_CARBOXYL = 8.6, 3.6
+PK_POSITIVE = {'K': 10.8, 'R': 12.5, 'H': 6.5}
+PK_NEGATIVE = {'D': 3.9, 'E': 4.1, 'C': 8.5, 'Y': 10.1}
+# pepstats residue classes
+CLASSES = {'tiny': 'ACGST', 'small': 'ABCDGNPSTV', 'aliphatic': 'AILV', 'aromatic': 'FHWY', 'non_polar': 'ACFGILMPVWY',
+           'polar': 'DEHKNQRSTZ', 'charged': 'BDEHKRZ', 'basic': 'HKR', 'acidic': 'BDEZ'}
+
+COLUMNS = ['molecular_weight', 'charge', 'isoelectric_point', 'extinction_reduced', 'extinction_cystines',
+           'residue_weight'] + ['mole_' + x for x in CLASSES]
+
+# residue letter -> column of the count matrix, every other letter counts as X
+LOOKUP = np.full(256, AMINO.index('X'), dtype=np.int64)
+for i, a in enumerate(AMINO):
+    LOOKUP[ord(a)] = i
+    LOOKUP[ord(a.lower())] = i
+
+
+def read_fasta(file_path, ids=None):
+    # uniprot id -> sequence, the id is the accession of '>sp|P12345|NAME_ORG ...'
+    seqs, name, parts = {}, None, []
+    with open(file_path) as f:
+        for line in f:
+            if line.startswith('>'):
+                if name is not None:
+                    seqs[name] = ''.join(parts)
+                header = line[1:].split()[0] if line[1:].strip() else ''
+                name = header.split('|')[1] if header.count('|') >= 2 else header
+                name = name if ids is None or name in ids else None
+                parts = []
+            elif name is not None:
+                parts.append(line.strip())
+    if name is not None:
+        seqs[name] = ''.join(parts)
+    return seqs
+
+
+def residue_counts(seqs):
+    counts = np.zeros((len(seqs), len(AMINO)), dtype=np.int64)
+    for i, s in enumerate(seqs):
+        counts[i] = np.bincount(LOOKUP[np.frombuffer(s.replace('*', '').encode(), dtype=np.uint8)], minlength=len(AMINO))
+    return counts
+
+
+def net_charge(counts, ph):
+    # Henderson-Hasselbalch charge of every sequence at the pH of its row
+    ph = ph[:, None]
+    pos = 1 / (1 + 10 ** (ph - np.array(list(PK_POSITIVE.values()))))
+    neg = 1 / (1 + 10 ** (np.array(list(PK_NEGATIVE.values())) - ph))
+    charge = (counts[:, [AMINO.index(a) for a in PK_POSITIVE]] * pos).sum(1) - (counts[:, [AMINO.index(a) for a in PK_NEGATIVE]] * neg).sum(1)
+    return charge + 1 / (1 + 10 ** (ph[:, 0] - PK_AMINO)) - 1 / (1 + 10 ** (PK_CARBOXYL - ph[:, 0]))
+
+
+def isoelectric_point(counts, steps=40):
+    # bisection on all the sequences of the chunk at once, the charge falls with the pH
+    low, high = np.zeros(len(counts)), np.full(len(counts), 14.0)
+    for _ in range(steps):
+        mid = (low + high) / 2
+        positive = net_charge(counts, mid) > 0
+        low = np.where(positive, mid, low)
+        high = np.where(positive, high, mid)
+    return (low + high) / 2
+
+
+def properties(seqs):
+    # (values, length) for a list of sequences, the columns of COLUMNS
+    counts = residue_counts(seqs)
+    length = counts.sum(1)
+    col = {a: counts[:, i] for i, a in enumerate(AMINO)}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mw = counts @ np.array([MASS[a] for a in AMINO]) + np.where(length > 0, WATER, 0.0)
+        values = [mw,
+                  sum([col[a] * c for a, c in CHARGE.items()]),
+                  isoelectric_point(counts),
+                  col['W'] * 5690.0 + col['Y'] * 1280.0,
+                  col['W'] * 5690.0 + col['Y'] * 1280.0 + (col['C'] // 2) * 120.0,
+                  mw / length]
+        values += [100.0 * sum([col[a] for a in members]) / length for members in CLASSES.values()]
+    values = np.array(values, dtype=np.float64).T
+    values[length == 0] = np.nan
+    return values.astype(np.float32), length.astype(np.int32)
+
+
+def parse_pepstats(text):
+    # properties of every record of a pepstats report, by the id of the record
+    results = {}
+    for record in text.split('PEPSTATS of ')[1:]:
+        name = record.split()[0]
+        find = lambda pattern: float(re.search(pattern, record).group(1)) if re.search(pattern, record) else np.nan
+        values = [find(r'Molecular weight = ([\d.]+)'), find(r'Charge\s+= ([-\d.]+)'), find(r'Isoelectric Point = ([\d.]+)'),
+                  find(r'A280 Molar Extinction Coefficients\s+= (\d+) \(reduced\)'),
+                  find(r'A280 Molar Extinction Coefficients\s+= \d+ \(reduced\)\s+(\d+) \(cystine bridges\)'),
+                  find(r'Average Residue Weight\s+= ([\d.]+)')]
+        for c in CLASSES:
+            label = {'non_polar': 'Non-polar'}.get(c, c.capitalize())
+            values.append(find(r'\n' + label + r'\s+\([^)]*\)\s+\d+\s+([\d.]+)'))
+        results[name] = values
+    return results
+
+
+def pepstats_properties(seqs):
+    # one pepstats run for the whole chunk
+    with tempfile.TemporaryDirectory() as tmp:
+        fasta, out = Path(tmp) / 'chunk.fasta', Path(tmp) / 'chunk.pepstats'
+        with open(fasta, 'w') as f:
+            for i, s in enumerate(seqs):
+                f.write('>s' + str(i) + '\n' + s + '\n')
+        subprocess.run(['pepstats', '-sequence', str(fasta), '-outfile', str(out), '-auto'], check=True, capture_output=True)
+        found = parse_pepstats(out.read_text())
+    values = np.array([found.get('s' + str(i), [np.nan] * len(COLUMNS)) for i in range(len(seqs))], dtype=np.float32)
+    return values, np.array([len(s) for s in seqs], dtype=np.int32)
+
+
+def chunk_properties(seqs, emboss=False):
+    return pepstats_properties(seqs) if emboss else properties(seqs)
+
+
+def compute(seqs, workers=None, chunk=CHUNK, emboss=False):
+    # the chunks in a process pool, in the order of seqs
+    chunks = [seqs[i:i + chunk] for i in range(0, len(seqs), chunk)]
+    if not chunks:
+        return np.zeros((0, len(COLUMNS)), dtype=np.float32), np.zeros(0, dtype=np.int32)
+    with ProcessPoolExecutor(workers) as pool:
+        results = list(pool.map(chunk_properties, chunks, [emboss] * len(chunks)))
+    return np.concatenate([r[0] for r in results]), np.concatenate([r[1] for r in results])
+
+
+class SeqProps():
+
+    def __init__(self, file_path):
+        data = np.load(file_path)
+        if int(data['version']) != VERSION:
+            raise ValueError('seq props version ' + str(int(data['version'])) + ' expected ' + str(VERSION))
+        self.uniprot = data['uniprot']
+        self.columns = [str(x) for x in data['columns']]
+        self.values = data['values']
+        self.length = data['length']
+
+    def index(self, uniprots):
+        # position of each id, -1 if it is not in the table
+        # not cast to the stored width, that truncates a longer id into a stored one
+        uniprots = np.asarray(uniprots).astype(str)
+        idx = np.searchsorted(self.uniprot, uniprots).clip(max=max(len(self.uniprot) - 1, 0))
+        return np.where(self.uniprot[idx] == uniprots, idx, -1) if len(self.uniprot) else np.full(len(uniprots), -1)
+
+    def table(self, uniprots):
+        idx = self.index(uniprots)
+        values = np.where((idx >= 0)[:, None], self.values[idx.clip(min=0)], np.nan)
+        table = pd.DataFrame(values, columns=self.columns, index=pd.Index(uniprots, name='uniprot'))
+        table.insert(0, 'length', np.where(idx >= 0, self.length[idx.clip(min=0)], 0))
+        return table
+
+
+def run(raw_data_folder, data_folder, workers=None, chunk=CHUNK, emboss=False, n_bench=0):
+    reac_seqs = pd.read_csv(data_folder / 'reac_seqs.tsv', sep='\t', header=None, names=['mnxr', 'up', 'uniprot', 'ref', 'ec'])
+    uniprot = np.unique(reac_seqs['uniprot'].dropna().to_numpy().astype(str))
+
+    start = time.perf_counter()
+    found = read_fasta(data_folder / 'seqs.fasta', set(uniprot))
+    seqs = [found.get(x, '') for x in uniprot]
+    t_read = time.perf_counter() - start
+
+    start = time.perf_counter()
+    values, length = compute(seqs, workers, chunk, emboss)
+    t_props = time.perf_counter() - start
+
+    np.savez_compressed(data_folder / 'seq_props.npz', version=np.array(VERSION), uniprot=uniprot, columns=np.array(COLUMNS),
+                        values=values, length=length)
+    write_params(data_folder, 'make_seq_props', {'emboss': emboss, 'columns': COLUMNS})
+    print('seq_props.npz', len(uniprot), 'enzymes', '\tmissing from seqs.fasta', int((length == 0).sum()),
+          '\tread', round(t_read, 2), 's\tproperties', round(t_props, 2), 's')
+
+    if n_bench:
+        props = SeqProps(data_folder / 'seq_props.npz')
+        rng = np.random.default_rng(0)
+        query = uniprot[rng.choice(len(uniprot), size=min(n_bench, len(uniprot)), replace=False)]
+        start = time.perf_counter()
+        expected = properties([found.get(x, '') for x in query])[0]
+        t_live = time.perf_counter() - start
+        start = time.perf_counter()
+        table = props.table(query)
+        t_table = time.perf_counter() - start
+        print('\nproperties of', len(query), 'candidates, match', np.allclose(table[COLUMNS].to_numpy(), expected, equal_nan=True))
+        print('computed\t', round(t_live*1000, 3), 'ms')
+        print('table\t\t', round(t_table*1000, 3), 'ms', '\t', round(t_live / t_table, 1), 'x')
+        if shutil.which('pepstats'):
+            start = time.perf_counter()
+            pepstats_properties([found.get(x, '') for x in query])
+            print('pepstats\t', round((time.perf_counter() - start)*1000, 3), 'ms')
+
+
+
+
+def arguments(args=None):
+    parser = argparse.ArgumentParser(description='SeqFind script for Selenzy')
+    parser.add_argument('data_folder',
+                        help='specify data directory for new files, please end with slash')
+    parser.add_argument('raw_data_folder',
+                        help='specify data directory for raw databases files, please end with slash')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='processes computing the chunks, defaults to all cores')
+    parser.add_argument('--chunk', type=int, default=CHUNK,
+                        help='sequences per chunk')
+    parser.add_argument('--emboss', action='store_true',
+                        help='run pepstats on every chunk instead of the python implementation')
+    parser.add_argument('--benchmark', type=int, default=0,
+                        help='compare the table lookup with computing this many candidates')
+
+    arg = parser.parse_args(args=args)
+    return arg
+
+
+if __name__ == '__main__':
+    arg = arguments()
+    raw_data_folder = Path(arg.raw_data_folder)
+    data_folder = Path(arg.data_folder)
+    if arg.emboss and not shutil.which('pepstats'):
+        raise SystemExit('pepstats not found, install EMBOSS or leave out --emboss')
+    run(raw_data_folder, data_folder, arg.workers, arg.chunk, arg.emboss, arg.benchmark)
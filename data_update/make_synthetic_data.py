@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 13:05:48 2026
+
+Generate scaled synthetic inputs for every data_update script, used by benchmark_pipeline.py
+
+raw_data_folder     - reac_prop.tsv, chem_prop.tsv, brenda_2023_1.txt, expasy_dat.txt,
+                      uniprot_sprot.fasta, taxidlineage.dmp, names.dmp
+legacy_folder       - reac_seqs.tsv, seq_org.tsv
+
+the compounds are families built on random carbon skeletons (alcohol, aldehyde, acid, phosphate, amine)
+linked by the usual cofactor reactions (NAD+/NADH, ATP/ADP, water), so the smiles look like metabolites
+
+"""
+
+import random
+from pathlib import Path
+import argparse
+
+COFACTORS = {
+    'WATER': 'O',
+    'MNXM1': '[H+]',
+    'MNXM3': 'Nc1ncnc2c1ncn2[C@@H]1O[C@H](COP(=O)([O-])OP(=O)([O-])OP(=O)([O-])[O-])[C@@H](O)[C@H]1O',
+    'MNXM7': 'Nc1ncnc2c1ncn2[C@@H]1O[C@H](COP(=O)([O-])OP(=O)([O-])[O-])[C@@H](O)[C@H]1O',
+    'MNXM8': 'NC(=O)c1ccc[n+]([C@@H]2O[C@H](COP(=O)([O-])OP(=O)([O-])OC[C@H]3O[C@@H](n4cnc5c(N)ncnc54)[C@H](O)[C@@H]3O)[C@@H](O)[C@H]2O)c1',
+    'MNXM10': 'NC(=O)C1=CN([C@@H]2O[C@H](COP(=O)([O-])OP(=O)([O-])OC[C@H]3O[C@@H](n4cnc5c(N)ncnc54)[C@H](O)[C@@H]3O)[C@@H](O)[C@H]2O)C=CC1',
+    'MNXM9': 'O=P([O-])([O-])O',
+    'MNXM13': 'O=C=O',
+    'MNXM15': '[NH4+]',
+    }
+
+GROUPS = {'alcohol': 'CO', 'aldehyde': 'C=O', 'acid': 'C(=O)[O-]', 'phosphate': 'COP(=O)([O-])[O-]', 'amine': 'C[NH3+]'}
+
+# substrates = products, as (count, group or cofactor)
+TEMPLATES = [
+    [[(1, 'alcohol'), (1, 'MNXM8')], [(1, 'aldehyde'), (1, 'MNXM10'), (1, 'MNXM1')], '1.1.1'],
+    [[(1, 'aldehyde'), (1, 'MNXM8'), (1, 'WATER')], [(1, 'acid'), (1, 'MNXM10'), (2, 'MNXM1')], '1.2.1'],
+    [[(1, 'alcohol'), (1, 'MNXM3')], [(1, 'phosphate'), (1, 'MNXM7'), (1, 'MNXM1')], '2.7.1'],
+    [[(1, 'phosphate'), (1, 'WATER')], [(1, 'alcohol'), (1, 'MNXM9')], '3.1.3'],
+    [[(1, 'aldehyde'), (1, 'MNXM15'), (1, 'MNXM10')], [(1, 'amine'), (1, 'MNXM8'), (1, 'WATER')], '1.4.1'],
+    ]
+
+# taxid, fasta name, mnemonic, lineage
+ORGS = [
+    [83333, 'Escherichia coli (strain K12)', 'ECOLI', '1 131567 2 1224 1236 91347 543 561 562 83333'],
+    [559292, 'Saccharomyces cerevisiae (strain ATCC 204508 / S288c)', 'YEAST', '1 131567 2759 4751 4890 4891 4892 4893 4930 4932 559292'],
+    [224308, 'Bacillus subtilis (strain 168)', 'BACSU', '1 131567 2 1239 91061 1385 186817 1386 1423 224308'],
+    [9606, 'Homo sapiens', 'HUMAN', '1 131567 2759 33208 7711 40674 9443 9604 9605 9606'],
+    [3702, 'Arabidopsis thaliana', 'ARATH', '1 131567 2759 33090 3193 3398 3700 3701 3702'],
+    ]
+
+AA = 'ACDEFGHIKLMNPQRSTVWY'
+
+
+def skeletons(n, rng):
+    # random carbon skeletons with some rings and branches
+    pieces = ['C', 'C', 'C', 'C(C)', 'C(O)', 'C(=O)', 'c1ccccc1', 'C1CCCCC1', 'N', 'O', 'C(N)']
+    out = set()
+    while len(out) < n:
+        s = 'C' + ''.join(rng.choice(pieces) for _ in range(rng.randint(1, 10)))
+        s = s.replace('c1ccccc1c1ccccc1', 'c1ccccc1C')
+        out.add(s)
+    return sorted(out)
+
+
+def make_compounds(n, rng):
+    compounds = dict(COFACTORS)
+    families = []
+    i = 100
+    for skel in skeletons(n, rng):
+        family = {}
+        for group, smi in GROUPS.items():
+            compounds['MNXM' + str(i)] = skel + smi
+            family[group] = 'MNXM' + str(i)
+            i += 1
+        families.append(family)
+
+    # a few compounds without smiles or with stars, like MetaNetX
+    for k in list(compounds)[len(COFACTORS)::13]:
+        compounds[k] = ''
+    for k in list(compounds)[len(COFACTORS)+5::29]:
+        compounds[k] = '*' + compounds[k] if compounds[k] else ''
+    return compounds, families
+
+
+def equation_side(compounds, family, rng):
+    return ' + '.join([str(c) + ' ' + family.get(k, k) + '@MNXD' + str(rng.choice([1, 1, 1, 2])) for c, k in compounds])
+
+
+def make_reactions(families, rng):
+    reactions = []
+    i = 1
+    for family in families:
+        for subs, prods, ec in TEMPLATES:
+            eq = equation_side(subs, family, rng) + ' = ' + equation_side(prods, family, rng)
+            # compartment variants and duplicate database entries
+            for _ in range(rng.choice([1, 1, 1, 2])):
+                transport = 'T' if rng.random() < 0.02 else ''
+                reactions.append(['MNXR' + str(i), eq, 'rhea:' + str(10000+i) + '#1', ec + '.' + str(rng.randint(1, 30)), 'B', transport])
+                i += 1
+    return reactions
+
+
+def make_enzymes(reactions, orgs, rng):
+    # ec -> [uniprot, org]
+    enzymes = {}
+    n = 0
+    for ec in sorted(set([x[3] for x in reactions])):
+        enzymes[ec] = []
+        for _ in range(rng.choice([1, 2, 3, 5, 8, 20])):
+            enzymes[ec].append(['P' + str(10000+n), rng.choice(orgs)])
+            n += 1
+    return enzymes
+
+
+def write_header(f, n=351):
+    for i in range(n):
+        f.write('### synthetic MetaNetX header line ' + str(i) + '\n')
+
+
+def write_files(raw_data_folder, legacy_folder, scale=100, seed=0):
+    rng = random.Random(seed)
+    raw_data_folder.mkdir(parents=True, exist_ok=True)
+    legacy_folder.mkdir(parents=True, exist_ok=True)
+
+    compounds, families = make_compounds(scale, rng)
+    reactions = make_reactions(families, rng)
+
+    orgs = list(ORGS)
+    for i in range(max(5, scale // 5)):
+        parent = rng.choice(ORGS)[3].split()[:-1]
+        orgs.append([1000000 + i, 'Synthetica species ' + str(i), 'SYN' + str(i), ' '.join(parent + [str(1000000 + i)])])
+    enzymes = make_enzymes(reactions, orgs, rng)
+
+    with open(raw_data_folder / 'chem_prop.tsv', 'w') as f:
+        write_header(f)
+        f.write('#ID\tname\treference\tformula\tcharge\tmass\tInChI\tInChIKey\tSMILES\n')
+        for k, v in compounds.items():
+            f.write('\t'.join([k, k.lower(), 'chebi:' + k[4:], '', '0', '', '', '', v]) + '\n')
+
+    with open(raw_data_folder / 'reac_prop.tsv', 'w') as f:
+        write_header(f)
+        f.write('#ID\tmnx_equation\treference\tclassifs\tis_balanced\tis_transport\n')
+        f.write('EMPTY\t = \tmnx:EMPTY\t\tB\t\n')
+        for x in reactions:
+            f.write('\t'.join(x) + '\n')
+
+    # brenda has most of the enzymes, expasy the rest, the last few are only in brenda
+    with open(raw_data_folder / 'brenda_2023_1.txt', 'w') as f:
+        f.write('BRENDA synthetic release\n\n')
+        for ec, enz in enzymes.items():
+            f.write('\n///\nID\t' + ec + '\n********************************\n\nPROTEIN\n')
+            for j, (unip, org) in enumerate(enz[::2]):
+                f.write('PR\t#' + str(j+1) + '# ' + org[1] + ' ' + unip + ' UniProt <' + str(j+1) + '>\n')
+            f.write('\nRECOMMENDED_NAME\nRN\tsynthetic enzyme\n')
+        f.write('\n///\nID\t9.9.9.9 (transferred to EC 1.1.1.1)\n')
+
+    with open(raw_data_folder / 'expasy_dat.txt', 'w') as f:
+        f.write('CC   synthetic ENZYME nomenclature database\n')
+        for ec, enz in enzymes.items():
+            f.write('//\nID   ' + ec + '\nDE   Synthetic enzyme.\n')
+            for unip, org in enz[1::2]:
+                f.write('DR   ' + unip + ', SYN' + unip[1:] + '_' + org[2] + ' ;\n')
+        f.write('//\n')
+
+    all_enz = [x for v in enzymes.values() for x in v]
+    with open(raw_data_folder / 'uniprot_sprot.fasta', 'w') as f:
+        for unip, org in all_enz[:-3]:
+            f.write('>sp|' + unip + '|SYN' + unip[1:] + '_' + org[2] + ' Synthetic enzyme OS=' + org[1] + ' OX=' + str(org[0]) + ' GN=syn PE=1 SV=1\n')
+            seq = ''.join(rng.choice(AA) for _ in range(rng.randint(80, 600)))
+            f.write('\n'.join([seq[i:i+60] for i in range(0, len(seq), 60)]) + '\n')
+
+    nodes = {}
+    for taxid, name, code, lineage in orgs:
+        lin = lineage.split()
+        for j, x in enumerate(lin):
+            nodes[x] = lin[:j]
+    with open(raw_data_folder / 'taxidlineage.dmp', 'w') as f:
+        for x, lin in nodes.items():
+            f.write(x + '\t|\t' + (' '.join(lin) + ' ' if lin else '') + '\t|\n')
+    with open(raw_data_folder / 'names.dmp', 'w') as f:
+        for taxid, name, code, lineage in orgs:
+            f.write(str(taxid) + '\t|\t' + name + '\t|\t\t|\tscientific name\t|\n')
+
+    # previous release
+    with open(legacy_folder / 'reac_seqs.tsv', 'w') as f:
+        for r in reactions[::3]:
+            for unip, org in enzymes[r[3]]:
+                f.write('\t'.join([r[0], 'uniprot', unip, r[2], r[3]]) + '\n')
+    with open(legacy_folder / 'seq_org.tsv', 'w') as f:
+        for unip, org in all_enz:
+            f.write(unip + '\t' + str(org[0]) + '\t' + org[1] + '\n')
+
+    print('compounds', len(compounds), 'reactions', len(reactions), 'enzymes', len(all_enz), 'organisms', len(orgs))
+
+
+
+
+def arguments(args=None):
+    parser = argparse.ArgumentParser(description='SeqFind script for Selenzy')
+    parser.add_argument('raw_data_folder',
+                        help='specify data directory for the synthetic raw databases files, please end with slash')
+    parser.add_argument('legacy_folder',
+                        help='specify data directory for the synthetic previous data files, please end with slash')
+    parser.add_argument('--scale', type=int, default=100,
+                        help='number of compound families, each adds 5 compounds and 5-10 reactions')
+    parser.add_argument('--seed', type=int, default=0)
+
+    arg = parser.parse_args(args=args)
+    return arg
+
+
+if __name__ == '__main__':
+    arg = arguments()
+    write_files(Path(arg.raw_data_folder), Path(arg.legacy_folder), arg.scale, arg.seed)
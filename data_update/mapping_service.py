@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Thu Oct 22 10:05:48 2026
+
+Atom mapping service, keeps warm mappers loaded so a query reaction gets its reacting fragments
+the same way as make_fingerprint_atomMap.py without loading the model for every request
+
+each worker owns a mapper and takes the requests queued within --window ms (up to --batch) as one mapper batch
+
+    python mapping_service.py serve --port 8765 --workers 2 --mapper onnx --onnx_model /data_2023/rxnmapper.onnx
+    python mapping_service.py serve --socket /tmp/selenzyme_map.sock
+    python mapping_service.py load --port 8765 --data_folder /data_2023/ --n 200 --concurrency 8
+
+POST /map   {"reaction": "CCO.NC(=O)c1ccc[n+](C2OC(COP..)..)c1>>CC=O.NC(=O)C1=CN(C2OC(COP..)..)C=CC1"}
+    returns {"compounds": [{"smiles", "side", "rf": {bit: count}, "dists": {"bit": [...], "ra": [...], "dist": [...]}}], "confidence"}
+    rf is the FP_MorgRF.npz row vector of each compound and dists its d_bit, d_ra and d_dist columns (rf_dists.py),
+    one entry per (fragment, reacting atom) pair. Compounds without reacting fragments are left out
+GET /stats  request count, batch sizes, latency percentiles and throughput
+
+"""
+
+from rdkit import Chem
+from rdkit import RDLogger
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from pathlib import Path
+import http.client
+import argparse
+import json
+import os
+import queue
+import socket
+import threading
+import time
+
+from make_fingerprint_atomMap import get_morg, mapped_fragments, reacting_fragment_vector
+from atom_mappers import make_mapper, sample_reactions, MAPPERS
+from rf_dists import encode_dists
+
+
+class MappingRequest():
+
+    def __init__(self, reaction):
+        self.reaction = reaction
+        self.start = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+
+
+def prepare(reaction):
+    # fingerprint the compounds and put the side with more atoms first, as in make_fingerprint_atomMap.py
+    subsmiles, prodsmiles = [x.split('.') for x in reaction.split('>>')]
+    mols = {x: Chem.MolFromSmiles(x) for x in set(subsmiles + prodsmiles)}
+    if any(m is None for m in mols.values()):
+        raise ValueError('invalid smiles')
+    fps = {k: get_morg(m, 8)[0] for k, m in mols.items()}
+
+    sides = [('substrate', subsmiles), ('product', prodsmiles)]
+    if sum([mols[x].GetNumAtoms() for x in subsmiles]) < sum([mols[x].GetNumAtoms() for x in prodsmiles]):
+        sides = sides[::-1]
+    react_smile = '.'.join(sides[0][1]) + '>>' + '.'.join(sides[1][1])
+    return react_smile, sides, {x: fps[x] for x in sides[0][1]}, {x: fps[x] for x in sides[1][1]}
+
+
+def reacting_fragments(mapped, sides, subs_fp, prods_fp):
+    frags = mapped_fragments(mapped['mapped_rxn'], subs_fp, prods_fp)
+    compounds = []
+    for side, smiles in sides:
+        for x in dict.fromkeys(smiles):
+            vect, dists = reacting_fragment_vector(*frags[x])
+            if vect is None:
+                continue
+            # the distance columns of FP_MorgRF.npz rather than the "bit=ra_d|ra_d" strings
+            cols = encode_dists([dists])
+            compounds.append({'smiles': x, 'side': side, 'rf': {str(k): v for k, v in vect.GetNonzeroElements().items()},
+                              'dists': {'bit': cols['d_bit'].tolist(), 'ra': cols['d_ra'].tolist(), 'dist': cols['d_dist'].tolist()}})
+    return {'compounds': compounds, 'confidence': mapped['confidence']}
+
+
+def error_result(e):
+    # the same buckets as the mapping issues of make_fingerprint_atomMap.py
+    if isinstance(e, RuntimeError):
+        return {'error': 'tooBig'}
+    if isinstance(e, ValueError):
+        return {'error': 'starSmiles' if '*' in str(e) else 'invalid', 'detail': str(e)}
+    return {'error': 'mappingFailure'}
+
+
+class MappingService():
+
+    def __init__(self, mapper_factory, workers=1, batch=8, window=0.01):
+        self.queue = queue.Queue()
+        self.batch = batch
+        self.window = window
+        self.lock = threading.Lock()
+        self.latencies = deque(maxlen=10000)
+        self.batch_sizes = deque(maxlen=10000)
+        self.requests = 0
+        self.errors = 0
+        self.started = time.perf_counter()
+        # the mappers are loaded before the service takes requests
+        self.mappers = [mapper_factory() for _ in range(workers)]
+        self.threads = [threading.Thread(target=self.work, args=(m,), daemon=True) for m in self.mappers]
+        for t in self.threads:
+            t.start()
+
+    def map(self, reaction, timeout=None):
+        request = MappingRequest(reaction)
+        self.queue.put(request)
+        if not request.done.wait(timeout):
+            return {'error': 'timeout'}
+        return request.result
+
+    def next_batch(self):
+        # block for the first request, then collect what arrives within the window
+        batch = [self.queue.get()]
+        deadline = time.perf_counter() + self.window
+        while len(batch) < self.batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def work(self, mapper):
+        while True:
+            batch = self.next_batch()
+            prepared = []
+            for r in batch:
+                try:
+                    prepared.append([r, prepare(r.reaction)])
+                except Exception as e:
+                    r.result = error_result(e)
+
+            if prepared:
+                try:
+                    maps = mapper.get_attention_guided_atom_maps([p[1][0] for p in prepared])
+                except Exception:
+                    # one bad reaction fails the batch, map them one at a time
+                    maps = []
+                    for p in prepared:
+                        try:
+                            maps.append(mapper.get_attention_guided_atom_maps([p[1][0]])[0])
+                        except Exception as e:
+                            maps.append(e)
+
+                for (r, (react_smile, sides, subs_fp, prods_fp)), m in zip(prepared, maps):
+                    try:
+                        if isinstance(m, Exception):
+                            raise m
+                        r.result = reacting_fragments(m, sides, subs_fp, prods_fp)
+                    except Exception as e:
+                        r.result = error_result(e)
+
+            now = time.perf_counter()
+            with self.lock:
+                self.batch_sizes.append(len(batch))
+                for r in batch:
+                    self.requests += 1
+                    self.errors += 'error' in r.result
+                    self.latencies.append(now - r.start)
+            for r in batch:
+                r.done.set()
+
+    def stats(self):
+        with self.lock:
+            lat = sorted(self.latencies)
+            sizes = list(self.batch_sizes)
+            requests, errors = self.requests, self.errors
+        pct = lambda p: lat[min(len(lat)-1, int(p*len(lat)))]*1000 if lat else 0.0
+        uptime = time.perf_counter() - self.started
+        return {'workers': len(self.mappers), 'requests': requests, 'errors': errors, 'queued': self.queue.qsize(),
+                'mean_batch': sum(sizes) / len(sizes) if sizes else 0.0,
+                'latency_ms': {'p50': pct(0.5), 'p95': pct(0.95), 'p99': pct(0.99)},
+                'requests_per_s': requests / uptime if uptime > 0 else 0.0, 'uptime_s': uptime}
+
+
+class MappingHandler(BaseHTTPRequestHandler):
+
+    def send_json(self, data, code=200):
+        body = json.dumps(data).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/stats':
+            self.send_json(self.server.service.stats())
+        else:
+            self.send_json({'error': 'not found'}, 404)
+
+    def do_POST(self):
+        if self.path != '/map':
+            return self.send_json({'error': 'not found'}, 404)
+        try:
+            reaction = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))['reaction']
+        except Exception:
+            return self.send_json({'error': 'expected {"reaction": smiles}'}, 400)
+        self.send_json(self.server.service.map(reaction, self.server.timeout_s))
+
+    def address_string(self):
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class ThreadingUnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(service, port=8765, socket_path=None, timeout=60, verbose=False):
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = ThreadingUnixHTTPServer(socket_path, MappingHandler)
+    else:
+        server = ThreadingHTTPServer(('127.0.0.1', port), MappingHandler)
+    server.service, server.timeout_s, server.verbose = service, timeout, verbose
+    print('serving on', socket_path or 'http://127.0.0.1:' + str(port), 'with', len(service.mappers), 'mappers', flush=True)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+
+    def __init__(self, socket_path, timeout=60):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+def request(method, path, data=None, port=8765, socket_path=None, timeout=60):
+    conn = UnixHTTPConnection(socket_path, timeout) if socket_path else http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    try:
+        body = json.dumps(data) if data is not None else None
+        conn.request(method, path, body=body, headers={'Content-Type': 'application/json'} if body else {})
+        return json.loads(conn.getresponse().read())
+    finally:
+        conn.close()
+
+
+def load_test(reactions, concurrency=8, port=8765, socket_path=None):
+    # send every reaction with concurrency clients, the latency is measured at the client
+    def send(rxn):
+        start = time.perf_counter()
+        result = request('POST', '/map', {'reaction': rxn}, port, socket_path)
+        return time.perf_counter() - start, 'error' in result
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(send, reactions))
+    elapsed = time.perf_counter() - start
+
+    lat = sorted(x[0] for x in results)
+    pct = lambda p: lat[min(len(lat)-1, int(p*len(lat)))]*1000
+    print('requests', len(results), 'concurrency', concurrency, 'errors', sum(x[1] for x in results))
+    print('throughput', round(len(results) / elapsed, 2), 'requests/s')
+    print('latency ms\tp50', round(pct(0.5), 1), '\tp95', round(pct(0.95), 1), '\tp99', round(pct(0.99), 1))
+    print('server', json.dumps(request('GET', '/stats', port=port, socket_path=socket_path)))
+
+
+
+
+def arguments(args=None):
+    parser = argparse.ArgumentParser(description='SeqFind script for Selenzy')
+    parser.add_argument('action', choices=['serve', 'load'],
+                        help='run the service, or send a load test to a running service')
+    parser.add_argument('--port', type=int, default=8765,
+                        help='localhost port')
+    parser.add_argument('--socket', default=None,
+                        help='unix socket path, used instead of the port')
+    parser.add_argument('--mapper', choices=MAPPERS, default='rxnmapper',
+                        help='atom mapping backend, onnx needs the model exported with atom_mappers.py')
+    parser.add_argument('--onnx_model', default=None,
+                        help='exported onnx model for the onnx mapper')
+    parser.add_argument('--threads', type=int, default=None,
+                        help='intra op threads for each mapper')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of warm mapper instances')
+    parser.add_argument('--batch', type=int, default=8,
+                        help='most requests mapped in one batch')
+    parser.add_argument('--window', type=float, default=10,
+                        help='ms to wait for more requests to join a batch')
+    parser.add_argument('--timeout', type=float, default=60,
+                        help='seconds before a queued request gives up')
+    parser.add_argument('--verbose', action='store_true',
+                        help='log every request')
+    parser.add_argument('--data_folder', default=None,
+                        help='load test: data folder with reac_smi.csv to take the reactions from')
+    parser.add_argument('--n', type=int, default=200,
+                        help='load test: number of requests')
+    parser.add_argument('--concurrency', type=int, default=8,
+                        help='load test: number of concurrent clients')
+
+    arg = parser.parse_args(args=args)
+    return arg
+
+
+if __name__ == '__main__':
+    arg = arguments()
+    if arg.action == 'serve':
+        RDLogger.DisableLog('rdApp.*')
+        service = MappingService(lambda: make_mapper(arg.mapper, arg.onnx_model, arg.threads), arg.workers, arg.batch, arg.window / 1000)
+        serve(service, arg.port, arg.socket, arg.timeout, arg.verbose)
+    else:
+        reactions = sample_reactions(Path(arg.data_folder), arg.n)
+        reactions = (reactions * (arg.n // max(1, len(reactions)) + 1))[:arg.n]
+        load_test(reactions, arg.concurrency, arg.port, arg.socket)
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Oct 20 08:31:12 2026
+
+Instrumentation for the data_update scripts
+
+metrics.stage(name)         - wall time, cpu time and peak rss of a stage
+metrics.timed(name)         - decorator adding up the calls and time spent in a function
+metrics.progress(name, n)   - items per second and eta, printed while a loop runs
+metrics.count(name, value)  - machine readable counts, e.g. the issue buckets
+instrument(name, folder)    - wraps a script run, writes <name>.json and <name>.prom into folder
+    and, with profile=True, <name>.stacks with the collapsed stacks from a sampling profiler
+    (in the working directory when there is no folder)
+
+"""
+
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+import json
+import os
+import resource
+import signal
+import sys
+import time
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on linux and bytes on mac
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1e6 if sys.platform == 'darwin' else rss / 1e3
+
+
+def escape_label(value):
+    # backslash, double quote and newline are escaped in prometheus label values
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Progress():
+
+    def __init__(self, name, total, every=30):
+        self.name = name
+        self.total = total
+        self.every = every
+        self.done = 0
+        self.start = time.perf_counter()
+        self.last = self.start
+
+    def rate(self):
+        elapsed = time.perf_counter() - self.start
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    def update(self, n=1):
+        self.done += n
+        now = time.perf_counter()
+        if now - self.last >= self.every:
+            self.last = now
+            rate = self.rate()
+            eta = (self.total - self.done) / rate if rate > 0 else float('inf')
+            print(self.name, str(self.done) + '/' + str(self.total), round(rate, 1), '/s', '\teta',
+                  time.strftime('%H:%M:%S', time.gmtime(eta)) if eta != float('inf') else '-', flush=True)
+
+
+class Metrics():
+
+    def __init__(self):
+        self.stages = {}
+        self.timers = {}
+        self.counters = {}
+        self.progresses = {}
+
+    @contextmanager
+    def stage(self, name):
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            self.stages[name] = {'wall_s': time.perf_counter() - wall, 'cpu_s': time.process_time() - cpu, 'peak_rss_mb': peak_rss_mb()}
+
+    def timed(self, name):
+        timer = self.timers.setdefault(name, {'calls': 0, 'total_s': 0.0})
+
+        def decorator(fun):
+            @wraps(fun)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return fun(*args, **kwargs)
+                finally:
+                    timer['calls'] += 1
+                    timer['total_s'] += time.perf_counter() - start
+            return wrapper
+        return decorator
+
+    def count(self, name, value, **labels):
+        self.counters[(name, tuple(sorted(labels.items())))] = value
+
+    def progress(self, name, total, every=30):
+        self.progresses[name] = Progress(name, total, every)
+        return self.progresses[name]
+
+    def to_dict(self):
+        counters = {}
+        for (name, labels), value in self.counters.items():
+            counters.setdefault(name, []).append({'labels': dict(labels), 'value': value})
+        return {'stages': self.stages, 'timers': self.timers, 'counters': counters,
+                'progress': {k: {'items': v.done, 'total': v.total, 'items_per_s': v.rate()} for k, v in self.progresses.items()}}
+
+    def to_prometheus(self, prefix='selenzyme_data_update'):
+        # one # TYPE line and then the samples of each family, the families have to be contiguous
+        families = {}
+
+        def add(name, kind, labels, value):
+            family = families.setdefault(prefix + '_' + name, (kind, []))
+            label_str = ','.join([k + '="' + escape_label(x) + '"' for k, x in labels])
+            family[1].append(prefix + '_' + name + ('{' + label_str + '}' if label_str else '') + ' ' + repr(float(value)))
+
+        for name, v in self.stages.items():
+            for k, x in v.items():
+                add('stage_' + k, 'gauge', [('stage', name)], x)
+        for name, v in self.timers.items():
+            add('function_calls_total', 'counter', [('function', name)], v['calls'])
+            add('function_seconds_total', 'counter', [('function', name)], v['total_s'])
+        for name, v in self.progresses.items():
+            add('items_per_second', 'gauge', [('loop', name)], v.rate())
+        for (name, labels), value in self.counters.items():
+            add(name, 'gauge', labels, value)
+
+        lines = []
+        for name, (kind, samples) in families.items():
+            lines.append('# TYPE ' + name + ' ' + kind)
+            lines += samples
+        return '\n'.join(lines) + '\n'
+
+    def write(self, out_folder, name):
+        out_folder = Path(out_folder)
+        out_folder.mkdir(parents=True, exist_ok=True)
+        with open(out_folder / (name + '.json'), 'w') as f:
+            json.dump(self.to_dict(), f, indent=1)
+        # write then rename, so the textfile collector never reads half a file
+        tmp = out_folder / (name + '.prom.tmp')
+        with open(tmp, 'w') as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp, out_folder / (name + '.prom'))
+
+
+class SamplingProfiler():
+    # samples the python stack on SIGPROF, the output can be read by flamegraph.pl or speedscope
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = Counter()
+
+    def sample(self, signum, frame):
+        stack = []
+        while frame is not None:
+            stack.append(Path(frame.f_code.co_filename).name + ':' + frame.f_code.co_name)
+            frame = frame.f_back
+        self.stacks[';'.join(stack[::-1])] += 1
+
+    def start(self):
+        signal.signal(signal.SIGPROF, self.sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self):
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, signal.SIG_DFL)
+
+    def write(self, file_path):
+        with open(file_path, 'w') as f:
+            for stack, n in self.stacks.most_common():
+                f.write(stack + ' ' + str(n) + '\n')
+
+
+metrics = Metrics()
+
+
+@contextmanager
+def instrument(name, out_folder=None, profile=False):
+    profiler = SamplingProfiler() if profile else None
+    if profiler:
+        profiler.start()
+    try:
+        with metrics.stage(name):
+            yield metrics
+    finally:
+        if profiler:
+            profiler.stop()
+        if out_folder:
+            metrics.write(out_folder, name)
+        if profiler:
+            # without a metrics folder the stacks go to the working directory
+            stacks = Path(out_folder or '.') / (name + '.stacks')
+            profiler.write(stacks)
+            print('profile', stacks, file=sys.stderr)
+
+
+def add_arguments(parser):
+    parser.add_argument('--metrics', default=None,
+                        help='directory to write the stage metrics as json and a prometheus textfile')
+    parser.add_argument('--profile', action='store_true',
+                        help='run the sampling profiler and write the collapsed stacks next to the metrics, or to the working directory')
+    return parser
@@ -0,0 +1,476 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Wed Oct 28 09:36:25 2026
+
+Preforking server for the data of the pipeline
+
+the master loads FP_Morg.npz, FP_MorgRF.npz, reac_seqs.tsv, seq_org.tsv and org_lineage.csv once, freezes the
+objects out of the garbage collector and forks the workers, which share the loaded data copy-on-write.
+Each worker answers on the shared listening socket with a pool of request threads, and only accepts a connection
+when a thread is free, so a busy worker leaves the waiting connections to the others
+    --max_requests      a worker that served this many requests (plus jitter) finishes them and is replaced
+    SIGHUP              graceful reload, the master loads the data folder again (a bundle current symlink is
+                        followed, see publish_bundle.py), starts new workers and lets the old ones finish
+    --watch S           reload by itself when the data folder resolves to a new bundle, checked every S seconds
+    SIGTERM / SIGINT    stop accepting, finish the requests in flight and exit
+
+GET /reaction/<mnxr>            enzymes of the reaction with their taxid, lineage, seq_props.npz properties
+                                and seq_clusters.npz representative
+GET /similar/<mnxr>?k=20        most similar reactions by the reacting fragments, read from reaction_graph.npz, the live
+                                search of make_reaction_graph.py for a reaction not in it or k above its k
+GET /compound/<mnxm>?k=20       most similar compounds by the Morgan fingerprints
+GET /health, GET /stats         the worker pid, data version, request count and memory
+
+    python prefork_server.py serve /data_2023/ --port 8080 --workers 4 --threads 8 --max_requests 10000
+    python prefork_server.py bench /data_2023/ --workers_list 1 2 4 8 --n 2000 --concurrency 16
+
+"""
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, parse_qs
+from pathlib import Path
+import argparse
+import gc
+import http.client
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from rdkit import DataStructs
+
+from make_lookup_tables import compile_tables
+from make_reaction_graph import GraphData, ReactionGraph
+from make_seq_props import SeqProps
+from make_seq_clusters import SeqClusters
+
+K = 20
+
+
+class SharedData():
+    # everything the workers read, loaded once in the master
+
+    def __init__(self, data_folder):
+        self.data_folder = Path(data_folder).resolve()
+        self.version = self.data_folder.name
+        self.loaded = time.time()
+
+        morg = np.load(self.data_folder / 'FP_Morg.npz', allow_pickle=True)
+        self.fps = list(morg['x'])
+        self.mnxm = morg['y'].astype(str)
+
+        lsh_file = self.data_folder / 'FP_MorgRF_lsh.npz'
+        self.graph = GraphData(self.data_folder / 'FP_MorgRF.npz', lsh_file=lsh_file if lsh_file.exists() else None)
+        # the precomputed neighbours, when make_reaction_graph.py has run
+        graph_file = self.data_folder / 'reaction_graph.npz'
+        self.reaction_graph = ReactionGraph(graph_file) if graph_file.exists() else None
+
+        with open(self.data_folder / 'org_lineage.csv') as f:
+            lineages = [x.strip().split(',') for x in f if x.strip()]
+        self.lineage_taxid = np.array([int(x[0]) for x in lineages], dtype=np.int64)
+        self.lineages = [[int(t) for t in x] for x in lineages]
+
+        reac_seqs = pd.read_csv(self.data_folder / 'reac_seqs.tsv', sep='\t', header=None, names=['mnxr', 'up', 'uniprot', 'ref', 'ec'])
+        seq_org = pd.read_csv(self.data_folder / 'seq_org.tsv', sep='\t', header=None, names=['uniprot', 'org', 'org_name'])
+        tables = compile_tables(reac_seqs, seq_org, self.lineage_taxid)
+        self.mnxr, self.uniprot, self.offsets = tables['mnxr'], tables['uniprot'], tables['offsets']
+        self.seqs, self.taxid, self.lineage = tables['seqs'], tables['taxid'], tables['lineage']
+
+        # the precomputed sequence properties, when make_seq_props.py has run
+        self.props = SeqProps(self.data_folder / 'seq_props.npz') if (self.data_folder / 'seq_props.npz').exists() else None
+        self.clusters = SeqClusters(self.data_folder / 'seq_clusters.npz') if (self.data_folder / 'seq_clusters.npz').exists() else None
+
+    def enzymes(self, mnxr):
+        i = np.searchsorted(self.mnxr, mnxr)
+        if i == len(self.mnxr) or self.mnxr[i] != mnxr:
+            return None
+        seqs = self.seqs[self.offsets[i]:self.offsets[i+1]]
+        enzymes = [{'uniprot': str(self.uniprot[j]), 'taxid': int(self.taxid[j]),
+                    'lineage': self.lineages[self.lineage[j]] if self.lineage[j] >= 0 else []} for j in seqs]
+        if self.props is not None:
+            table = self.props.table(self.uniprot[seqs])
+            for e, row in zip(enzymes, table.to_dict('records')):
+                e['properties'] = {k: (None if v != v else float(v)) for k, v in row.items()}
+        if self.clusters is not None:
+            # the candidates of a cluster share the representative, a client can score those first
+            reps = {x: rep for rep, members in self.clusters.reduce([e['uniprot'] for e in enzymes]).items() for x in members}
+            for e in enzymes:
+                e['representative'] = reps[e['uniprot']]
+        return enzymes
+
+    def similar(self, mnxr, k=K):
+        if self.reaction_graph is not None and k <= self.reaction_graph.k:
+            found = self.reaction_graph.lookup(mnxr)
+            if found is not None:
+                return [{'mnxr': x, 'score': s} for x, s in found[:k]]
+        i = np.searchsorted(self.graph.mnxr, mnxr)
+        if i == len(self.graph.mnxr) or self.graph.mnxr[i] != mnxr:
+            return None
+        neighbours, scores = self.graph.top_k(self.graph.query_fps(i), k, exclude=i)
+        found = neighbours >= 0
+        return [{'mnxr': x, 'score': s} for x, s in zip(self.graph.mnxr[neighbours[found]].tolist(), scores[found].tolist())]
+
+    def compound(self, mnxm, k=K):
+        found = np.flatnonzero(self.mnxm == mnxm)
+        if not len(found):
+            return None
+        scores = np.array(DataStructs.BulkTanimotoSimilarity(self.fps[found[0]], self.fps))
+        top = np.argsort(-scores, kind='stable')[:k]
+        return [{'mnxm': str(self.mnxm[j]), 'score': float(scores[j])} for j in top]
+
+
+def memory_mb():
+    # rss and the private part of it, the rest is shared with the master and the other workers
+    mem = {}
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                key, value = line.split(':', 1)
+                if key in ['Rss', 'Private_Clean', 'Private_Dirty']:
+                    mem[key] = int(value.split()[0]) / 1024
+    except OSError:
+        return {}
+    return {'rss': mem.get('Rss', 0.0), 'private': mem.get('Private_Clean', 0.0) + mem.get('Private_Dirty', 0.0)}
+
+
+class DataHandler(BaseHTTPRequestHandler):
+
+    def send_json(self, data, code=200):
+        body = json.dumps(data).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = url.path.strip('/').split('/')
+        query = parse_qs(url.query)
+        data = self.server.data
+        try:
+            k = int(query.get('k', [K])[0])
+            if parts == ['health']:
+                return self.send_json({'status': 'ok', 'pid': os.getpid(), 'version': data.version})
+            if parts == ['stats']:
+                return self.send_json(self.server.stats())
+            if len(parts) == 2 and parts[0] in ['reaction', 'similar', 'compound']:
+                if parts[0] == 'reaction':
+                    result = data.enzymes(parts[1])
+                elif parts[0] == 'similar':
+                    result = data.similar(parts[1], k)
+                else:
+                    result = data.compound(parts[1], k)
+                if result is None:
+                    return self.send_json({'error': 'unknown ' + parts[1]}, 404)
+                return self.send_json({'id': parts[1], 'version': data.version, 'result': result})
+        except Exception as e:
+            return self.send_json({'error': str(e)}, 500)
+        self.send_json({'error': 'not found'}, 404)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class WorkerServer(HTTPServer):
+    # serves the listening socket of the master with a fixed pool of request threads
+
+    def __init__(self, listener, data, threads=8, max_requests=0, verbose=False):
+        super().__init__(listener.getsockname()[:2], DataHandler, bind_and_activate=False)
+        self.socket.close()
+        self.socket = listener
+        self.data = data
+        self.verbose = verbose
+        self.pool = ThreadPoolExecutor(threads)
+        # one slot for each thread, taken before the accept and given back when the request is done
+        self.slots = threading.Semaphore(threads)
+        self.max_requests = max_requests
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.stopping = False
+        self.started = time.perf_counter()
+
+    def get_request(self):
+        # wait for a free thread, the connections stay in the listen backlog meanwhile
+        self.slots.acquire()
+        try:
+            return super().get_request()
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def process_request(self, request, client_address):
+        try:
+            self.pool.submit(self.process_request_thread, request, client_address)
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self.slots.release()
+        with self.lock:
+            self.requests += 1
+            recycle = self.max_requests and self.requests >= self.max_requests and not self.stopping
+        if recycle:
+            self.stop()
+
+    def handle_error(self, request, client_address):
+        if self.verbose:
+            super().handle_error(request, client_address)
+
+    def stop(self):
+        # shutdown waits for serve_forever, so it runs outside the thread that serves
+        with self.lock:
+            if self.stopping:
+                return
+            self.stopping = True
+        threading.Thread(target=self.shutdown, daemon=True).start()
+
+    def stats(self):
+        with self.lock:
+            requests = self.requests
+        uptime = time.perf_counter() - self.started
+        return {'pid': os.getpid(), 'version': self.data.version, 'requests': requests, 'uptime_s': uptime,
+                'requests_per_s': requests / uptime if uptime > 0 else 0.0, 'memory_mb': memory_mb()}
+
+
+def worker_main(listener, data, threads, max_requests, verbose):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    # jitter, so the workers started together are not all recycled together
+    max_requests = max_requests + random.randint(0, max_requests // 10) if max_requests else 0
+    server = WorkerServer(listener, data, threads, max_requests, verbose)
+    signal.signal(signal.SIGTERM, lambda signum, frame: server.stop())
+    server.serve_forever(poll_interval=0.2)
+    # finish the requests in flight before leaving
+    server.pool.shutdown(wait=True)
+    os._exit(0)
+
+
+class PreforkServer():
+
+    def __init__(self, data_folder, host='127.0.0.1', port=8080, workers=2, threads=8, max_requests=0, watch=0, verbose=False):
+        self.data_folder = Path(data_folder)
+        self.workers = workers
+        self.threads = threads
+        self.max_requests = max_requests
+        self.watch = watch
+        self.verbose = verbose
+        self.children = {}
+        self.generation = 0
+        self.reload_requested = False
+        self.stop_requested = False
+
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind((host, port))
+        self.listener.listen(1024)
+        # the workers poll the same socket, the ones that lose the race for a connection must not block in accept
+        self.listener.setblocking(False)
+        self.data = self.load()
+
+    def load(self):
+        start = time.perf_counter()
+        # the objects of the previous load go back to the collector, so they are freed once they are replaced
+        gc.unfreeze()
+        try:
+            data = SharedData(self.data_folder)
+        finally:
+            # keep the loaded objects out of the collector, its passes would write to every page the workers share
+            gc.collect()
+            gc.freeze()
+        print('loaded', data.data_folder, 'in', round(time.perf_counter() - start, 2), 's', flush=True)
+        return data
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                worker_main(self.listener, self.data, self.threads, self.max_requests, self.verbose)
+            finally:
+                os._exit(1)
+        self.children[pid] = self.generation
+        return pid
+
+    def reap(self):
+        # workers that exited, the ones of the current generation are replaced
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            generation = self.children.pop(pid, None)
+            if generation == self.generation and not self.stop_requested:
+                if self.verbose:
+                    print('worker', pid, 'exited, status', status, flush=True)
+                self.spawn()
+
+    def reload(self):
+        try:
+            data = self.load()
+        except Exception as e:
+            print('reload failed, keeping the loaded data', e, file=sys.stderr, flush=True)
+            return
+        old = [pid for pid, g in self.children.items() if g == self.generation]
+        self.data = data
+        self.generation += 1
+        for _ in range(self.workers):
+            self.spawn()
+        # the new workers take the new connections, the old ones finish what they have
+        for pid in old:
+            os.kill(pid, signal.SIGTERM)
+        print('reloaded', data.version, 'generation', self.generation, flush=True)
+
+    def run(self):
+        signal.signal(signal.SIGHUP, lambda signum, frame: setattr(self, 'reload_requested', True))
+        signal.signal(signal.SIGTERM, lambda signum, frame: setattr(self, 'stop_requested', True))
+        signal.signal(signal.SIGINT, lambda signum, frame: setattr(self, 'stop_requested', True))
+        for _ in range(self.workers):
+            self.spawn()
+        print('serving on http://' + ':'.join(map(str, self.listener.getsockname()[:2])), 'with', self.workers, 'workers', flush=True)
+
+        checked = time.perf_counter()
+        while not self.stop_requested:
+            time.sleep(0.1)
+            self.reap()
+            if self.watch and time.perf_counter() - checked > self.watch:
+                checked = time.perf_counter()
+                self.reload_requested |= self.data_folder.resolve() != self.data.data_folder
+            if self.reload_requested:
+                self.reload_requested = False
+                self.reload()
+
+        for pid in list(self.children):
+            os.kill(pid, signal.SIGTERM)
+        for pid in list(self.children):
+            os.waitpid(pid, 0)
+            self.children.pop(pid)
+        self.listener.close()
+
+
+def get(path, port=8080, timeout=60):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    try:
+        conn.request('GET', path)
+        return json.loads(conn.getresponse().read())
+    finally:
+        conn.close()
+
+
+def load_test(paths, concurrency=8, port=8080):
+    # send every path with concurrency clients, the latency is measured at the client
+    def send(path):
+        start = time.perf_counter()
+        try:
+            result = get(path, port)
+            error = 'error' in result
+        except Exception:
+            error = True
+        return time.perf_counter() - start, error
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(send, paths))
+    elapsed = time.perf_counter() - start
+
+    lat = sorted(x[0] for x in results)
+    pct = lambda p: lat[min(len(lat)-1, int(p*len(lat)))]*1000
+    return {'requests': len(results), 'errors': sum(x[1] for x in results), 'requests_per_s': len(results) / elapsed,
+            'p50_ms': pct(0.5), 'p99_ms': pct(0.99)}
+
+
+def sample_paths(data_folder, n, k=K):
+    # a mix of the three lookups over the ids of the data folder
+    rng = np.random.default_rng(0)
+    mnxr = np.unique(np.load(Path(data_folder) / 'FP_MorgRF.npz', allow_pickle=True)['z'].astype(str))
+    mnxm = np.load(Path(data_folder) / 'FP_Morg.npz', allow_pickle=True)['y'].astype(str)
+    paths = []
+    for kind in rng.choice(['reaction', 'similar', 'compound'], size=n, p=[0.4, 0.4, 0.2]):
+        ids = mnxm if kind == 'compound' else mnxr
+        paths.append('/' + kind + '/' + ids[rng.integers(len(ids))] + ('?k=' + str(k) if kind != 'reaction' else ''))
+    return paths
+
+
+def bench(data_folder, workers_list, n=1000, concurrency=8, threads=8, port=8090):
+    # start the server with each worker count and run the same load against it
+    paths = sample_paths(data_folder, n)
+    print('\nrequests', n, 'concurrency', concurrency, 'threads per worker', threads)
+    print('workers\tthroughput/s\tp50 ms\tp99 ms\terrors')
+    for workers in workers_list:
+        proc = subprocess.Popen([sys.executable, __file__, 'serve', str(data_folder), '--port', str(port),
+                                 '--workers', str(workers), '--threads', str(threads)], stdout=subprocess.DEVNULL)
+        try:
+            deadline = time.perf_counter() + 300
+            while True:
+                try:
+                    get('/health', port, timeout=1)
+                    break
+                except OSError:
+                    if proc.poll() is not None or time.perf_counter() > deadline:
+                        raise RuntimeError('server did not start')
+                    time.sleep(0.2)
+            load_test(paths[:concurrency * 2], concurrency, port)
+            result = load_test(paths, concurrency, port)
+            print(workers, '\t', round(result['requests_per_s'], 1), '\t\t', round(result['p50_ms'], 2), '\t', round(result['p99_ms'], 2), '\t', result['errors'], flush=True)
+        finally:
+            proc.send_signal(signal.SIGTERM)
+            proc.wait()
+
+
+
+
+def arguments(args=None):
+    parser = argparse.ArgumentParser(description='SeqFind script for Selenzy')
+    parser.add_argument('action', choices=['serve', 'bench'],
+                        help='run the server, or time it with an increasing number of workers')
+    parser.add_argument('data_folder',
+                        help='data directory (or the current link of publish_bundle.py) with the pipeline outputs')
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='address to listen on')
+    parser.add_argument('--port', type=int, default=8080,
+                        help='port to listen on')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='number of worker processes')
+    parser.add_argument('--threads', type=int, default=8,
+                        help='request threads in each worker')
+    parser.add_argument('--max_requests', type=int, default=0,
+                        help='replace a worker after this many requests, 0 keeps them')
+    parser.add_argument('--watch', type=float, default=0,
+                        help='seconds between checks for a new bundle behind the data folder, 0 only reloads on SIGHUP')
+    parser.add_argument('--verbose', action='store_true',
+                        help='log every request')
+    parser.add_argument('--workers_list', type=int, nargs='+', default=[1, 2, 4],
+                        help='bench: worker counts to time')
+    parser.add_argument('--n', type=int, default=1000,
+                        help='bench: number of requests')
+    parser.add_argument('--concurrency', type=int, default=8,
+                        help='bench: number of concurrent clients')
+
+    arg = parser.parse_args(args=args)
+    return arg
+
+
+if __name__ == '__main__':
+    arg = arguments()
+    if arg.action == 'serve':
+        PreforkServer(Path(arg.data_folder), arg.host, arg.port, arg.workers, arg.threads, arg.max_requests, arg.watch, arg.verbose).run()
+    else:
+        bench(Path(arg.data_folder), arg.workers_list, arg.n, arg.concurrency, arg.threads)
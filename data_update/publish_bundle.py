@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Oct 27 10:22:08 2026
+
+Publish a refresh as an immutable, versioned bundle and switch to it with an atomic symlink flip
+
+<bundles>/<version>/                files of the data folder (BUNDLE_FILES, folders included), files and folders read only
+<bundles>/<version>/manifest.json   version, sha256 and row count of every file, build parameters, MetaNetX release
+
+the stages write their parameters to <data_folder>/<stage>.params.json with write_params, the manifest
+collects them under build_parameters/stages
+<bundles>/current                   symlink to the live bundle, replaced in one rename
+
+a running server keeps serving the old bundle while BundleLoader preloads the new one in the background,
+requests take the data with loader.data() (or with loader.acquire()) and see either the old or the new bundle
+
+    python publish_bundle.py /data_2023/ /raw_data_update/ --bundles /data_bundles/
+    python publish_bundle.py /data_2023/ /raw_data_update/ --bundles /data_bundles/ --verify
+    python publish_bundle.py /data_2023/ /raw_data_update/ --bundles /data_bundles/ --rollback 20261027T101500-3f2a9c1e
+
+"""
+
+from contextlib import contextmanager
+from pathlib import Path
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import re
+import shutil
+import stat
+import sys
+import threading
+import time
+
+import numpy as np
+
+BUNDLE_FILES = ['FP_Morg.npz', 'FP_MorgRF.npz', 'reac_seqs.tsv', 'seq_org.tsv', 'reac_smi.csv', 'reac_prop.tsv',
+                'org_lineage.csv', 'org_lineage.npz', 'org_distance.npy', 'org_distance_index.npz', 'lookup_tables.npz',
+                'selenzyme.db', 'FP_Morg_bits.npz', 'FP_MorgRF_bits.npz', 'FP_MorgRF_lsh.npz', 'reaction_graph.npz', 'seq_props.npz', 'seq_clusters.npz', 'seqs.fasta', 'shards', 'alignments']
+CURRENT = 'current'
+PARAMS_SUFFIX = '.params.json'
+
+
+def sha256(file_path, block=1 << 20):
+    h = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(block), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def write_params(data_folder, stage, params):
+    # the parameters of a stage next to its outputs
+    with open(Path(data_folder) / (stage + PARAMS_SUFFIX), 'w') as f:
+        json.dump(params, f, indent=1, default=str)
+
+
+def read_params(data_folder):
+    return {x.name[:-len(PARAMS_SUFFIX)]: json.load(open(x)) for x in sorted(Path(data_folder).glob('*' + PARAMS_SUFFIX))}
+
+
+def row_count(file_path):
+    # rows of the tables, None for the files without rows
+    name = file_path.name
+    if name.endswith('.npz'):
+        data = np.load(file_path, allow_pickle=True)
+        for k in ['y', 'mnxr', 'pool_id']:
+            if k in data.files:
+                return int(len(data[k]))
+        return None
+    if name.endswith('.npy'):
+        return int(np.load(file_path, mmap_mode='r').shape[0])
+    if name.endswith('.fasta'):
+        with open(file_path, 'rb') as f:
+            return sum(1 for x in f if x.startswith(b'>'))
+    if name.endswith('.tsv') or name.endswith('.csv'):
+        with open(file_path, 'rb') as f:
+            return sum(1 for x in f if x.strip())
+    return None
+
+
+def metanetx_release(raw_data_folder):
+    # the version in the comment header of reac_prop.tsv
+    file_path = Path(raw_data_folder) / 'reac_prop.tsv'
+    if not file_path.exists():
+        return None
+    with open(file_path) as f:
+        for line in f:
+            if not line.startswith('#'):
+                break
+            found = re.search(r'(?:[Vv]ersion|[Rr]elease)\s*:?\s*([0-9][\w./-]*)', line)
+            if found:
+                return found.group(1)
+    return None
+
+
+def make_manifest(bundle, hashes, params, release):
+    manifest = {'version': bundle.name, 'created': datetime.datetime.now().isoformat(timespec='seconds'),
+                'metanetx_release': release, 'build_parameters': params, 'files': {}}
+    for name, h in hashes.items():
+        manifest['files'][name] = {'sha256': h, 'bytes': (bundle / name).stat().st_size, 'rows': row_count(bundle / name)}
+    return manifest
+
+
+def copy_file(src, dst, block=1 << 20):
+    # a copy, not a hard link, the next refresh rewrites the files of the data folder in place.
+    # Returns the sha256 of the bytes written, so every file is read once
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    h = hashlib.sha256()
+    with open(src, 'rb') as f, open(dst, 'wb') as out:
+        for chunk in iter(lambda: f.read(block), b''):
+            h.update(chunk)
+            out.write(chunk)
+    shutil.copystat(src, dst)
+    return h.hexdigest()
+
+
+def make_read_only(paths):
+    # the deepest first, a folder is still writable while its content changes
+    for x in sorted(paths, key=lambda x: len(x.parts), reverse=True):
+        x.chmod(x.stat().st_mode & ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH))
+
+
+def bundle_files(data_folder, files):
+    # the relative paths of the files present, the files of a folder one by one
+    found = []
+    for name in files:
+        path = data_folder / name
+        if path.is_dir():
+            found += sorted([x.relative_to(data_folder).as_posix() for x in path.rglob('*') if x.is_file()])
+        elif path.exists():
+            found.append(name)
+    return found
+
+
+def flip(bundles_root, version):
+    # point current at the bundle, a rename over the old link is atomic
+    bundles_root = Path(bundles_root)
+    tmp = bundles_root / (CURRENT + '.tmp' + str(os.getpid()))
+    if tmp.is_symlink() or tmp.exists():
+        tmp.unlink()
+    os.symlink(version, tmp)
+    os.replace(tmp, bundles_root / CURRENT)
+
+
+def publish(data_folder, bundles_root, raw_data_folder=None, params=None, files=BUNDLE_FILES, activate=True):
+    data_folder, bundles_root = Path(data_folder), Path(bundles_root)
+    bundles_root.mkdir(parents=True, exist_ok=True)
+    present = bundle_files(data_folder, files)
+
+    # build in a hidden folder and rename, so a half written bundle is never visible
+    tmp = bundles_root / ('.building.' + str(os.getpid()))
+    if tmp.exists():
+        shutil.rmtree(tmp)
+    tmp.mkdir()
+    hashes = {name: copy_file(data_folder / name, tmp / name) for name in present}
+
+    # the version is the build time and a hash over the content
+    content = hashlib.sha256()
+    for name in present:
+        content.update((name + hashes[name]).encode())
+    version = datetime.datetime.now().strftime('%Y%m%dT%H%M%S') + '-' + content.hexdigest()[:8]
+
+    bundle = bundles_root / version
+    params = dict(params or {}, stages=read_params(data_folder))
+    manifest = make_manifest(tmp, hashes, params, metanetx_release(raw_data_folder) if raw_data_folder else None)
+    manifest['version'] = version
+    with open(tmp / 'manifest.json', 'w') as f:
+        json.dump(manifest, f, indent=1)
+    make_read_only(tmp.rglob('*'))
+    os.rename(tmp, bundle)
+    make_read_only([bundle])
+
+    if activate:
+        flip(bundles_root, version)
+    return bundle, manifest
+
+
+def current_bundle(bundles_root):
+    link = Path(bundles_root) / CURRENT
+    return Path(bundles_root) / os.readlink(link) if link.is_symlink() else None
+
+
+def verify(bundle):
+    # files whose hash does not match the manifest
+    manifest = json.load(open(Path(bundle) / 'manifest.json'))
+    return [name for name, v in manifest['files'].items() if not (Path(bundle) / name).exists() or sha256(Path(bundle) / name) != v['sha256']]
+
+
+class BundleLoader():
+    # keeps the loaded data of the current bundle and swaps to a new bundle once it is loaded
+
+    def __init__(self, bundles_root, load, interval=30):
+        self.bundles_root = Path(bundles_root)
+        self.load = load
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.bundle = current_bundle(self.bundles_root)
+        self.loaded = load(self.bundle) if self.bundle else None
+        self.swaps = 0
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def data(self):
+        # one reference for the whole request, a swap during the request does not change it
+        with self.lock:
+            return self.loaded
+
+    @contextmanager
+    def acquire(self):
+        yield self.data()
+
+    def version(self):
+        with self.lock:
+            return self.bundle.name if self.bundle else None
+
+    def reload(self):
+        # load the bundle current points at, if it changed, then swap
+        bundle = current_bundle(self.bundles_root)
+        if bundle is None or bundle == self.bundle:
+            return False
+        loaded = self.load(bundle)
+        with self.lock:
+            self.bundle, self.loaded = bundle, loaded
+            self.swaps += 1
+        return True
+
+    def watch(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.reload()
+            except Exception as e:
+                print('bundle reload failed', e, file=sys.stderr, flush=True)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.watch, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread:
+            self.thread.join()
+
+
+
+
+def arguments(args=None):
+    parser = argparse.ArgumentParser(description='SeqFind script for Selenzy')
+    parser.add_argument('data_folder',
+                        help='specify data directory for new files, please end with slash')
+    parser.add_argument('raw_data_folder',
+                        help='specify data directory for raw databases files, please end with slash')
+    parser.add_argument('--bundles', required=True,
+                        help='directory holding the versioned bundles and the current symlink')
+    parser.add_argument('--no_activate', action='store_true',
+                        help='publish the bundle without pointing current at it')
+    parser.add_argument('--verify', action='store_true',
+                        help='check the hashes of the current bundle instead of publishing')
+    parser.add_argument('--rollback', default=None,
+                        help='point current at this earlier version instead of publishing')
+
+    arg = parser.parse_args(args=args)
+    return arg
+
+
+if __name__ == '__main__':
+    arg = arguments()
+    if arg.verify:
+        bad = verify(current_bundle(arg.bundles))
+        print('bundle', current_bundle(arg.bundles), 'ok' if not bad else 'changed files ' + ', '.join(bad))
+        sys.exit(1 if bad else 0)
+    elif arg.rollback:
+        if not (Path(arg.bundles) / arg.rollback / 'manifest.json').exists():
+            sys.exit('no bundle ' + arg.rollback)
+        flip(arg.bundles, arg.rollback)
+        print('current ->', arg.rollback)
+    else:
+        start = time.perf_counter()
+        bundle, manifest = publish(Path(arg.data_folder), Path(arg.bundles), Path(arg.raw_data_folder),
+                                   {'argv': sys.argv, 'data_folder': arg.data_folder, 'raw_data_folder': arg.raw_data_folder},
+                                   activate=not arg.no_activate)
+        print('published', bundle, len(manifest['files']), 'files', '\tMetaNetX', manifest['metanetx_release'], '\t', round(time.perf_counter() - start, 2), 's')
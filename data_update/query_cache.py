@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 26 15:17:40 2026
+
+Result cache for the reaction scoring path
+
+the key is the canonical reaction smiles, the scoring parameters and the dataset version,
+a sha256 of FP_MorgRF.npz, reac_seqs.tsv and seq_org.tsv. Installing a new data release changes the version,
+which empties the memory tier and moves the disk tier to a new folder. The files are rehashed in a background thread
+when their size or modification time changes, the requests bypass the cache until the new version is known
+    memory  - LRU, at most max_items results
+    disk    - optional, <disk_folder>/<version>/<key[:2]>/<key>.pkl, the keep_versions newest versions are kept,
+              so another server or a draining worker still on an older release keeps its folder
+
+    cache = QueryCache('/data_2023/', max_items=2048, disk_folder='/data_2023/query_cache/')
+    result = cache.get_or_compute(reaction, {'host': 83333, 'k': 20}, score)
+
+    python query_cache.py /data_2023/ --mapper onnx --onnx_model /data_2023/rxnmapper.onnx --n 200 --repeat 5
+
+"""
+
+from rdkit import Chem
+from rdkit import RDLogger
+from collections import OrderedDict
+from pathlib import Path
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import threading
+import time
+
+from metrics import metrics
+from atom_mappers import make_mapper, MAPPERS
+
+VERSION_FILES = ['FP_MorgRF.npz', 'reac_seqs.tsv', 'seq_org.tsv']
+KEEP_VERSIONS = 3
+
+
+def file_signature(data_folder, files=VERSION_FILES):
+    # cheap check for a new release, the size and modification time of every file
+    sig = []
+    for name in files:
+        path = Path(data_folder) / name
+        st = path.stat() if path.exists() else None
+        sig.append((name, st.st_size, st.st_mtime_ns) if st else (name, None, None))
+    return tuple(sig)
+
+
+def dataset_version(data_folder, files=VERSION_FILES, block=1 << 20):
+    h = hashlib.sha256()
+    for name in files:
+        path = Path(data_folder) / name
+        h.update(name.encode())
+        if path.exists():
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(block), b''):
+                    h.update(chunk)
+    return h.hexdigest()[:16]
+
+
+def canonical_reaction(reaction):
+    # canonical smiles of every compound, sorted on each side
+    RDLogger.DisableLog('rdApp.*')
+    sides = []
+    for side in reaction.split('>>'):
+        smiles = []
+        for x in side.split('.'):
+            mol = Chem.MolFromSmiles(x)
+            smiles.append(Chem.MolToSmiles(mol) if mol is not None else x)
+        sides.append('.'.join(sorted(smiles)))
+    return '>>'.join(sides)
+
+
+def cache_key(reaction, params, version):
+    data = json.dumps([canonical_reaction(reaction), params, version], sort_keys=True, default=str)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+class QueryCache():
+
+    def __init__(self, data_folder, max_items=1024, disk_folder=None, files=VERSION_FILES, keep_versions=KEEP_VERSIONS):
+        self.data_folder = Path(data_folder)
+        self.files = files
+        self.max_items = max_items
+        self.disk_folder = Path(disk_folder) if disk_folder else None
+        self.keep_versions = keep_versions
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = {'memory': 0, 'disk': 0}
+        self.misses = 0
+        self.invalidations = 0
+        self.signature = None
+        self.version = None
+        self.rehash = None
+        self.update_version(file_signature(self.data_folder, self.files))
+
+    def check_version(self):
+        # the version of the files as they are now, None while a changed file is rehashed in the background
+        signature = file_signature(self.data_folder, self.files)
+        with self.lock:
+            if signature == self.signature:
+                return self.version
+            if self.rehash is None or not self.rehash.is_alive():
+                self.rehash = threading.Thread(target=self.update_version, args=(signature,), daemon=True)
+                self.rehash.start()
+        return None
+
+    def update_version(self, signature):
+        # empty the cache when the content changed, a new signature with the same content keeps it
+        version = dataset_version(self.data_folder, self.files)
+        with self.lock:
+            if version != self.version:
+                if self.version is not None:
+                    self.invalidations += 1
+                self.memory.clear()
+                self.version = version
+                self.remove_old_versions()
+            self.signature = signature
+
+    def remove_old_versions(self):
+        # the current version is the newest folder, the older ones beyond keep_versions are removed
+        if self.disk_folder:
+            current = self.disk_folder / self.version
+            current.mkdir(parents=True, exist_ok=True)
+            os.utime(current)
+            folders = sorted([x for x in self.disk_folder.iterdir() if x.is_dir() and x != current],
+                             key=lambda x: x.stat().st_mtime, reverse=True)
+            for x in folders[max(0, self.keep_versions - 1):]:
+                shutil.rmtree(x, ignore_errors=True)
+
+    def disk_file(self, key, version):
+        return self.disk_folder / version / key[:2] / (key + '.pkl')
+
+    def get(self, reaction, params):
+        # (found, result)
+        return self.lookup(reaction, params, self.check_version())
+
+    def lookup(self, reaction, params, version):
+        if version is None:
+            with self.lock:
+                self.misses += 1
+            return False, None
+        key = cache_key(reaction, params, version)
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.hits['memory'] += 1
+                return True, self.memory[key]
+
+        if self.disk_folder:
+            file_path = self.disk_file(key, version)
+            if file_path.exists():
+                try:
+                    with open(file_path, 'rb') as f:
+                        result = pickle.load(f)
+                except Exception:
+                    result = None
+                else:
+                    self.remember(key, result)
+                    with self.lock:
+                        self.hits['disk'] += 1
+                    return True, result
+
+        with self.lock:
+            self.misses += 1
+        return False, None
+
+    def remember(self, key, result):
+        with self.lock:
+            self.memory[key] = result
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.max_items:
+                self.memory.popitem(last=False)
+
+    def put(self, reaction, params, result, version=None):
+        # version is the one the result was computed for, a result of an older or unknown version is not kept
+        version = version or self.check_version()
+        if version is None or version != self.version:
+            return
+        key = cache_key(reaction, params, version)
+        self.remember(key, result)
+        if self.disk_folder:
+            # write then rename, so a reader never loads half a file
+            file_path = self.disk_file(key, version)
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = file_path.with_suffix('.tmp' + str(os.getpid()) + '_' + str(threading.get_ident()))
+            with open(tmp, 'wb') as f:
+                pickle.dump(result, f)
+            os.replace(tmp, file_path)
+
+    def get_or_compute(self, reaction, params, fun):
+        version = self.check_version()
+        found, result = self.lookup(reaction, params, version)
+        if not found:
+            result = fun(reaction, **params)
+            if version is not None:
+                self.put(reaction, params, result, version)
+        return result
+
+    def stats(self):
+        with self.lock:
+            hits = sum(self.hits.values())
+            total = hits + self.misses
+            return {'version': self.version, 'items': len(self.memory), 'max_items': self.max_items,
+                    'hits_memory': self.hits['memory'], 'hits_disk': self.hits['disk'], 'misses': self.misses,
+                    'hit_rate': hits / total if total else 0.0, 'invalidations': self.invalidations}
+
+    def record_metrics(self):
+        stats = self.stats()
+        for tier in ['memory', 'disk']:
+            metrics.count('query_cache_hits', stats['hits_' + tier], tier=tier)
+        metrics.count('query_cache_misses', stats['misses'])
+        metrics.count('query_cache_items', stats['items'])
+        metrics.count('query_cache_invalidations', stats['invalidations'])
+
+
+def benchmark(data_folder, mapper, n=100, repeat=5, k=20, disk_folder=None):
+    # the scoring path is the atom mapping of the query and the live search of make_reaction_graph.py
+    from atom_mappers import sample_reactions
+    from make_reaction_graph import GraphData
+    from mapping_service import prepare, reacting_fragments
+    from rdkit import DataStructs
+
+    data = GraphData(data_folder / 'FP_MorgRF.npz')
+
+    def score(reaction, k):
+        react_smile, sides, subs_fp, prods_fp = prepare(reaction)
+        mapped = mapper.get_attention_guided_atom_maps([react_smile])[0]
+        fps = []
+        for c in reacting_fragments(mapped, sides, subs_fp, prods_fp)['compounds']:
+            fp = DataStructs.UIntSparseIntVect(2**32 - 1)
+            for bit, count in c['rf'].items():
+                fp[int(bit)] = count
+            fps.append(fp)
+        if not fps:
+            return []
+        neighbours, scores = data.top_k(fps, k)
+        return list(zip(data.mnxr[neighbours[neighbours >= 0]].tolist(), scores[neighbours >= 0].tolist()))
+
+    reactions = sample_reactions(data_folder, n)
+    cache = QueryCache(data_folder, max_items=len(reactions), disk_folder=disk_folder)
+
+    start = time.perf_counter()
+    uncached = [score(r, k) for r in reactions]
+    t_uncached = (time.perf_counter() - start) / len(reactions)
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        cached = [cache.get_or_compute(r, {'k': k}, score) for r in reactions]
+    t_cached = (time.perf_counter() - start) / (len(reactions) * repeat)
+
+    print('\n' + str(len(reactions)), 'reactions submitted', repeat, 'times, match', cached == uncached)
+    print('uncached\t', round(t_uncached*1000, 3), 'ms')
+    print('cached\t\t', round(t_cached*1000, 3), 'ms', '\t', round(t_uncached / t_cached, 1), 'x')
+    print(json.dumps(cache.stats()))
+    cache.record_metrics()
+
+
+
+
+def arguments(args=None):
+    parser = argparse.ArgumentParser(description='SeqFind script for Selenzy')
+    parser.add_argument('data_folder',
+                        help='data directory with FP_MorgRF.npz, reac_seqs.tsv, seq_org.tsv and reac_smi.csv')
+    parser.add_argument('--mapper', choices=MAPPERS, default='rxnmapper',
+                        help='atom mapping backend, onnx needs the model exported with atom_mappers.py')
+    parser.add_argument('--onnx_model', default=None,
+                        help='exported onnx model for the onnx mapper')
+    parser.add_argument('--threads', type=int, default=None,
+                        help='intra op threads for the mapper')
+    parser.add_argument('--disk_folder', default=None,
+                        help='also keep the results on disk in this folder')
+    parser.add_argument('--n', type=int, default=100,
+                        help='number of reactions')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='times each reaction is submitted')
+
+    arg = parser.parse_args(args=args)
+    return arg
+
+
+if __name__ == '__main__':
+    arg = arguments()
+    benchmark(Path(arg.data_folder), make_mapper(arg.mapper, arg.onnx_model, arg.threads), arg.n, arg.repeat, disk_folder=arg.disk_folder)
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Fri Oct 23 09:26:51 2026
+
+Columnar encoding of the reacting fragment distances in FP_MorgRF.npz
+
+d holds a list of "bit=ra_d|ra_d" strings for every RF row, the same data as parallel arrays
+    d_offsets   - int64, the entries of rf row i are [d_offsets[i], d_offsets[i+1])
+    d_bit       - uint32 fragment id (the ids are unsigned 32 bit so they do not fit int32)
+    d_ra        - int32 reacting atom
+    d_dist      - uint8 distance from the reacting atom to the furthest atom of the fragment
+
+RFDists.rows is the rf row of every entry. make_fingerprint_atomMap.py only writes the strings with --legacy
+
+    python rf_dists.py /data_2023/FP_MorgRF.npz     adds the arrays to a file with only the strings and times the scoring
+
+"""
+
+import numpy as np
+from pathlib import Path
+import argparse
+import os
+import time
+
+KEYS = ['d_offsets', 'd_bit', 'd_ra', 'd_dist']
+
+
+def encode_dists(dists):
+    bits, ras, ds, sizes = [], [], [], []
+    for distList in dists:
+        n = 0
+        for distStr in distList:
+            bit, pairs = distStr.split('=')
+            for pair in pairs.split('|'):
+                ra, d = pair.split('_')
+                bits.append(int(bit))
+                ras.append(int(ra))
+                ds.append(int(d))
+                n += 1
+        sizes.append(n)
+
+    offsets = np.zeros(len(sizes) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(sizes)
+    return {'d_offsets': offsets, 'd_bit': np.array(bits, dtype=np.uint32),
+            'd_ra': np.array(ras, dtype=np.int32), 'd_dist': np.array(ds, dtype=np.uint8)}
+
+
+def decode_dists(arrays):
+    # back to the "bit=ra_d|ra_d" strings, the pairs of a fragment are consecutive
+    offsets, bits, ras, ds = [arrays[k] for k in KEYS]
+    dists = []
+    for i in range(len(offsets) - 1):
+        distList, prev = [], None
+        for b, ra, d in zip(bits[offsets[i]:offsets[i+1]], ras[offsets[i]:offsets[i+1]], ds[offsets[i]:offsets[i+1]]):
+            if b == prev:
+                distList[-1] += '|' + str(ra) + '_' + str(d)
+            else:
+                distList.append(str(b) + '=' + str(ra) + '_' + str(d))
+            prev = b
+        dists.append(distList)
+    return dists
+
+
+class RFDists():
+
+    def __init__(self, arrays):
+        self.offsets, self.bit, self.ra, self.dist = [np.asarray(arrays[k]) for k in KEYS]
+        self.rows = np.repeat(np.arange(len(self.offsets) - 1, dtype=np.int32), np.diff(self.offsets))
+
+    @classmethod
+    def load(cls, rf):
+        # from the columns, the pool (rf_pool.py), or encoded from the strings of files written before the columns
+        # rf is the npz or a dict of its arrays
+        if all(k in rf for k in KEYS):
+            return cls({k: rf[k] for k in KEYS})
+        if 'pool_id' in rf:
+            return cls(cls({k: rf['pool_' + k] for k in KEYS}).subset(rf['pool_id']))
+        return cls(encode_dists(rf['d']))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def row(self, i):
+        # (bit, reacting atom, distance) table of one rf row
+        s = slice(self.offsets[i], self.offsets[i+1])
+        return self.bit[s], self.ra[s], self.dist[s]
+
+    def subset(self, rows):
+        # the columns for the rows in the given order, e.g. for a shard
+        rows = np.asarray(rows, dtype=np.int64)
+        sizes = self.offsets[rows+1] - self.offsets[rows]
+        idx = np.repeat(self.offsets[rows] - np.cumsum(sizes) + sizes, sizes) + np.arange(sizes.sum())
+        offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(sizes)
+        return {'d_offsets': offsets, 'd_bit': self.bit[idx], 'd_ra': self.ra[idx], 'd_dist': self.dist[idx]}
+
+    def distance_scores(self, query_bits, rows=None):
+        # sum of 1/(1+distance) over the entries whose fragment is in the query, for every rf row
+        hit = np.isin(self.bit, np.asarray(list(query_bits), dtype=np.uint32))
+        scores = np.bincount(self.rows[hit], weights=1.0 / (1.0 + self.dist[hit]), minlength=len(self))
+        return scores if rows is None else scores[rows]
+
+
+def distance_scores_strings(dists, query_bits):
+    # the same scores parsed from the strings, the reference for the benchmark
+    query_bits = set(query_bits)
+    scores = np.zeros(len(dists))
+    for i, distList in enumerate(dists):
+        for distStr in distList:
+            bit, pairs = distStr.split('=')
+            if int(bit) in query_bits:
+                scores[i] += sum([1.0 / (1.0 + int(x.split('_')[1])) for x in pairs.split('|')])
+    return scores
+
+
+def benchmark(rf_file, n=20):
+    # the strings are decoded from the columns, so files without d can be timed too
+    rf = np.load(rf_file, allow_pickle=True)
+    arrays = RFDists.load(rf)
+    dists = decode_dists(arrays.subset(np.arange(len(arrays))))
+    rng = np.random.default_rng(0)
+    queries = [set(arrays.row(i)[0].tolist()) for i in rng.choice(len(arrays), size=min(n, len(arrays)), replace=False)]
+
+    start = time.perf_counter()
+    expected = [distance_scores_strings(dists, q) for q in queries]
+    t_str = (time.perf_counter() - start) / len(queries)
+
+    start = time.perf_counter()
+    found = [arrays.distance_scores(q) for q in queries]
+    t_arr = (time.perf_counter() - start) / len(queries)
+
+    print('\ndistance weighted scores over', len(arrays), 'rf rows, match', all(np.allclose(a, b) for a, b in zip(expected, found)))
+    print('strings\t\t', round(t_str*1000, 3), 'ms')
+    print('columns\t\t', round(t_arr*1000, 3), 'ms', '\t', round(t_str / t_arr, 1), 'x')
+
+
+def file_sizes(rf_file, tmp_file):
+    # size of the npz with the per row distances as strings and as columns
+    rf = np.load(rf_file, allow_pickle=True)
+    base = {k: rf[k] for k in ['y', 'z']}
+    columns = RFDists.load(rf).subset(np.arange(len(rf['z'])))
+    strings = np.empty(len(rf['z']), dtype=object)
+    for i, distList in enumerate(decode_dists(columns)):
+        strings[i] = distList
+    sizes = {}
+    for name, extra in [['strings', {'d': strings}], ['columns', columns]]:
+        np.savez_compressed(tmp_file, **base, **extra)
+        sizes[name] = os.path.getsize(tmp_file)
+    os.remove(tmp_file)
+    return sizes
+
+
+def add_columns(rf_file):
+    # files written before the columns only have d, the pooled files already have the columns
+    rf = np.load(rf_file, allow_pickle=True)
+    if 'd' not in rf.files or all(k in rf.files for k in KEYS):
+        return
+    data = {k: rf[k] for k in rf.files}
+    data.update(encode_dists(rf['d']))
+    np.savez_compressed(rf_file, **data)
+
+
+
+
+def arguments(args=None):
+    parser = argparse.ArgumentParser(description='SeqFind script for Selenzy')
+    parser.add_argument('rf_file',
+                        help='FP_MorgRF.npz to add the distance columns to')
+    parser.add_argument('--benchmark', type=int, default=20,
+                        help='number of queries to score')
+
+    arg = parser.parse_args(args=args)
+    return arg
+
+
+if __name__ == '__main__':
+    arg = arguments()
+    rf_file = Path(arg.rf_file)
+    add_columns(rf_file)
+    sizes = file_sizes(rf_file, rf_file.with_suffix('.tmp.npz'))
+    print('npz size\tstrings', round(sizes['strings']/1e6, 3), 'MB\tcolumns', round(sizes['columns']/1e6, 3), 'MB')
+    if arg.benchmark:
+        benchmark(rf_file, arg.benchmark)
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Fri Oct 23 14:02:19 2026
+
+Content deduplicated reacting fragment vectors for FP_MorgRF.npz
+
+the same compound with the same reaction centre (ATP -> ADP, NAD+ -> NADH ...) gives the same RF vector
+and distances in many reactions, so each unique (vector, distances) pair is stored once
+    pool_x          - the unique RF vectors
+    pool_d_*        - their distances, the columns of rf_dists.py
+    pool_id         - int32, the pool entry of every RF row
+
+FP_MorgRF.npz stores y, z and the pool, with --legacy also x and d (make_fingerprint_atomMap.py). row_vectors and
+RFDists.load rebuild the per row vectors and distances, and read the files written before the pool (x with d_* or d) the same way
+
+    python rf_pool.py /data_2023/FP_MorgRF.npz      reports the dedup ratio, the sizes and the query speedup
+
+"""
+
+import numpy as np
+from rdkit import DataStructs
+from pathlib import Path
+import argparse
+import os
+import time
+
+from rf_dists import RFDists, KEYS
+
+
+def build_pool(fps, dists):
+    # pool ids in order of first appearance, dists is an RFDists with a row for every fp
+    ids, first, pool_id = {}, [], np.zeros(len(fps), dtype=np.int32)
+    for i, fp in enumerate(fps):
+        bit, ra, d = dists.row(i)
+        key = (tuple(sorted(fp.GetNonzeroElements().items())), bit.tobytes(), ra.tobytes(), d.tobytes())
+        if key not in ids:
+            ids[key] = len(first)
+            first.append(i)
+        pool_id[i] = ids[key]
+
+    pool = {'pool_x': np.empty(len(first), dtype=object), 'pool_id': pool_id}
+    for j, i in enumerate(first):
+        pool['pool_x'][j] = fps[i]
+    pool.update({'pool_' + k: v for k, v in dists.subset(first).items()})
+    return pool
+
+
+def subset_pool(rf, rows):
+    # the pool of the given rows, e.g. for a shard, the entries no row uses are left out
+    used, pool_id = np.unique(rf['pool_id'][rows], return_inverse=True)
+    pool = {'pool_x': rf['pool_x'][used], 'pool_id': pool_id.astype(np.int32)}
+    pool.update({'pool_' + k: v for k, v in RFDists({k: rf['pool_' + k] for k in KEYS}).subset(used).items()})
+    return pool
+
+
+def row_vectors(rf):
+    # the RF vector of every row from either layout
+    if 'x' in rf:
+        return rf['x']
+    return rf['pool_x'][rf['pool_id']]
+
+
+class RFPool():
+
+    def __init__(self, rf):
+        if 'pool_id' not in rf:
+            rf = build_pool(list(rf['x']), RFDists.load(rf))
+        self.x = list(rf['pool_x'])
+        self.id = np.asarray(rf['pool_id'])
+        self.dists = RFDists({k: rf['pool_' + k] for k in KEYS})
+
+    def scores(self, fp):
+        # the Tanimoto of every unique vector once, broadcast to the rows
+        return np.array(DataStructs.BulkTanimotoSimilarity(fp, self.x))[self.id]
+
+    def distance_scores(self, query_bits):
+        return self.dists.distance_scores(query_bits)[self.id]
+
+
+def memory_size(fps, arrays):
+    # serialized size of the vectors plus the bytes of the arrays
+    return sum([len(fp.ToBinary()) for fp in fps]) + sum([x.nbytes for x in arrays])
+
+
+def report(rf_file, n=20):
+    rf = np.load(rf_file, allow_pickle=True)
+    rows_x, dists = row_vectors(rf), RFDists.load(rf)
+    fps = list(rows_x)
+    pool = build_pool(fps, dists)
+    pooled = RFPool(pool)
+    print('rf rows', len(fps), 'unique', len(pooled.x), '\tdedup ratio', round(1 - len(pooled.x) / len(fps), 3) if fps else 0)
+
+    tmp_file = Path(rf_file).with_suffix('.tmp.npz')
+    base = {k: rf[k] for k in ['y', 'z']}
+    np.savez_compressed(tmp_file, x=rows_x, **dists.subset(np.arange(len(dists))), **base)
+    rows_size = os.path.getsize(tmp_file)
+    np.savez_compressed(tmp_file, **pool, **base)
+    pool_size = os.path.getsize(tmp_file)
+    os.remove(tmp_file)
+    print('npz size\trows', round(rows_size/1e6, 3), 'MB\tpool', round(pool_size/1e6, 3), 'MB')
+
+    rows_mem = memory_size(fps, [dists.offsets, dists.bit, dists.ra, dists.dist])
+    pool_mem = memory_size(pooled.x, [pooled.id, pooled.dists.offsets, pooled.dists.bit, pooled.dists.ra, pooled.dists.dist])
+    print('memory\t\trows', round(rows_mem/1e6, 3), 'MB\tpool', round(pool_mem/1e6, 3), 'MB')
+
+    rng = np.random.default_rng(0)
+    queries = [fps[i] for i in rng.choice(len(fps), size=min(n, len(fps)), replace=False)]
+    start = time.perf_counter()
+    expected = [np.array(DataStructs.BulkTanimotoSimilarity(q, fps)) for q in queries]
+    t_rows = (time.perf_counter() - start) / len(queries)
+    start = time.perf_counter()
+    found = [pooled.scores(q) for q in queries]
+    t_pool = (time.perf_counter() - start) / len(queries)
+    print('query\t\trows', round(t_rows*1000, 3), 'ms\tpool', round(t_pool*1000, 3), 'ms', '\t', round(t_rows / t_pool, 1), 'x',
+          '\tmatch', all(np.array_equal(a, b) for a, b in zip(expected, found)))
+
+
+
+
+def arguments(args=None):
+    parser = argparse.ArgumentParser(description='SeqFind script for Selenzy')
+    parser.add_argument('rf_file',
+                        help='FP_MorgRF.npz, pooled or with the per row vectors')
+    parser.add_argument('--n', type=int, default=20,
+                        help='number of queries to time')
+
+    arg = parser.parse_args(args=args)
+    return arg
+
+
+if __name__ == '__main__':
+    arg = arguments()
+    report(Path(arg.rf_file), arg.n)